@@ -93,9 +93,10 @@ try:
     # configure database
     db = Registry.get_instance("db")
     if config.database.type == "sqlite":
-        db.connect_sqlite("./data/" + config.database.name)
+        db.connect_sqlite("./data/" + config.database.name, config.database.get("pool_size"))
     elif config.database.type == "mysql":
-        db.connect_mysql(config.database.host, config.database.port, config.database.username, config.database.password, config.database.name)
+        db.connect_mysql(config.database.host, config.database.port, config.database.username, config.database.password, config.database.name,
+                         config.database.get("pool_size"))
     else:
         raise Exception("Unknown database type '%s'" % config.database.type)
 
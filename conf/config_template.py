@@ -10,6 +10,7 @@ config = DictObject({
     "host": "",
     "port": 3306,
     "name": "database.db",
+    "pool_size": 10,  # max number of database connections used at the same time
   },
 
   "bots": [
@@ -1,16 +1,26 @@
 import inspect
+import time
 
 from core.decorators import instance
+from core.dict_object import DictObject
 from core.logger import Logger
 
 
 @instance()
 class AccessService:
+    # access level handlers registered by modules may depend on state that does not invalidate the cache,
+    # so cached entries are also re-resolved periodically
+    ACCESS_LEVEL_CACHE_TTL = 60
+
     def __init__(self):
         self.access_levels = [
             {"label": "none", "level": 0, "handler": self.no_access},
             {"label": "all", "level": 100, "handler": self.all_access}]
         self.logger = Logger(__name__)
+        self.access_level_cache = {}
+        self.cache_generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def inject(self, registry):
         self.character_service = registry.get_instance("character_service")
@@ -32,26 +42,62 @@ class AccessService:
         self.logger.debug("Registering access level %d with label '%s'" % (level, label))
         self.access_levels.append({"label": label.lower(), "level": level, "handler": handler})
         self.access_levels = sorted(self.access_levels, key=lambda k: k["level"])
+        self.clear_access_level_cache()
 
     def get_access_levels(self):
         return self.access_levels
 
     def get_access_level(self, char_id):
+        return self.get_cached_access_info(char_id).access_level
+
+    def get_main_char_id(self, char_id):
+        return self.get_cached_access_info(char_id).main_char_id
+
+    def get_cached_access_info(self, char_id):
+        t = time.time()
+        access_info = self.access_level_cache.get(char_id)
+        if access_info and access_info.expires_at > t:
+            self.cache_hits += 1
+            return access_info
+
+        self.cache_misses += 1
+        generation = self.cache_generation
+        access_info = self.resolve_access_info(char_id)
+        access_info.expires_at = t + self.ACCESS_LEVEL_CACHE_TTL
+
+        # do not store the result if the cache was cleared while it was being resolved, since it may be stale
+        if generation == self.cache_generation:
+            self.access_level_cache[char_id] = access_info
+
+        return access_info
+
+    def resolve_access_info(self, char_id):
         access_level1 = self.get_single_access_level(char_id)
 
         alts = self.alts_service.get_alts(char_id)
         if not alts:
-            return access_level1
+            return DictObject({"access_level": access_level1, "main_char_id": char_id})
 
         main = alts[0]
         if main.char_id == char_id:
-            return access_level1
+            return DictObject({"access_level": access_level1, "main_char_id": char_id})
         else:
             access_level2 = self.get_single_access_level(main.char_id)
             if access_level1["level"] < access_level2["level"]:
-                return access_level1
+                return DictObject({"access_level": access_level1, "main_char_id": main.char_id})
             else:
-                return access_level2
+                return DictObject({"access_level": access_level2, "main_char_id": main.char_id})
+
+    def clear_access_level_cache(self):
+        """Call after changing any data that access level handlers or alt relations depend on"""
+
+        self.cache_generation += 1
+        self.access_level_cache = {}
+
+    def get_access_level_cache_stats(self):
+        return DictObject({"hits": self.cache_hits,
+                           "misses": self.cache_misses,
+                           "size": len(self.access_level_cache)})
 
     def compare_access_levels(self, access_level1, access_level2):
         """
@@ -82,7 +128,7 @@ class AccessService:
             return True
 
         # return True if both chars have the same main
-        if self.alts_service.get_main(char_id1).char_id == self.alts_service.get_main(char_id2).char_id:
+        if self.get_main_char_id(char_id1) == self.get_main_char_id(char_id2):
             return True
 
         a1 = self.get_access_level(char_id1)
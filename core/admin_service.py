@@ -39,12 +39,15 @@ class AdminService:
             # remove any existing admin access level first
             self.remove(char_id)
             self.db.exec("INSERT INTO admin (char_id, access_level) VALUES (?, ?)", [char_id, access_level])
+            self.access_service.clear_access_level_cache()
             return True
         else:
             return False
 
     def remove(self, char_id):
-        return self.db.exec("DELETE FROM admin WHERE char_id = ?", [char_id]) > 0
+        num_rows = self.db.exec("DELETE FROM admin WHERE char_id = ?", [char_id])
+        self.access_service.clear_access_level_cache()
+        return num_rows > 0
 
     def get_all(self):
         superadmin_char_id = self.character_service.resolve_char_to_id(self.bot.superadmin)
@@ -14,6 +14,7 @@ class AltsService:
         self.character_service = registry.get_instance("character_service")
         self.pork_service = registry.get_instance("pork_service")
         self.event_service = registry.get_instance("event_service")
+        self.access_service = registry.get_instance("access_service")
 
     def pre_start(self):
         self.event_service.register_event_type(self.MAIN_CHANGED_EVENT_TYPE)
@@ -75,6 +76,7 @@ class AltsService:
         # make sure char info exists in character table
         self.pork_service.load_character_info(alt_char_id)
         self.db.exec("INSERT INTO alts (char_id, group_id, status) VALUES (?, ?, ?)", params)
+        self.access_service.clear_access_level_cache()
         return ["success", True]
 
     def remove_alt(self, sender_char_id, alt_char_id):
@@ -89,6 +91,7 @@ class AltsService:
             return ["remove_main", False]
 
         self.db.exec("DELETE FROM alts WHERE char_id = ?", [alt_char_id])
+        self.access_service.clear_access_level_cache()
         return ["success", True]
 
     def set_as_main(self, sender_char_id):
@@ -101,6 +104,7 @@ class AltsService:
         else:
             self.update_status(sender_char_id, self.MAIN)
             self.update_status(alts[0].char_id, self.CONFIRMED)
+            self.access_service.clear_access_level_cache()
             self.event_service.fire_event(self.MAIN_CHANGED_EVENT_TYPE,
                                           DictObject({"old_main_id": alts[0].char_id,
                                                       "new_main_id": sender_char_id}))
@@ -15,36 +15,9 @@ class ClientPacket(Packet):
 
     @classmethod
     def get_instance(cls, packet_id, data):
-        if packet_id == LoginRequest.id:
-            LoginRequest.from_bytes(data)
-        elif packet_id == LoginSelect.id:
-            LoginSelect.from_bytes(data)
-        elif packet_id == CharacterLookup.id:
-            CharacterLookup.from_bytes(data)
-        elif packet_id == PrivateMessage.id:
-            PrivateMessage.from_bytes(data)
-        elif packet_id == BuddyAdd.id:
-            BuddyAdd.from_bytes(data)
-        elif packet_id == BuddyRemove.id:
-            BuddyRemove.from_bytes(data)
-        elif packet_id == PrivateChannelInvite.id:
-            PrivateChannelInvite.from_bytes(data)
-        elif packet_id == PrivateChannelKick.id:
-            PrivateChannelKick.from_bytes(data)
-        elif packet_id == PrivateChannelJoin.id:
-            PrivateChannelJoin.from_bytes(data)
-        elif packet_id == PrivateChannelLeave.id:
-            PrivateChannelLeave.from_bytes(data)
-        elif packet_id == PrivateChannelKickAll.id:
-            PrivateChannelKickAll.from_bytes(data)
-        elif packet_id == PrivateChannelMessage.id:
-            PrivateChannelMessage.from_bytes(data)
-        elif packet_id == PublicChannelMessage.id:
-            PublicChannelMessage.from_bytes(data)
-        elif packet_id == Ping.id:
-            Ping.from_bytes(data)
-        elif packet_id == ChatCommand.id:
-            ChatCommand.from_bytes(data)
+        packet_type = cls.packet_types.get(packet_id)
+        if packet_type:
+            return packet_type.from_bytes(data)
         else:
             return None
 
@@ -265,3 +238,7 @@ class ChatCommand(ClientPacket):
     def from_bytes(cls, data):
         args = decode_args(cls.types, data)
         return cls(*args)
+
+
+# packet types by packet id
+ClientPacket.packet_types = {packet_type.id: packet_type for packet_type in ClientPacket.__subclasses__()}
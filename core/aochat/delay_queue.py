@@ -1,48 +1,120 @@
+import bisect
 import time
+from collections import deque
+
+from core.dict_object import DictObject
 
 
 class DelayQueue:
-    def __init__(self, recovery: int, burst=0):
+    def __init__(self, recovery: int, burst=0, max_size=None):
+        """
+
+        :param recovery: number of seconds for one packet to be recovered
+        :param burst: number of packets, in addition to the first, that can be sent before waiting for recovery
+        :param max_size: max number of items in the queue, after which the lowest priority items are dropped
+        """
         self.recovery = recovery
         self.burst = burst
-        self.items = []
-        self.next_packet = 0
+        self.max_size = max_size
+
+        # FIFO of (enqueue_time, item) for each priority, and the sorted list of priorities that have items
+        self.queues = {}
+        self.priorities = []
+        self.size = 0
+
+        # token bucket, starts full
+        self.capacity = burst + 1
+        self.tokens = self.capacity
+        self.last_refill = time.time()
+
+        self.num_sent = 0
+        self.num_dropped = 0
+        self.total_wait_time = 0
+        self.max_wait_time = 0
 
     def enqueue(self, item, priority=50):
         """
 
         :param item:
         :param priority: 0 is highest priority
-        :return:
+        :return: False if the item was dropped because the queue is full
         """
-        index = 0
-        for _priority, _item in self.items:
-            if priority < _priority:
-                index += 1
-            else:
-                break
+        if self.max_size is not None and self.size >= self.max_size:
+            # shed lowest priority items first, and the newest item within that priority
+            lowest_priority = self.priorities[-1]
+            if priority >= lowest_priority:
+                self.num_dropped += 1
+                return False
+
+            self._pop(lowest_priority, newest=True)
+            self.num_dropped += 1
+
+        queue = self.queues.get(priority)
+        if queue is None:
+            queue = self.queues[priority] = deque()
+            bisect.insort(self.priorities, priority)
 
-        self.items.insert(index, (priority, item))
+        queue.append((time.time(), item))
+        self.size += 1
+        return True
 
     def dequeue(self):
-        if self.items:
-            t = time.time()
-            time_with_burst = t - (self.burst * self.recovery)
-            if self.next_packet < time_with_burst:
-                self.next_packet = time_with_burst
-
-            if t >= self.next_packet:
-                self.next_packet += self.recovery
-                (priority, item) = self.items.pop()
-                return item
-        else:
+        if not self.size:
+            return None
+
+        t = time.time()
+        self._refill(t)
+        if self.tokens < 1:
+            return None
+
+        self.tokens -= 1
+        enqueue_time, item = self._pop(self.priorities[0])
+
+        wait_time = t - enqueue_time
+        self.num_sent += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        return item
+
+    def get_delay(self):
+        """returns the number of seconds until the next item can be dequeued, or None if the queue is empty"""
+        if not self.size:
             return None
 
+        self._refill(time.time())
+        return max(0, (1 - self.tokens) * self.recovery)
+
+    def get_stats(self):
+        return DictObject({"size": self.size,
+                           "sent": self.num_sent,
+                           "dropped": self.num_dropped,
+                           "avg_wait_time": self.total_wait_time / self.num_sent if self.num_sent else 0,
+                           "max_wait_time": self.max_wait_time})
+
+    def _refill(self, t):
+        if self.recovery:
+            self.tokens = min(self.capacity, self.tokens + (t - self.last_refill) / self.recovery)
+        else:
+            self.tokens = self.capacity
+        self.last_refill = t
+
+    def _pop(self, priority, newest=False):
+        queue = self.queues[priority]
+        entry = queue.pop() if newest else queue.popleft()
+        if not queue:
+            del self.queues[priority]
+            self.priorities.remove(priority)
+        self.size -= 1
+        return entry
+
     def __len__(self):
-        return len(self.items)
+        return self.size
 
     def clear(self):
-        self.items = []
+        self.queues = {}
+        self.priorities = []
+        self.size = 0
 
     def is_empty(self):
-        return len(self.items) == 0
+        return self.size == 0
@@ -1,89 +1,62 @@
+import functools
+import mmap
 import struct
 from core.logger import Logger
 
 
 class MMDBParser:
+    MESSAGE_STRING_CACHE_SIZE = 1024
+
     def __init__(self, filename):
         self.filename = filename
         self.logger = Logger(__name__)
+        self.data = None
+        # (category_id, instance_id) => offset of the message string
+        self.index = None
+        self.get_cached_message_string = functools.lru_cache(maxsize=self.MESSAGE_STRING_CACHE_SIZE)(self.read_message_string)
+
+    def load(self):
+        """memory-maps the mmdb file and indexes the message strings, this is done automatically on first use"""
 
-    def get_message_string(self, category_id, instance_id):
         with open(self.filename, mode="rb") as file:
-            categories = self.get_categories(file)
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
 
-            try:
-                category = next(categories)
-                while category["id"] != category_id:
-                    category = next(categories)
-                next_category = next(categories)
-            except StopIteration:
-                return None
+        # the last category is a sentinel marking the end of the entries for the previous category
+        num_categories, = struct.unpack_from("<I", data, 4)
+        categories = list(struct.iter_unpack("<II", data[8:8 + num_categories * 8]))
 
-            instance = self.find_entry(file, instance_id, category["offset"], next_category["offset"])
+        index = {}
+        for (category_id, offset), (_, max_offset) in zip(categories, categories[1:]):
+            for instance_id, string_offset in struct.iter_unpack("<II", data[offset:max_offset]):
+                index[(category_id, instance_id)] = string_offset
 
-            if instance:
-                file.seek(instance["offset"])
-                return self.read_string(file)
-            else:
-                return None
+        self.data = data
+        self.index = index
+        self.get_cached_message_string.cache_clear()
+
+    def get_message_string(self, category_id, instance_id):
+        if self.index is None:
+            self.load()
+
+        return self.get_cached_message_string(category_id, instance_id)
+
+    def read_message_string(self, category_id, instance_id):
+        offset = self.index.get((category_id, instance_id))
+        if offset is None:
+            return None
+
+        end = self.data.find(b"\x00", offset)
+        if end == -1:
+            end = len(self.data)
+
+        return self.data[offset:end].decode("utf-8")
 
     def get_all_message_strings(self):
-        with open(self.filename, mode="rb") as file:
-            categories = iter(list(self.get_categories(file)))
-            next_category = next(categories)
-
-            while True:
-                try:
-                    category = next_category
-                    next_category = next(categories)
-                except StopIteration:
-                    break
-
-                max_offset = next_category["offset"]
-                file.seek(category["offset"])
-
-                instances = []
-                while file.tell() < max_offset:
-                    entry = self.read_entry(file)
-                    instances.append(entry)
-
-                for instance in instances:
-                    file.seek(instance["offset"])
-                    message_string = self.read_string(file)
-                    print([category["id"], instance["id"], message_string])
-
-    def find_entry(self, file, entry_id, min_offset, max_offset):
-        file.seek(min_offset)
-        entry = self.read_entry(file)
-        while file.tell() <= max_offset:
-            if entry["id"] == entry_id:
-                return entry
-            entry = self.read_entry(file)
-
-        return None
-
-    def get_categories(self, file):
-        file.seek(4)
-        num_categories = self.read_int(file)
-        for i in range(0, num_categories):
-            yield self.read_entry(file)
-
-    def read_entry(self, file):
-        return {"id": self.read_int(file), "offset": self.read_int(file)}
-
-    def read_int(self, file):
-        return int.from_bytes(file.read(4), byteorder="little")
-
-    def read_string(self, file):
-        message = bytearray()
-        char = file.read(1)
-        i = 0
-        while char and char != b'\x00':
-            i += 1
-            message.append(ord(char))
-            char = file.read(1)
+        if self.index is None:
+            self.load()
 
-        return message.decode("utf-8")
+        for category_id, instance_id in self.index.keys():
+            print([category_id, instance_id, self.get_message_string(category_id, instance_id)])
 
     def read_base_85(self, num_str):
         n = 0
@@ -100,39 +73,40 @@ class MMDBParser:
 
     def parse_params(self, param_arr):
         args = []
-        while len(param_arr) > 0:
-            data_type = chr(param_arr[0])
-            param_arr = param_arr[1:]
+        i = 0
+        while i < len(param_arr):
+            data_type = chr(param_arr[i])
+            i += 1
             if data_type == "S":
-                size = param_arr[0] * 256 + param_arr[1]
-                args.append(param_arr[2:2 + size].decode("utf-8"))
-                param_arr = param_arr[2 + size:]
+                size = param_arr[i] * 256 + param_arr[i + 1]
+                args.append(param_arr[i + 2:i + 2 + size].decode("utf-8"))
+                i += 2 + size
             elif data_type == "s":
-                size = param_arr[0] - 1  # size is 1 less than indicated
-                args.append(param_arr[1:1 + size].decode("utf-8"))
-                param_arr = param_arr[1 + size:]
+                size = param_arr[i] - 1  # size is 1 less than indicated
+                args.append(param_arr[i + 1:i + 1 + size].decode("utf-8"))
+                i += 1 + size
             elif data_type == "I":
-                args.append(struct.unpack(">I", param_arr[:4])[0])
-                param_arr = param_arr[4:]
+                args.append(struct.unpack_from(">I", param_arr, i)[0])
+                i += 4
             elif data_type == "i" or data_type == "u":
-                args.append(self.read_base_85(param_arr[:5]))
-                param_arr = param_arr[5:]
+                args.append(self.read_base_85(param_arr[i:i + 5]))
+                i += 5
             elif data_type == "R":
-                category_id = self.read_base_85(param_arr[:5])
-                instance_id = self.read_base_85(param_arr[5:10])
+                category_id = self.read_base_85(param_arr[i:i + 5])
+                instance_id = self.read_base_85(param_arr[i + 5:i + 10])
                 message = self.get_message_string(category_id, instance_id)
                 if not message:
                     raise Exception("Could not find message string for category '%d' and instance '%d'" % (category_id, instance_id))
                 args.append(message)
-                param_arr = param_arr[10:]
+                i += 10
             elif data_type == "l":
                 category_id = 20000
-                instance_id = struct.unpack(">I", param_arr[:4])[0]
+                instance_id = struct.unpack_from(">I", param_arr, i)[0]
                 message = self.get_message_string(category_id, instance_id)
                 if not message:
                     raise Exception("Could not find message string for category '%d' and instance '%d'" % (category_id, instance_id))
                 args.append(message)
-                param_arr = param_arr[4:]
+                i += 4
             elif data_type == "~":
                 break
             else:
@@ -9,86 +9,178 @@ class PacketMissingArgument(Exception):
     pass
 
 
-def decode_args(types, data):
-    args = []
-    for argtype in types:
-        if argtype == "I":
-            elem, data = data[:4], data[4:]
-            result = struct.unpack(">I", elem)[0]
-
-        elif argtype == "S":
-            length = struct.unpack(">H", data[:2])[0]
-            result = data[2:2 + length].decode("utf-8", "ignore")
-            data = data[2 + length:]
-
-        elif argtype == "B":
-            length = struct.unpack(">H", data[:2])[0]
-            result = data[2:2 + length]
-            data = data[2 + length:]
-
-        elif argtype == "G":
-            result, data = data[:5], data[5:]
-            # Convert result (5 bytes) to a long.  Can't use
-            # struct.unpack(">Q", "\x00"*3 + result), since we
-            # can't rely on "long long" being available.
-            high, low = struct.unpack(">BI", result)
-            result = (high << 32) + low
-
-        elif argtype == "i":
-            length = struct.unpack(">H", data[:2])[0]
-            result = struct.unpack(">%sI" % length, data[2:2 + 4 * length])
-            data = data[2 + 4 * length:]
-
-        elif argtype == "s":
-            length = struct.unpack(">H", data[:2])[0]
-            data = data[2:]
-            result = []
-            while length:
-                slength = struct.unpack(">H", data[:2])[0]
-                result.append(data[2:2 + slength].decode("utf-8"))
-                data = data[2 + slength:]
-                length -= 1
+UINT16 = struct.Struct(">H")
+UINT32 = struct.Struct(">I")
+UINT40 = struct.Struct(">BI")
+
+# compiled decoders and encoders by packet types
+decoders = {}
+encoders = {}
 
-        else:
-            raise UnknownArgumentType(argtype)
 
-        args.append(result)
+def decode_args(types, data):
+    decoder = decoders.get(types)
+    if decoder is None:
+        decoder = decoders[types] = compile_decoder(types)
 
-    return args
+    return decoder(memoryview(data))
 
 
 def encode_args(types, args):
-    data = b""
+    encoder = encoders.get(types)
+    if encoder is None:
+        encoder = encoders[types] = compile_encoder(types)
 
-    for argtype in types:
-        if not args:
-            raise PacketMissingArgument
+    if len(args) < len(types):
+        raise PacketMissingArgument
+
+    return encoder(args)
 
-        it = args[0]
-        del args[0]
 
+def compile_decoder(types):
+    readers = []
+    for argtype, count in group_types(types):
         if argtype == "I":
-            data += struct.pack(">I", it)
+            readers.append(read_uint32s(count))
+        else:
+            reader = arg_readers.get(argtype)
+            if reader is None:
+                raise UnknownArgumentType(argtype)
+            readers.extend([reader] * count)
 
-        elif argtype == "S":
-            encoded = it.encode("utf-8")
-            data += struct.pack(">H", len(encoded))
-            data += encoded
+    def decode(view):
+        args = []
+        offset = 0
+        for reader in readers:
+            offset = reader(view, offset, args)
+        return args
 
-        elif argtype == "G":
-            data += struct.pack(">BI", it >> 32, it & 0xffffffff)
+    return decode
 
-        elif argtype == "s":
-            data += struct.pack(">H", len(it))
-            for it_elem in it:
-                encoded = it_elem.encode("utf-8")
-                data += struct.pack(">H", len(encoded))
-                data += encoded
 
+def group_types(types):
+    # groups consecutive arg types so that consecutive ints can be read with a single struct
+    groups = []
+    for argtype in types:
+        if groups and groups[-1][0] == argtype:
+            groups[-1][1] += 1
         else:
+            groups.append([argtype, 1])
+    return groups
+
+
+def read_uint32s(count):
+    s = struct.Struct(">%dI" % count)
+
+    def read(view, offset, args):
+        args.extend(s.unpack_from(view, offset))
+        return offset + s.size
+
+    return read
+
+
+def read_string(view, offset, args):
+    length, = UINT16.unpack_from(view, offset)
+    offset += 2
+    args.append(str(view[offset:offset + length], "utf-8", "ignore"))
+    return offset + length
+
+
+def read_bytes(view, offset, args):
+    length, = UINT16.unpack_from(view, offset)
+    offset += 2
+    args.append(bytes(view[offset:offset + length]))
+    return offset + length
+
+
+def read_uint40(view, offset, args):
+    high, low = UINT40.unpack_from(view, offset)
+    args.append((high << 32) + low)
+    return offset + 5
+
+
+def read_uint32_list(view, offset, args):
+    length, = UINT16.unpack_from(view, offset)
+    offset += 2
+    args.append(struct.unpack_from(">%dI" % length, view, offset))
+    return offset + 4 * length
+
+
+def read_string_list(view, offset, args):
+    length, = UINT16.unpack_from(view, offset)
+    offset += 2
+    result = []
+    for _ in range(length):
+        slength, = UINT16.unpack_from(view, offset)
+        offset += 2
+        result.append(str(view[offset:offset + slength], "utf-8"))
+        offset += slength
+    args.append(result)
+    return offset
+
+
+arg_readers = {
+    "S": read_string,
+    "B": read_bytes,
+    "G": read_uint40,
+    "i": read_uint32_list,
+    "s": read_string_list
+}
+
+
+def compile_encoder(types):
+    writers = []
+    for argtype in types:
+        writer = arg_writers.get(argtype)
+        if writer is None:
             raise UnknownArgumentType(argtype)
+        writers.append(writer)
+
+    def encode(args):
+        # the parts are joined once at the end so that the packet is only copied once
+        parts = []
+        for writer, arg in zip(writers, args):
+            writer(parts, arg)
+        return b"".join(parts)
+
+    return encode
+
+
+def write_uint32(parts, it):
+    parts.append(UINT32.pack(it))
+
+
+def write_string(parts, it):
+    write_bytes(parts, it.encode("utf-8"))
+
+
+def write_bytes(parts, it):
+    parts.append(UINT16.pack(len(it)))
+    parts.append(it)
+
+
+def write_uint40(parts, it):
+    parts.append(UINT40.pack(it >> 32, it & 0xffffffff))
+
+
+def write_uint32_list(parts, it):
+    parts.append(struct.pack(">H%dI" % len(it), len(it), *it))
+
+
+def write_string_list(parts, it):
+    parts.append(UINT16.pack(len(it)))
+    for it_elem in it:
+        write_string(parts, it_elem)
+
 
-    return data
+arg_writers = {
+    "I": write_uint32,
+    "S": write_string,
+    "B": write_bytes,
+    "G": write_uint40,
+    "i": write_uint32_list,
+    "s": write_string_list
+}
 
 
 class Packet:
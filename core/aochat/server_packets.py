@@ -16,56 +16,9 @@ class ServerPacket(Packet):
 
     @classmethod
     def get_instance(cls, packet_id, data):
-        if packet_id == LoginSeed.id:
-            return LoginSeed.from_bytes(data)
-        elif packet_id == LoginOK.id:
-            return LoginOK.from_bytes(data)
-        elif packet_id == LoginError.id:
-            return LoginError.from_bytes(data)
-        elif packet_id == LoginCharacterList.id:
-            return LoginCharacterList.from_bytes(data)
-        elif packet_id == CharacterUnknown.id:
-            return CharacterUnknown.from_bytes(data)
-        elif packet_id == CharacterName.id:
-            return CharacterName.from_bytes(data)
-        elif packet_id == CharacterLookup.id:
-            return CharacterLookup.from_bytes(data)
-        elif packet_id == PrivateMessage.id:
-            return PrivateMessage.from_bytes(data)
-        elif packet_id == VicinityMessage.id:
-            return VicinityMessage.from_bytes(data)
-        elif packet_id == BroadcastMessage.id:
-            return BroadcastMessage.from_bytes(data)
-        elif packet_id == SimpleSystemMessage.id:
-            return SimpleSystemMessage.from_bytes(data)
-        elif packet_id == SystemMessage.id:
-            return SystemMessage.from_bytes(data)
-        elif packet_id == BuddyAdded.id:
-            return BuddyAdded.from_bytes(data)
-        elif packet_id == BuddyRemoved.id:
-            return BuddyRemoved.from_bytes(data)
-        elif packet_id == PrivateChannelInvited.id:
-            return PrivateChannelInvited.from_bytes(data)
-        elif packet_id == PrivateChannelKicked.id:
-            return PrivateChannelKicked.from_bytes(data)
-        elif packet_id == PrivateChannelLeft.id:
-            return PrivateChannelLeft.from_bytes(data)
-        elif packet_id == PrivateChannelClientJoined.id:
-            return PrivateChannelClientJoined.from_bytes(data)
-        elif packet_id == PrivateChannelClientLeft.id:
-            return PrivateChannelClientLeft.from_bytes(data)
-        elif packet_id == PrivateChannelMessage.id:
-            return PrivateChannelMessage.from_bytes(data)
-        elif packet_id == PrivateChannelInviteRefused.id:
-            return PrivateChannelInviteRefused.from_bytes(data)
-        elif packet_id == PublicChannelJoined.id:
-            return PublicChannelJoined.from_bytes(data)
-        elif packet_id == PublicChannelLeft.id:
-            return PublicChannelLeft.from_bytes(data)
-        elif packet_id == PublicChannelMessage.id:
-            return PublicChannelMessage.from_bytes(data)
-        elif packet_id == Pong.id:
-            return Pong.from_bytes(data)
+        packet_type = cls.packet_types.get(packet_id)
+        if packet_type:
+            return packet_type.from_bytes(data)
         else:
             return None
 
@@ -454,3 +407,7 @@ class Pong(ServerPacket):
     def from_bytes(cls, data):
         args = decode_args(cls.types, data)
         return cls(*args)
+
+
+# packet types by packet id
+ServerPacket.packet_types = {packet_type.id: packet_type for packet_type in ServerPacket.__subclasses__()}
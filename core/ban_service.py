@@ -17,6 +17,7 @@ class BanService:
         self.db = registry.get_instance("db")
         self.event_service = registry.get_instance("event_service")
         self.command_service = registry.get_instance("command_service")
+        self.access_service = registry.get_instance("access_service")
 
     def pre_start(self):
         self.event_service.register_event_type(self.BAN_ADDED_EVENT)
@@ -38,6 +39,7 @@ class BanService:
                                 [char_id, sender_char_id, t, finished_at, reason])
 
         if num_rows:
+            self.access_service.clear_access_level_cache()
             self.event_service.fire_event(self.BAN_ADDED_EVENT, DictObject({"char_id": char_id, "sender_char_id": sender_char_id, "duration": duration, "reason": reason}))
 
         return num_rows
@@ -47,6 +49,7 @@ class BanService:
         num_rows = self.db.exec("UPDATE ban_list SET ended_early = 1 WHERE char_id = ? AND (finished_at > ? OR finished_at = -1)", [char_id, t])
 
         if num_rows:
+            self.access_service.clear_access_level_cache()
             self.event_service.fire_event(self.BAN_REMOVED_EVENT, DictObject({"char_id": char_id, "sender_char_id": sender_char_id}))
 
         return num_rows
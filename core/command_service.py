@@ -1,3 +1,4 @@
+from core import metrics
 from core.command_request import CommandRequest
 from core.conn import Conn
 from core.decorators import instance
@@ -11,21 +12,27 @@ from core.setting_service import SettingService
 from core.registry import Registry
 from core.logger import Logger
 from core.chat_blob import ChatBlob
+from core.command_param_types import Const, Options
 from core.functions import flatmap, get_attrs
 import collections
 import re
 import inspect
+import time
 
 
 @instance()
 class CommandService:
     PRIVATE_MESSAGE_CHANNEL = "msg"
 
+    command_duration_metric = metrics.registry.histogram("tyrbot_command_duration_seconds", "Time to run commands and send their replies, by handler", ["handler"])
+
     def __init__(self):
         self.handlers: dict[str, list[dict]] = collections.defaultdict(list)
         self.logger = Logger(__name__)
         self.channels = {}
         self.pre_processors = []
+        # enabled command configs indexed by (command, channel), loaded from the db on demand
+        self.command_config_cache = None
         self.ignore_regexes = [
             re.compile(r" is AFK \(Away from keyboard\) since ", re.IGNORECASE),
             re.compile(r"I am away from my keyboard right now", re.IGNORECASE),
@@ -75,6 +82,8 @@ class CommandService:
 
                     self.register(handler, cmd_name, params, access_level, description, inst.module_name, help_text, sub_command, extended_description)
 
+        self.load_command_configs()
+
     def register(self, handler, command, params, access_level, description, module, help_text=None, sub_command=None, extended_description=None, check_access=None):
         """
         Call during pre_start
@@ -138,7 +147,10 @@ class CommandService:
 
         # save reference to command handler
         r = re.compile(self.get_regex_from_params(params), re.IGNORECASE | re.DOTALL)
-        self.handlers[command_key].append({"regex": r, "callback": handler, "help": help_text, "description": description, "params": params, "check_access": check_access})
+        self.handlers[command_key].append({"regex": r, "callback": handler, "help": help_text, "description": description, "params": params, "check_access": check_access,
+                                           "literal": self.get_literal_prefix(params)})
+
+        self.clear_command_config_cache()
 
     def register_command_pre_processor(self, pre_processor):
         """
@@ -196,7 +208,7 @@ class CommandService:
                 if alias_depth_count > 20:
                     raise Exception("Command alias infinite recursion detected for command '%s'" % message)
 
-            cmd_configs = self.get_command_configs(command_str, channel, 1)
+            cmd_configs = self.get_enabled_command_configs(command_str, channel)
             access_level = self.access_service.get_access_level(char_id)
             sender = SenderObj(char_id, self.character_service.resolve_char_to_name(char_id, "Unknown(%d)" % char_id), access_level)
             if cmd_configs:
@@ -204,21 +216,22 @@ class CommandService:
                 cmd_config, matches, handler = self.get_matches(cmd_configs, command_args)
                 if matches:
                     if handler["check_access"](char_id, cmd_config.access_level):
-                        response = handler["callback"](CommandRequest(conn, channel, sender, reply), *self.process_matches(matches, handler["params"]))
-                        if response is not None:
-                            reply(response)
+                        handler_name = self.util.get_handler_name(handler["callback"])
+                        start_time = time.perf_counter()
+                        try:
+                            response = handler["callback"](CommandRequest(conn, channel, sender, reply), *self.process_matches(matches, handler["params"]))
+                            if response is not None:
+                                reply(response)
+                        finally:
+                            self.command_duration_metric.labels(handler_name).observe(time.perf_counter() - start_time)
 
                         # record command usage
-                        self.usage_service.add_usage(command_str, self.util.get_handler_name(handler["callback"]), char_id, channel)
+                        self.usage_service.add_usage(command_str, handler_name, char_id, channel)
                     else:
                         self.access_denied_response(message, sender, cmd_config, reply)
                 else:
                     # handlers were found, but no handler regex matched
-                    data = self.db.query("SELECT command, sub_command, access_level FROM command_config "
-                                         "WHERE command = ? AND channel = ? AND enabled = 1",
-                                         [command_str, channel])
-
-                    help_text = self.format_help_text(data, char_id)
+                    help_text = self.format_help_text(cmd_configs, char_id)
                     if help_text:
                         reply(self.format_help_text_blob(command_str, help_text))
                     else:
@@ -260,11 +273,42 @@ class CommandService:
 
         return self.db.query(sql, params)
 
+    def get_enabled_command_configs(self, command, channel):
+        command_configs = self.command_config_cache
+        if command_configs is None:
+            command_configs = self.load_command_configs()
+
+        return command_configs.get((command, channel), [])
+
+    def load_command_configs(self):
+        data = self.db.query("SELECT command, sub_command, access_level, channel, enabled FROM command_config "
+                             "WHERE enabled = 1 AND verified = 1 "
+                             "ORDER BY sub_command, channel")
+
+        command_configs = {}
+        for row in data:
+            command_configs.setdefault((row.command, row.channel), []).append(row)
+
+        # replace the whole cache at once so concurrent readers never see a partially loaded index
+        self.command_config_cache = command_configs
+        return command_configs
+
+    def clear_command_config_cache(self):
+        """Call after changing rows in the command_config table"""
+
+        self.command_config_cache = None
+
     def get_matches(self, cmd_configs, command_args):
+        # first word of the command args, used to skip handlers whose first param is a literal that cannot match
+        args_prefix = command_args.lstrip().lower()
         for row in cmd_configs:
             command_key = self.get_command_key(row.command, row.sub_command)
             handlers = self.handlers[command_key]
             for handler in handlers:
+                literal = handler["literal"]
+                if literal and not args_prefix.startswith(literal):
+                    continue
+
                 matches = handler["regex"].search(command_args)
                 if matches:
                     return row, matches, handler
@@ -321,6 +365,20 @@ class CommandService:
         else:
             return parts[0], ""
 
+    def get_literal_prefix(self, params):
+        # returns the literal value(s) that the command args must start with for the handler regex
+        # to match, or None if the first param is not a required literal
+        if not params:
+            return None
+
+        param = params[0]
+        if type(param) is Const and not param.is_optional and re.escape(param.name) == param.name:
+            return param.name.lower()
+        elif type(param) is Options and not param.is_optional and param.options:
+            return tuple(map(lambda x: x.lower(), param.options))
+        else:
+            return None
+
     def get_regex_from_params(self, params):
         # params must be wrapped with line-beginning and line-ending anchors in order to match
         # when no params are specified (eg. "^$")
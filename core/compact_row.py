@@ -0,0 +1,84 @@
+from operator import itemgetter
+
+
+class CompactRow(tuple):
+    """
+    Read-only result row that stores its values in a tuple, and shares the column names and accessors
+    with every other row that has the same columns. Supports the same attribute and key access as DictObject,
+    and the read-only parts of the dict interface, but not setting values.
+    """
+
+    __slots__ = ()
+
+    # column name -> index, set on the subclass for each set of columns
+    _columns = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._columns[key])
+        return tuple.__getitem__(self, key)
+
+    def __iter__(self):
+        # iterates over the column names, like a dict
+        return iter(self._columns)
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return other == CompactRow.to_dict(self)
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+    def __repr__(self):
+        return repr(CompactRow.to_dict(self))
+
+    def __reduce__(self):
+        # the row classes are created at runtime, so they are recreated from the column names when unpickling
+        return make_row, (self._column_names, tuple(tuple.__iter__(self)))
+
+    def get(self, key, default=None):
+        index = self._columns.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._columns.keys()
+
+    def values(self):
+        return list(tuple.__iter__(self))
+
+    def items(self):
+        return list(zip(self._columns, tuple.__iter__(self)))
+
+    def to_dict(self):
+        return dict(zip(self._columns, tuple.__iter__(self)))
+
+
+# row classes by column names
+row_classes = {}
+
+
+def get_row_class(columns):
+    """returns the row class for the column names, so that rows from the same query share their column index and accessors"""
+
+    columns = tuple(columns)
+    cls = row_classes.get(columns)
+    if cls is None:
+        # with duplicate column names, the last one wins, the same as when building a dict
+        index = {name: i for i, name in enumerate(columns)}
+        namespace = {name: property(itemgetter(i)) for name, i in index.items()}
+        namespace["__slots__"] = ()
+        namespace["_columns"] = index
+        namespace["_column_names"] = columns
+        cls = row_classes[columns] = type("CompactRow", (CompactRow,), namespace)
+
+    return cls
+
+
+def make_row(columns, values):
+    return get_row_class(columns)(values)
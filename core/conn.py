@@ -1,5 +1,6 @@
 import asyncio
 import struct
+from collections import Counter
 import threading
 import time
 
@@ -15,6 +16,15 @@ from core.registry import Registry
 
 
 class Conn:
+    # max time, in seconds, that the packet writer sleeps before checking the bot status and keepalive
+    MAX_WRITER_SLEEP = 1
+
+    # priorities of the messages in the outgoing message queue, 0 is highest. when the queue is full, the lowest
+    # priority messages are dropped first, so that replies to commands are not dropped because of mass messages
+    PRIORITY_PRIVATE_MESSAGE = 10
+    PRIORITY_ORG_MESSAGE = 20
+    PRIORITY_MASS_MESSAGE = 90
+
     def __init__(self, _id, failure_callback, async_service):
         self.id = _id
         self.logger = Logger(__name__)
@@ -29,8 +39,20 @@ class Conn:
         self.packet_loop_task = None
         self.async_service = async_service
 
-        self.packet_queue = DelayQueue(2, 2.5)
+        # when the queue is full, the lowest priority messages are dropped
+        self.packet_queue = DelayQueue(2, 2.5, max_size=30)
+        self.packet_queue_num_dropped = 0
+        self.packet_queue_lock = threading.Lock()
+        self.outgoing_event: asyncio.Event = None
+        self.mass_message_queue = None
         self.packet_last_received_timestamp = time.time()
+        # ids of the packets that are decoded and queued by the packet reader, or None for all packets
+        self.packet_filter = None
+        self.num_filtered_packets = 0
+        self.num_filtered_bytes = 0
+        # number of packets by packet id, counted on the asyncio loop
+        self.num_packets_received = Counter()
+        self.num_packets_sent = Counter()
         self.send_lock = threading.Lock()
         self.org_channel_id = None
         self.org_id = None
@@ -62,12 +84,15 @@ class Conn:
             self.writer = None
             self.reader = None
 
-    async def _async_read_packet(self, timeout=1):
+    async def _async_read_packet(self, timeout=1, packet_filter=None):
         if not self.reader:
             return None
 
         try:
-            head = await asyncio.wait_for(self.reader.readexactly(4), timeout=timeout)
+            if timeout is None:
+                head = await self.reader.readexactly(4)
+            else:
+                head = await asyncio.wait_for(self.reader.readexactly(4), timeout=timeout)
         except asyncio.TimeoutError:
             return None
         except (asyncio.IncompleteReadError, EOFError, ConnectionError, OSError):
@@ -76,10 +101,22 @@ class Conn:
         packet_type, packet_length = struct.unpack(">2H", head)
 
         try:
-            data = await asyncio.wait_for(self.reader.readexactly(packet_length), timeout=10)
+            if timeout is None:
+                data = await self.reader.readexactly(packet_length)
+            else:
+                data = await asyncio.wait_for(self.reader.readexactly(packet_length), timeout=10)
         except (asyncio.IncompleteReadError, EOFError, ConnectionError, OSError):
             raise EOFError("Connection closed while reading packet payload")
 
+        self.packet_last_received_timestamp = time.time()
+        self.num_packets_received[packet_type] += 1
+
+        if packet_filter is not None and packet_type not in packet_filter:
+            # nothing handles this packet for this conn, so it is not decoded
+            self.num_filtered_packets += 1
+            self.num_filtered_bytes += 4 + packet_length
+            return None
+
         try:
             return ServerPacket.get_instance(packet_type, data)
         except Exception:
@@ -93,6 +130,7 @@ class Conn:
         data = packet.to_bytes()
         header = struct.pack(">2H", packet.id, len(data))
         self.writer.write(header + data)
+        self.num_packets_sent[packet.id] += 1
         await self.writer.drain()
 
     async def _async_login(self, username, password, character, is_main, wait_for_logged_in=20):
@@ -139,16 +177,48 @@ class Conn:
             self.logger.error(f"{char_user_prefix} Error logging in: {msg}")
             return False, packet
 
-    async def _async_packet_loop(self, incoming_queue, mass_message_queue, get_bot_status):
-        while get_bot_status() == BotStatus.RUN:
-            try:
-                self.check_outgoing_message_queue()
-                packet = await self._async_read_packet(timeout=1)
+    async def _async_packet_loop(self, incoming_queue, get_bot_status):
+        # incoming and outgoing packets are handled by separate tasks, so that neither has to poll for the other
+        self.outgoing_event = asyncio.Event()
+        tasks = [asyncio.ensure_future(self._async_reader_loop(incoming_queue, get_bot_status)),
+                 asyncio.ensure_future(self._async_writer_loop(get_bot_status))]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.outgoing_event = None
+            for task in tasks:
+                task.cancel()
+
+    async def _async_reader_loop(self, incoming_queue, get_bot_status):
+        try:
+            while get_bot_status() == BotStatus.RUN:
+                packet = await self._async_read_packet(timeout=None, packet_filter=self.packet_filter)
                 if packet:
-                    self.packet_last_received_timestamp = time.time()
                     incoming_queue.put((self, packet))
-                else:
-                    time_since = time.time() - self.packet_last_received_timestamp
+        except (EOFError, ConnectionError, OSError) as e:
+            self.logger.error(f"[{self.id}] Connection lost: {e}")
+            if self.failure_callback:
+                self.failure_callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.logger.error(f"[{self.id}] Unexpected error in packet reader", exc_info=True)
+            if self.failure_callback:
+                self.failure_callback()
+
+    async def _async_writer_loop(self, get_bot_status):
+        next_keepalive_check = 0
+        try:
+            while get_bot_status() == BotStatus.RUN:
+                self.outgoing_event.clear()
+
+                self.check_mass_message_queue()
+                await self._async_send_outgoing_packets()
+
+                t = time.time()
+                if t >= next_keepalive_check:
+                    next_keepalive_check = t + self.MAX_WRITER_SLEEP
+                    time_since = t - self.packet_last_received_timestamp
                     if time_since > 90:
                         self.logger.error(f"no packet received in 90 seconds for conn {self.id}")
                         if self.failure_callback:
@@ -156,73 +226,98 @@ class Conn:
                     elif time_since > 60:
                         await self._async_send_packet(Ping("tyrbot_aochat"))
 
-                if mass_message_queue:
-                    if FeatureFlags.FORCE_LARGE_MESSAGES_FROM_SLAVES:
-                        if self.packet_queue.is_empty():
-                            pkt = mass_message_queue.get_or_default(block=False)
-                            if pkt:
-                                self.add_packets_to_queue([pkt])
-                    else:
-                        while self.packet_queue.is_empty():
-                            pkt = mass_message_queue.get_or_default(block=False)
-                            if pkt:
-                                self.add_packets_to_queue([pkt])
-                            else:
-                                break
-
-                await asyncio.sleep(0.01)
-            except (EOFError, ConnectionError, OSError) as e:
-                self.logger.error(f"[{self.id}] Connection lost: {e}")
-                if self.failure_callback:
-                    self.failure_callback()
-                break
-            except Exception as e:
-                self.logger.error(f"[{self.id}] Unexpected error in packet loop", exc_info=True)
-                if self.failure_callback:
-                    self.failure_callback()
-                break
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                if isinstance(e, (EOFError, ConnectionResetError)):
-                    self.logger.warning(f"[{self.id}] Connection closed")
-                    if self.failure_callback:
-                        self.failure_callback()
-                    break
-                self.logger.error(f"[{self.id}] Error in packet loop", exc_info=True)
-                await asyncio.sleep(1)
+                # sleep until more packets are queued, or until the next queued packet can be sent
+                timeout = self.MAX_WRITER_SLEEP
+                delay = self.packet_queue.get_delay()
+                if delay is not None:
+                    timeout = min(timeout, delay)
+
+                try:
+                    await asyncio.wait_for(self.outgoing_event.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except (EOFError, ConnectionError, OSError) as e:
+            self.logger.error(f"[{self.id}] Connection lost: {e}")
+            if self.failure_callback:
+                self.failure_callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.logger.error(f"[{self.id}] Unexpected error in packet writer", exc_info=True)
+            if self.failure_callback:
+                self.failure_callback()
 
-    # Queue and helper methods
+    async def _async_send_outgoing_packets(self):
+        packets = []
+        with self.packet_queue_lock:
+            outgoing_packet = self.packet_queue.dequeue()
+            while outgoing_packet:
+                packets.append(outgoing_packet)
+                outgoing_packet = self.packet_queue.dequeue()
+
+            num_dropped = self.packet_queue.num_dropped - self.packet_queue_num_dropped
+            if num_dropped:
+                self.packet_queue_num_dropped = self.packet_queue.num_dropped
+                self.logger.warning("dropped %d messages from outgoing message queue" % num_dropped)
+
+            num_messages = len(self.packet_queue)
+            if num_messages > 10:
+                self.logger.warning("%d messages in outgoing message queue" % num_messages)
 
-    def add_packets_to_queue(self, packets):
         for packet in packets:
-            self.packet_queue.enqueue(packet)
-        self.check_outgoing_message_queue()
-
-    def check_outgoing_message_queue(self):
-        # check packet queue for outgoing packets
-        outgoing_packet = self.packet_queue.dequeue()
-        while outgoing_packet:
-            self._send_outgoing_packet(outgoing_packet)
-            outgoing_packet = self.packet_queue.dequeue()
+            await self._async_send_packet(packet)
 
-        num_messages = len(self.packet_queue)
-        if num_messages > 30:
-            self.logger.warning("automatically clearing outgoing message queue (%d messages)" % num_messages)
-            self.packet_queue.clear()
-        elif num_messages > 10:
-            self.logger.warning("%d messages in outgoing message queue" % num_messages)
+    # Queue and helper methods
+
+    def add_packets_to_queue(self, packets, priority=PRIORITY_PRIVATE_MESSAGE):
+        """returns the number of packets that were queued, the rest were dropped since the queue is full of higher priority packets"""
+
+        num_queued = 0
+        num_rejected = 0
+        with self.packet_queue_lock:
+            for packet in packets:
+                if self.packet_queue.enqueue(packet, priority):
+                    num_queued += 1
+                else:
+                    num_rejected += 1
+
+            if num_rejected:
+                # reported here instead of by the packet writer, which only reports the queued packets that were dropped
+                self.packet_queue_num_dropped += num_rejected
+                self.logger.warning(f"[{self.id}] outgoing message queue is full, dropped {num_rejected} new messages with priority {priority}")
+
+        self.notify_packet_writer()
+        return num_queued
+
+    def notify_packet_writer(self):
+        # wake up the packet writer, this can be called from any thread
+        outgoing_event = self.outgoing_event
+        if outgoing_event:
+            self.async_service.loop.call_soon_threadsafe(outgoing_event.set)
+
+    def check_mass_message_queue(self):
+        if not self.mass_message_queue:
+            return
+
+        with self.packet_queue_lock:
+            if FeatureFlags.FORCE_LARGE_MESSAGES_FROM_SLAVES:
+                if self.packet_queue.is_empty():
+                    pkt = self.mass_message_queue.get_or_default(block=False)
+                    if pkt:
+                        self.packet_queue.enqueue(pkt, self.PRIORITY_MASS_MESSAGE)
+            else:
+                while self.packet_queue.is_empty():
+                    pkt = self.mass_message_queue.get_or_default(block=False)
+                    if pkt:
+                        self.packet_queue.enqueue(pkt, self.PRIORITY_MASS_MESSAGE)
+                    else:
+                        break
 
     def send_packet(self, packet, timeout=10):
         # synchronize sending packets
         with self.send_lock:
             return self.async_service.run_until_complete(self._async_send_packet(packet), timeout=timeout)
 
-    def _send_outgoing_packet(self, packet):
-        # synchronize sending packets
-        with self.send_lock:
-            self.async_service.run_coroutine(self._async_send_packet(packet))
-    
     def disconnect(self, timeout=5):
         return self.async_service.run_until_complete(self._async_disconnect(), timeout=timeout)
     
@@ -237,8 +332,9 @@ class Conn:
         )
         
     def start_packet_loop(self, incoming_queue, mass_message_queue, get_bot_status):
+        self.mass_message_queue = mass_message_queue
         self.packet_loop_task = self.async_service.run_coroutine(
-            self._async_packet_loop(incoming_queue, mass_message_queue, get_bot_status)
+            self._async_packet_loop(incoming_queue, get_bot_status)
         )
 
     def get_char_name(self):
@@ -1,26 +1,104 @@
+from core import metrics
+from core.compact_row import CompactRow, get_row_class
 from core.decorators import instance
 from core.dict_object import DictObject
 from core.logger import Logger
-from packaging.version import parse as parse_version
+from core.sql_profiler import SqlProfiler
+import hashlib
 import mysql.connector
 import sqlite3
 import re
 import os
+import threading
 import time
 
 
+class ThreadState(threading.local):
+    def __init__(self):
+        self.conn = None
+        self.transaction_level = 0
+        self.lastrowid = None
+
+
+class ConnectionPool:
+    def __init__(self, connect, size):
+        """
+
+        :param connect: function that opens a new connection
+        :param size: max number of open connections, after which threads wait for a connection to be released
+        """
+        self.connect = connect
+        self.size = size
+        self.idle = []
+        self.num_connections = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while not self.idle and self.num_connections >= self.size:
+                self.condition.wait()
+
+            if self.idle:
+                return self.idle.pop()
+
+            self.num_connections += 1
+
+        try:
+            return self.connect()
+        except Exception:
+            with self.condition:
+                self.num_connections -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, conn):
+        with self.condition:
+            self.idle.append(conn)
+            self.condition.notify()
+
+    def discard(self, conn):
+        with self.condition:
+            self.num_connections -= 1
+            self.condition.notify()
+
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self.condition:
+            for conn in self.idle:
+                conn.close()
+            self.num_connections -= len(self.idle)
+            self.idle = []
+
+
 @instance()
 class DB:
     SQLITE = "sqlite"
     MYSQL = "mysql"
 
+    DEFAULT_POOL_SIZE = 10
+    MAX_BATCH_SIZE = 1000
+    MAX_SQL_FILE_BATCH_SIZE = 500
+    # statement types that queries are timed by, all others are timed as OTHER
+    STATEMENT_TYPES = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE"}
+
+    statement_type_regex = re.compile(r"\s*(\w+)")
+    query_duration_metric = metrics.registry.histogram("tyrbot_db_query_duration_seconds", "Time to execute queries and fetch their results, by statement type",
+                                                       ["statement"])
+
     def __init__(self):
-        self.conn = None
+        self.pool = None
+        self.profiler = None
         self.enhanced_like_regex = re.compile(r"(\s+)(\S+)\s+<EXTENDED_LIKE=(\d+)>\s+\?(\s*)", re.IGNORECASE)
-        self.lastrowid = None
+        self.sql_file_insert_regex = re.compile(r"^(INSERT INTO [^ ]+( \(.*?\))? VALUES\s*)(\(.*?\));?$")
         self.logger = Logger(__name__)
         self.type = None
-        self.transaction_level = 0
+
+        # connection, transaction level and last insert id of the current thread
+        self.thread_state = ThreadState()
 
     def sqlite_row_factory(self, cursor: sqlite3.Cursor, row):
         d = {}
@@ -28,49 +106,94 @@ class DB:
             d[col[0]] = row[idx]
         return d
 
-    def connect_mysql(self, host, port, username, password, database_name):
+    def connect_mysql(self, host, port, username, password, database_name, pool_size=None):
+        def connect():
+            conn = mysql.connector.connect(user=username, password=password, host=host, port=port, database=database_name, charset="utf8", autocommit=True)
+            with conn.cursor() as cur:
+                cur.execute("SET collation_connection = 'utf8_general_ci'")
+                cur.execute("SET sql_mode = 'TRADITIONAL,ANSI'")
+            return conn
+
+        self.close()
         self.type = self.MYSQL
-        self.conn = mysql.connector.connect(user=username, password=password, host=host, port=port, database=database_name, charset="utf8", autocommit=True)
-        self.exec("SET collation_connection = 'utf8_general_ci'")
-        self.exec("SET sql_mode = 'TRADITIONAL,ANSI'")
+        self.pool = ConnectionPool(connect, int(pool_size or self.DEFAULT_POOL_SIZE))
         self.create_db_version_table()
 
-    def connect_sqlite(self, filename):
+    def connect_sqlite(self, filename, pool_size=None):
+        def connect():
+            # connections are only used by one thread at a time, but not always the thread that created them
+            conn = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+            conn.row_factory = self.sqlite_row_factory
+            return conn
+
+        if filename == ":memory:":
+            # each connection to an in-memory database has its own database
+            pool_size = 1
+
+        self.close()
         self.type = self.SQLITE
-        self.conn = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
-        self.conn.row_factory = self.sqlite_row_factory
+        self.pool = ConnectionPool(connect, int(pool_size or self.DEFAULT_POOL_SIZE))
         self.create_db_version_table()
 
+    def close(self):
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+
     def create_db_version_table(self):
         self.exec("CREATE TABLE IF NOT EXISTS db_version (file VARCHAR(255) NOT NULL, version VARCHAR(255) NOT NULL, verified SMALLINT NOT NULL)")
 
-    def get_cursor(self):
+    def get_cursor(self, conn, compact_rows=False):
         if self.type == self.MYSQL:
             # buffered=True - https://stackoverflow.com/a/33632767/280574
-            return self.conn.cursor(dictionary=True, buffered=True)
+            return conn.cursor(dictionary=not compact_rows, buffered=True)
         else:
-            return self.conn.cursor()
-
-    def _execute_wrapper(self, sql, params, callback, log_query):
-        cur = self.get_cursor()
-        start_time = time.time()
+            cur = conn.cursor()
+            if compact_rows:
+                # plain tuples, which are converted to compact rows using the column names from the cursor description
+                cur.row_factory = None
+            return cur
+
+    def acquire_connection(self):
+        """returns the connection of the current thread's transaction, or checks out a connection from the pool"""
+        return self.thread_state.conn or self.pool.acquire()
+
+    def release_connection(self, conn):
+        if conn is not self.thread_state.conn:
+            self.pool.release(conn)
+
+    def _execute_wrapper(self, sql, params, callback, log_query, compact_rows=False):
+        conn = self.acquire_connection()
         try:
-            cur.execute(sql if self.type == self.SQLITE else sql.replace("?", "%s"), params)
-            if log_query:
-                self.logger.info("'%s' [%s]" % (sql, ", ".join(map(lambda x: str(x), params))))
-        except Exception as e:
-            raise SqlException("SQL Error: '%s' for '%s' [%s]" % (str(e), sql, ", ".join(map(lambda x: str(x), params)))) from e
+            cur = self.get_cursor(conn, compact_rows)
+            start_time = time.time()
+            try:
+                cur.execute(sql if self.type == self.SQLITE else sql.replace("?", "%s"), params)
+                if log_query:
+                    self.logger.info("'%s' [%s]" % (sql, ", ".join(map(lambda x: str(x), params))))
+            except Exception as e:
+                raise SqlException("SQL Error: '%s' for '%s' [%s]" % (str(e), sql, ", ".join(map(lambda x: str(x), params)))) from e
+
+            elapsed = time.time() - start_time
+
+            if elapsed > 0.5:
+                self.logger.warning("slow query (%fs) '%s' for params: %s" % (elapsed, sql, str(params)))
+
+            result = callback(cur)
+            cur.close()
 
-        elapsed = time.time() - start_time
+            # includes the time to fetch the results, since sqlite only steps to the first row in execute()
+            elapsed = time.time() - start_time
+            self.query_duration_metric.labels(self.get_statement_type(sql)).observe(elapsed)
 
-        if elapsed > 0.5:
-            self.logger.warning("slow query (%fs) '%s' for params: %s" % (elapsed, sql, str(params)))
+            if self.profiler:
+                self.profiler.record(sql, params, elapsed, self.get_row_count(result))
 
-        result = callback(cur)
-        cur.close()
-        return result
+            return result
+        finally:
+            self.release_connection(conn)
 
-    def query_single(self, sql, params=None, extended_like=False, log_query=False):
+    def query_single(self, sql, params=None, extended_like=False, log_query=False, compact_rows=False):
         if params is None:
             params = []
 
@@ -81,11 +204,21 @@ class DB:
 
         def map_result(cur):
             row = cur.fetchone()
-            return DictObject(row) if row else None
+            if not row:
+                return None
+            elif compact_rows:
+                return self.get_row_class(cur)(row)
+            else:
+                return DictObject(row)
+
+        return self._execute_wrapper(sql, params, map_result, log_query, compact_rows)
 
-        return self._execute_wrapper(sql, params, map_result, log_query)
+    def query(self, sql, params=None, extended_like=False, log_query=False, compact_rows=False):
+        """
+        Returns the result rows as DictObjects, or as read-only CompactRows if compact_rows is True, which use less memory
+        and are faster to create and access for large results. Only use compact_rows for results that are not modified.
+        """
 
-    def query(self, sql, params=None, extended_like=False, log_query=False):
         if params is None:
             params = []
 
@@ -95,9 +228,15 @@ class DB:
         sql, params = self.format_sql(sql, params)
 
         def map_result(cur):
-            return list(map(lambda row: DictObject(row), cur.fetchall()))
+            if compact_rows:
+                return list(map(self.get_row_class(cur), cur.fetchall()))
+            else:
+                return list(map(DictObject, cur.fetchall()))
 
-        return self._execute_wrapper(sql, params, map_result, log_query)
+        return self._execute_wrapper(sql, params, map_result, log_query, compact_rows)
+
+    def get_row_class(self, cur):
+        return get_row_class([col[0] for col in cur.description])
 
     def exec(self, sql, params=None, extended_like=False, log_query=False):
         if params is None:
@@ -109,14 +248,113 @@ class DB:
         sql, params = self.format_sql(sql, params)
 
         def map_result(cur):
-            return [cur.rowcount, cur.lastrowid]
+            return cur.rowcount, cur.lastrowid
 
         row_count, lastrowid = self._execute_wrapper(sql, params, map_result, log_query)
-        self.lastrowid = lastrowid
+        self.thread_state.lastrowid = lastrowid
         return row_count
 
+    def exec_many(self, sql, params_list, log_query=False):
+        """executes the same statement once for each set of params in params_list, and returns the total row count"""
+
+        params_list = list(params_list)
+        if not params_list:
+            return 0
+
+        sql, _ = self.format_sql(sql)
+
+        # in a transaction so that sqlite does not commit after each row, and
+        # large batches are split so that each round trip stays below the max packet size for mysql
+        with self.transaction():
+            row_count = 0
+            for i in range(0, len(params_list), self.MAX_BATCH_SIZE):
+                row_count += self._exec_many_wrapper(sql, params_list[i:i + self.MAX_BATCH_SIZE], log_query)
+            return row_count
+
+    def _exec_many_wrapper(self, sql, params_list, log_query):
+        conn = self.acquire_connection()
+        try:
+            cur = self.get_cursor(conn)
+            start_time = time.time()
+            try:
+                cur.executemany(sql if self.type == self.SQLITE else sql.replace("?", "%s"), params_list)
+                if log_query:
+                    self.logger.info("'%s' [%d rows]" % (sql, len(params_list)))
+            except Exception as e:
+                raise SqlException("SQL Error: '%s' for '%s' [%d rows]" % (str(e), sql, len(params_list))) from e
+
+            elapsed = time.time() - start_time
+
+            if elapsed > 0.5:
+                self.logger.warning("slow query (%fs) '%s' for %d rows" % (elapsed, sql, len(params_list)))
+
+            row_count = cur.rowcount
+            cur.close()
+
+            if self.profiler:
+                self.profiler.record(sql, params_list[0], elapsed, row_count)
+
+            return row_count
+        finally:
+            self.release_connection(conn)
+
+    def get_row_count(self, result):
+        if isinstance(result, list):
+            # query()
+            return len(result)
+        elif isinstance(result, tuple) and not isinstance(result, CompactRow):
+            # exec()
+            return max(result[0], 0)
+        else:
+            # query_single()
+            return 1 if result else 0
+
+    def get_statement_type(self, sql):
+        match = self.statement_type_regex.match(sql)
+        statement_type = match.group(1).upper() if match else None
+        return statement_type if statement_type in self.STATEMENT_TYPES else "OTHER"
+
+    def enable_profiling(self):
+        if not self.profiler:
+            self.profiler = SqlProfiler()
+
+    def disable_profiling(self):
+        self.profiler = None
+
+    def upsert_many(self, table, key_columns, rows, log_query=False):
+        """
+        Inserts rows, or updates the other columns of rows that already exist with the same key.
+        Requires a primary key or unique index on key_columns.
+
+        Args:
+            table: str
+            key_columns: list of str
+            rows: list of dict, all with the same columns
+
+        Returns: the total row count
+        """
+
+        rows = list(rows)
+        if not rows:
+            return 0
+
+        columns = list(rows[0].keys())
+        update_columns = [column for column in columns if column not in key_columns]
+
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (table, ", ".join(columns), ", ".join(["?"] * len(columns)))
+        if self.type == self.SQLITE:
+            if update_columns:
+                sql += " ON CONFLICT (%s) DO UPDATE SET %s" % (", ".join(key_columns), ", ".join(["%s = excluded.%s" % (c, c) for c in update_columns]))
+            else:
+                sql += " ON CONFLICT DO NOTHING"
+        else:
+            # updating a key column to itself makes a duplicate a no-op when there are no other columns
+            sql += " ON DUPLICATE KEY UPDATE %s" % ", ".join(["%s = VALUES(%s)" % (c, c) for c in update_columns or key_columns[:1]])
+
+        return self.exec_many(sql, [[row[column] for column in columns] for row in rows], log_query)
+
     def last_insert_id(self):
-        return self.lastrowid
+        return self.thread_state.lastrowid
 
     def format_sql(self, sql, params=None):
         if self.type == self.SQLITE:
@@ -156,27 +394,33 @@ class DB:
                 extra_sql.append(field + " LIKE ?")
         return extra_sql, vals
 
-    def get_connection(self):
-        return self.conn
-
     def load_sql_file(self, sqlfile, force_update=False):
+        """loads the sql file if it has changed since it was last loaded, and returns True if it was loaded"""
+
         filename = sqlfile.replace("/", os.sep)
 
         db_version = self.get_db_version(filename)
         file_version = self.get_file_version(filename)
 
+        loaded = False
         if db_version:
-            if parse_version(file_version) > parse_version(db_version) or force_update:
+            if file_version != db_version or force_update:
                 self.logger.info(f"Updating sql file '{filename}' to version '{file_version}'")
                 self._load_file(filename)
-            self.exec("UPDATE db_version SET version = ?, verified = 1 WHERE file = ?", [int(file_version), filename])
+                loaded = True
+            self.exec("UPDATE db_version SET version = ?, verified = 1 WHERE file = ?", [file_version, filename])
         else:
             self.logger.info(f"Adding sql file '{filename}' with version '{file_version}'")
             self._load_file(filename)
-            self.exec("INSERT INTO db_version (file, version, verified) VALUES (?, ?, 1)", [filename, int(file_version)])
+            loaded = True
+            self.exec("INSERT INTO db_version (file, version, verified) VALUES (?, ?, 1)", [filename, file_version])
+
+        return loaded
 
     def get_file_version(self, filename):
-        return str(int(os.path.getmtime(filename)))
+        # versioned by content instead of mtime so that a fresh checkout does not reload every file
+        with open(filename, mode="rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
 
     def get_db_version(self, filename):
         row = self.query_single("SELECT version FROM db_version WHERE file = ?", [filename])
@@ -186,66 +430,58 @@ class DB:
             return None
 
     def _load_file(self, filename):
-        if self.type == self.MYSQL:
-            self._load_file_mysql(filename)
-        else:
-            self._load_file_sqlite(filename)
+        with self.transaction():
+            cur = self.thread_state.conn.cursor()
+            for line_num, sql in self._read_sql_file(filename):
+                try:
+                    cur.execute(sql)
+                except Exception as e:
+                    raise Exception("sql error in file '%s' on line %d: %s" % (filename, line_num, str(e)))
+            cur.close()
+
+    def _read_sql_file(self, filename):
+        """yields (line_num, sql) for each statement, with consecutive inserts into the same table combined into multi-row inserts"""
+
+        insert_prefix = None
+        row_prefix = None
+        insert_line_num = 0
+        batch = []
 
-    def _load_file_sqlite(self, filename):
         with open(filename, mode="r", encoding="UTF-8") as f:
-            with self.transaction():
-                cur = self.conn.cursor()
-                line_num = 1
-                for line in f.readlines():
-                    try:
-                        sql, _ = self.format_sql(line)
-                        sql = sql.strip()
-                        if sql and not sql.startswith("--"):
-                            cur.execute(sql)
-                    except Exception as e:
-                        raise Exception("sql error in file '%s' on line %d: %s" % (filename, line_num, str(e)))
-                    line_num += 1
-                cur.close()
-
-    def _load_file_mysql(self, filename):
-        insert_regexp = re.compile(r"^(INSERT INTO [^ ]+( \(.*?\))? VALUES\s*)(\(.*?\));?$")
-        max_batch_size = 500
-
-        def execute(sql):
-            try:
-                # taken from: https://stackoverflow.com/a/32257894
-                cur.execute(sql)
-            except Exception as e:
-                raise Exception("sql error in file '%s': %s" % (filename, str(e)), e)
+            lines = f.read().splitlines()
+
+        for line_num, line in enumerate(lines, 1):
+            line = line.strip()
+
+            # fast path for the next row of the current insert
+            if row_prefix and line.startswith(row_prefix) and line.endswith((")", ");")):
+                if len(batch) >= self.MAX_SQL_FILE_BATCH_SIZE:
+                    yield insert_line_num, insert_prefix + ", ".join(batch)
+                    insert_line_num = line_num
+                    batch = []
+                batch.append(line[len(insert_prefix):].rstrip(";"))
+                continue
+
+            if not line or line.startswith("--"):
+                continue
+
+            if batch:
+                yield insert_line_num, insert_prefix + ", ".join(batch)
+                batch = []
+
+            match = self.sql_file_insert_regex.match(line)
+            if match:
+                insert_prefix = match.group(1)
+                row_prefix = insert_prefix + "("
+                insert_line_num = line_num
+                batch.append(match.group(3))
+            else:
+                row_prefix = None
+                sql, _ = self.format_sql(line)
+                yield line_num, sql
 
-        with open(filename, mode="r", encoding="UTF-8") as f:
-            with self.conn.cursor() as cur:
-                lines = f.readlines()
-                batches = []
-                current_table = None
-                for line in lines:
-                    line = line.strip()
-                    if not line or line.startswith("--"):
-                        continue
-
-                    match = insert_regexp.match(line)
-                    if match:
-                        if match.group(1) != current_table or len(batches) > max_batch_size:
-                            if batches:
-                                execute(current_table + ", ".join(batches))
-                                batches = []
-                            current_table = match.group(1)
-
-                        batches.append(match.group(3))
-                    else:
-                        if batches:
-                            execute(current_table + ", ".join(batches))
-                            batches = []
-
-                        execute(line)
-
-                if batches:
-                    execute(current_table + ", ".join(batches))
+        if batch:
+            yield insert_line_num, insert_prefix + ", ".join(batch)
 
     def get_type(self):
         return self.type
@@ -270,20 +506,67 @@ class DB:
         # False here indicates that if there was an exception, it should not be suppressed but instead propagated
         return False
 
+    # transactions are per thread, and hold on to a connection from the pool until they are finished
     def begin_transaction(self):
-        if self.transaction_level == 0:
-            self.exec("BEGIN;")
-        self.transaction_level += 1
+        state = self.thread_state
+        if state.transaction_level == 0:
+            state.conn = self.pool.acquire()
+            try:
+                # IMMEDIATE takes the write lock up front, so that concurrent transactions wait for each other
+                # instead of failing when both try to upgrade a read lock
+                self.exec("BEGIN IMMEDIATE;" if self.type == self.SQLITE else "BEGIN;")
+            except Exception:
+                self._end_transaction()
+                raise
+        state.transaction_level += 1
 
     def commit_transaction(self):
-        if self.transaction_level == 1:
-            self.exec("COMMIT;")
-        self.transaction_level -= 1
+        state = self.thread_state
+        if state.transaction_level == 1:
+            try:
+                self.exec("COMMIT;")
+            except Exception:
+                # the transaction is still open when COMMIT fails, so it is rolled back before the connection is reused
+                self._end_transaction(rollback=True)
+                raise
+            else:
+                self._end_transaction()
+            finally:
+                state.transaction_level -= 1
+        else:
+            state.transaction_level -= 1
 
     def rollback_transaction(self):
-        if self.transaction_level == 1:
-            self.exec("ROLLBACK;")
-        self.transaction_level -= 1
+        state = self.thread_state
+        if state.transaction_level == 1:
+            try:
+                self.exec("ROLLBACK;")
+            except Exception:
+                self._end_transaction(discard=True)
+                raise
+            else:
+                self._end_transaction()
+            finally:
+                state.transaction_level -= 1
+        else:
+            state.transaction_level -= 1
+
+    def _end_transaction(self, rollback=False, discard=False):
+        conn = self.thread_state.conn
+        self.thread_state.conn = None
+
+        if rollback:
+            try:
+                conn.rollback()
+            except Exception as e:
+                self.logger.warning("Could not roll back transaction, discarding connection", e)
+                discard = True
+
+        if discard:
+            # the connection may still be in a transaction, so it is closed instead of being returned to the pool
+            self.pool.discard(conn)
+        else:
+            self.pool.release(conn)
 
 
 class SqlException(Exception):
@@ -29,14 +29,17 @@ def command(handler, command, params, access_level, description, sub_command=Non
 
 
 @parameterized
-def event(handler, event_type, description, is_system=False, is_enabled=True, is_hidden=False):
+def event(handler, event_type, description, is_system=False, is_enabled=True, is_hidden=False, executor=None):
+    """executor="pool" runs the handler on a worker pool instead of the main thread, in order with other events for the same character or conn"""
+
     if is_hidden:
         log_deprecated_is_hidden(handler)
 
     handler.event = DictObject({"event_type": event_type,
                                 "description": description,
                                 "is_system": is_system or is_hidden,
-                                "is_enabled": is_enabled})
+                                "is_enabled": is_enabled,
+                                "executor": executor})
     return handler
 
 
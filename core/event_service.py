@@ -1,27 +1,72 @@
+import heapq
 import inspect
+import threading
+from collections import deque
 
 import mysql
 
 from core.bot_status import BotStatus
 from core.decorators import instance
+from core.dict_object import DictObject
 from core.registry import Registry
 from core.logger import Logger
 from core.functions import get_attrs
 import time
 
 
+class HandlerStats:
+    MAX_SAMPLES = 1000
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0
+        self.max_time = 0
+        self.samples = deque(maxlen=self.MAX_SAMPLES)
+
+    def record(self, elapsed):
+        # not locked, so counts may be slightly off when the same handler runs on several threads at once
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.samples.append(elapsed)
+
+
 @instance()
 class EventService:
+    # how often, in seconds, updated next_run values for timer events are written to the database
+    TIMER_EVENT_SAVE_INTERVAL = 60
+
+    # runs handlers on the worker pool of the executor service, instead of on the thread that fired the event
+    EXECUTOR_POOL = "pool"
+
     def __init__(self):
         self.handlers = {}
         self.logger = Logger(__name__)
         self.event_types = []
-        self.db_cache = {}
+        # event type -> tuple of (handler name, handler, stats) for the enabled handlers, and the same for the enabled pool handlers,
+        # built from the database on demand and replaced instead of modified, so that events can be fired while it is rebuilt
+        self.dispatch_table = None
+        self.handler_stats = {}
+        # handler name -> executor, for handlers that do not run on the thread that fired the event
+        self.handler_executors = {}
+        # number of events waiting for a pool worker, and the most there have been, by event type
+        self.pool_queue_depths = {}
+        self.pool_queue_max_depths = {}
+        self.pool_queue_lock = threading.Lock()
+        # enabled timer events by handler, loaded from the database on demand
+        self.timer_events = None
+        # heap of (next_run, handler); entries whose next_run no longer matches the timer event are skipped
+        self.timer_event_queue = []
+        self.changed_timer_events = set()
+        self.last_timer_event_save = 0
 
     def inject(self, registry):
         self.bot = registry.get_instance("bot")
         self.db = registry.get_instance("db")
         self.util = registry.get_instance("util")
+        self.executor_service = registry.get_instance("executor_service")
 
     def pre_start(self):
         self.register_event_type("timer")
@@ -33,7 +78,7 @@ class EventService:
                 if hasattr(method, "event"):
                     attrs = getattr(method, "event")
                     handler = getattr(inst, name)
-                    self.register(handler, attrs.event_type, attrs.description, inst.module_name, attrs.is_system, attrs.is_enabled)
+                    self.register(handler, attrs.event_type, attrs.description, inst.module_name, attrs.is_system, attrs.is_enabled, attrs.get("executor"))
 
     def register_event_type(self, event_type):
         """
@@ -55,7 +100,7 @@ class EventService:
     def is_event_type(self, event_base_type):
         return event_base_type in self.event_types
 
-    def register(self, handler, event_type, description, module, is_system, is_enabled):
+    def register(self, handler, event_type, description, module, is_system, is_enabled, executor=None):
         """
         Call during pre_start
 
@@ -66,11 +111,15 @@ class EventService:
             module: str
             is_system: bool
             is_enabled: bool
+            executor: None or EXECUTOR_POOL
         """
 
         if len(inspect.signature(handler).parameters) != 2:
             raise Exception("Incorrect number of arguments for handler '%s.%s()'" % (handler.__module__, handler.__qualname__))
 
+        if executor not in [None, self.EXECUTOR_POOL]:
+            raise Exception("Unknown executor '%s' for handler '%s.%s()'" % (executor, handler.__module__, handler.__qualname__))
+
         event_base_type, event_sub_type = self.get_event_type_parts(event_type)
         module = module.lower()
         handler_name = self.util.get_handler_name(handler)
@@ -106,19 +155,79 @@ class EventService:
                 self.db.exec("UPDATE timer_event SET event_sub_type = ? WHERE event_type = ? AND handler = ?",
                              [event_sub_type, event_base_type, handler_name])
 
+        if event_base_type == "timer":
+            self.reload_timer_events()
+
         # load command handler
         self.handlers[handler_name] = handler
+        self.handler_stats.setdefault(handler_name, HandlerStats())
+        if executor:
+            self.handler_executors[handler_name] = executor
+        else:
+            self.handler_executors.pop(handler_name, None)
+        self.dispatch_table = None
 
     def fire_event(self, event_type, event_data=None):
-        event_base_type, event_sub_type = self.get_event_type_parts(event_type)
+        dispatch_table = self.dispatch_table
+        if dispatch_table is None:
+            dispatch_table = self.build_dispatch_table()
 
-        if event_base_type not in self.event_types:
-            self.logger.error("Could not fire event type '%s': event type does not exist" % event_type)
-            return
+        entry = dispatch_table.get(event_type)
+        if entry is None:
+            event_base_type, event_sub_type = self.get_event_type_parts(event_type)
+            if event_base_type not in self.event_types:
+                self.logger.error("Could not fire event type '%s': event type does not exist" % event_type)
+                return
 
-        data = self.get_handlers(event_base_type, event_sub_type)
-        for row in data:
-            self.call_handler(row.handler, event_type, event_data)
+            entry = dispatch_table.get(self.get_dispatch_key(event_base_type, event_sub_type), ((), ()))
+
+        handlers, pool_handlers = entry
+        if pool_handlers:
+            self.submit_pool_handlers(pool_handlers, event_type, event_data)
+
+        for handler_name, handler, stats in handlers:
+            self.run_handler(handler, stats, event_type, event_data)
+
+    def submit_pool_handlers(self, handlers, event_type, event_data):
+        with self.pool_queue_lock:
+            depth = self.pool_queue_depths.get(event_type, 0) + 1
+            self.pool_queue_depths[event_type] = depth
+            if depth > self.pool_queue_max_depths.get(event_type, 0):
+                self.pool_queue_max_depths[event_type] = depth
+
+        try:
+            self.executor_service.submit_ordered_job(self.get_ordering_key(event_type, event_data), self.run_pool_handlers, handlers, event_type, event_data)
+        except Exception as e:
+            # e.g. when the executor has been shut down. the event is dropped for the pool handlers, instead of
+            # raising the error to the code that fired the event
+            with self.pool_queue_lock:
+                self.pool_queue_depths[event_type] -= 1
+            self.logger.error("Could not submit pool handlers for event type '%s'" % event_type, e)
+
+    def run_pool_handlers(self, handlers, event_type, event_data):
+        with self.pool_queue_lock:
+            self.pool_queue_depths[event_type] -= 1
+
+        for handler_name, handler, stats in handlers:
+            self.run_handler(handler, stats, event_type, event_data)
+
+    def get_ordering_key(self, event_type, event_data):
+        """pool handlers for events with the same key run in the order the events were fired"""
+
+        char_id = getattr(event_data, "char_id", None)
+        if char_id is not None:
+            return "char_id", char_id
+
+        conn = getattr(event_data, "conn", None)
+        if conn is not None:
+            return "conn", conn.id
+
+        return "event_type", event_type
+
+    def get_pool_queue_depths(self):
+        with self.pool_queue_lock:
+            return [DictObject({"event_type": event_type, "depth": depth, "max_depth": self.pool_queue_max_depths[event_type]})
+                    for event_type, depth in sorted(self.pool_queue_depths.items())]
 
     def call_handler(self, handler_method, event_type, event_data):
         handler = self.handlers.get(handler_method, None)
@@ -126,10 +235,68 @@ class EventService:
             self.logger.error("Could not find handler callback for event type '%s' and handler '%s'" % (event_type, handler_method))
             return
 
+        stats = self.handler_stats.get(handler_method)
+        if stats is None:
+            stats = self.handler_stats[handler_method] = HandlerStats()
+
+        self.run_handler(handler, stats, event_type, event_data)
+
+    def run_handler(self, handler, stats, event_type, event_data):
+        start_time = time.perf_counter()
         try:
             handler(event_type, event_data)
         except Exception as e:
+            stats.errors += 1
             self.logger.error("error processing event '%s'" % event_type, e)
+        stats.record(time.perf_counter() - start_time)
+
+    def build_dispatch_table(self):
+        data = self.db.query("SELECT event_type, event_sub_type, handler FROM event_config WHERE enabled = 1")
+
+        dispatch_table = {}
+        for row in data:
+            handler = self.handlers.get(row.handler)
+            if not handler:
+                self.logger.error("Could not find handler callback for event type '%s' and handler '%s'" % (row.event_type, row.handler))
+                continue
+
+            handlers, pool_handlers = dispatch_table.setdefault(self.get_dispatch_key(row.event_type, row.event_sub_type), ([], []))
+            if self.handler_executors.get(row.handler) == self.EXECUTOR_POOL:
+                pool_handlers.append((row.handler, handler, self.handler_stats[row.handler]))
+            else:
+                handlers.append((row.handler, handler, self.handler_stats[row.handler]))
+
+        dispatch_table = {k: (tuple(handlers), tuple(pool_handlers)) for k, (handlers, pool_handlers) in dispatch_table.items()}
+
+        # event types without handlers, so that firing them does not need to check that the event type exists
+        for event_type in self.event_types:
+            dispatch_table.setdefault(event_type, ((), ()))
+
+        self.dispatch_table = dispatch_table
+        return dispatch_table
+
+    def get_handler_stats(self, sort_by="total_time"):
+        """returns a list of the stats for each handler that has run, sorted descending by sort_by"""
+
+        result = []
+        for handler_name, stats in list(self.handler_stats.items()):
+            if not stats.count:
+                continue
+
+            samples = sorted(stats.samples)
+            result.append(DictObject({"handler": handler_name,
+                                      "count": stats.count,
+                                      "errors": stats.errors,
+                                      "total_time": stats.total_time,
+                                      "mean_time": stats.total_time / stats.count,
+                                      "p99_time": samples[int(len(samples) * 0.99)],
+                                      "max_time": stats.max_time}))
+
+        return sorted(result, key=lambda x: x[sort_by], reverse=True)
+
+    def reset_handler_stats(self):
+        self.handler_stats = {handler_name: HandlerStats() for handler_name in self.handlers.keys()}
+        self.dispatch_table = None
 
     def get_event_type_parts(self, event_type):
         parts = event_type.lower().split(":", 1)
@@ -141,15 +308,33 @@ class EventService:
     def get_event_type_key(self, event_base_type, event_sub_type):
         return event_base_type + ":" + event_sub_type
 
+    def get_dispatch_key(self, event_base_type, event_sub_type):
+        # the same as the event type that is fired, so that most events can be dispatched without parsing the event type
+        if event_sub_type:
+            return event_base_type + ":" + event_sub_type
+        else:
+            return event_base_type
+
     def check_for_timer_events(self, current_timestamp):
         self.logger.debug("Checking for timer events at '%s'" % current_timestamp)
 
         try:
-            data = self.db.query("SELECT e.event_type, e.event_sub_type, e.handler, t.next_run FROM timer_event t "
-                                 "JOIN event_config e ON t.event_type = e.event_type AND t.handler = e.handler "
-                                 "WHERE t.next_run <= ? AND e.enabled = 1", [current_timestamp])
+            timer_events = self.get_timer_events()
+
+            # collect due timer events first so that each one runs at most once per check
+            data = []
+            while self.timer_event_queue and self.timer_event_queue[0][0] <= current_timestamp:
+                next_run, handler = heapq.heappop(self.timer_event_queue)
+                row = timer_events.get(handler)
+                if row and row.next_run == next_run:
+                    data.append(row)
+
             for row in data:
                 self.execute_timed_event(row, current_timestamp)
+
+            if self.last_timer_event_save + self.TIMER_EVENT_SAVE_INTERVAL <= current_timestamp:
+                self.save_timer_events()
+                self.last_timer_event_save = current_timestamp
         except mysql.connector.errors.OperationalError as e:
             self.logger.error("MySQL connection lost", e)
             self.bot.status = BotStatus.ERROR
@@ -158,50 +343,89 @@ class EventService:
         self.logger.debug("Executing timed event '%s'" % row)
         event_type_key = self.get_event_type_key(row.event_type, row.event_sub_type)
 
+        # use the in-memory timer event when there is one, since its next_run may not have been saved yet
+        timer_event = self.get_timer_events().get(row.handler)
+
         # timer event run times should be consistent, so we base the next run time off the last run time,
         # instead of the current timestamp
-        next_run = row.next_run + int(row.event_sub_type)
+        next_run = (timer_event or row).next_run + int(row.event_sub_type)
 
         # prevents timer events from getting too far behind, or having a large "catch-up" after
         # the bot has been offline for a time
         if next_run < current_timestamp:
             next_run = current_timestamp + int(row.event_sub_type)
 
-        self.db.exec("UPDATE timer_event SET next_run = ? WHERE event_type = ? AND handler = ?",
-                     [next_run, row.event_type, row.handler])
+        if timer_event:
+            timer_event.next_run = next_run
+            heapq.heappush(self.timer_event_queue, (next_run, row.handler))
+            self.changed_timer_events.add(row.handler)
+        else:
+            # disabled timer events are not kept in memory
+            self.db.exec("UPDATE timer_event SET next_run = ? WHERE event_type = ? AND handler = ?",
+                         [next_run, row.event_type, row.handler])
 
         self.call_handler(row.handler, event_type_key, None)
 
+    def get_timer_events(self):
+        timer_events = self.timer_events
+        if timer_events is None:
+            data = self.db.query("SELECT e.event_type, e.event_sub_type, e.handler, t.next_run FROM timer_event t "
+                                 "JOIN event_config e ON t.event_type = e.event_type AND t.handler = e.handler "
+                                 "WHERE e.event_type = ? AND e.enabled = 1", ["timer"])
+
+            timer_events = {row.handler: row for row in data}
+            self.timer_event_queue = [(row.next_run, row.handler) for row in data]
+            heapq.heapify(self.timer_event_queue)
+            self.timer_events = timer_events
+
+        return timer_events
+
+    def save_timer_events(self):
+        """Writes next_run for timer events that have run since the last save to the database"""
+
+        if not self.changed_timer_events or self.timer_events is None:
+            return
+
+        rows = [self.timer_events[handler] for handler in self.changed_timer_events if handler in self.timer_events]
+        with self.db.transaction():
+            for row in rows:
+                self.db.exec("UPDATE timer_event SET next_run = ? WHERE event_type = ? AND handler = ?",
+                             [row.next_run, row.event_type, row.handler])
+
+        self.changed_timer_events = set()
+
+    def reload_timer_events(self):
+        # save pending changes before discarding in-memory timer events so they are reloaded from the database
+        self.save_timer_events()
+        self.timer_events = None
+
     def update_event_status(self, event_base_type, event_sub_type, event_handler, enabled_status):
-        # clear cache
-        self.db_cache[event_base_type + ":" + event_sub_type] = None
+        row_count = self.db.exec("UPDATE event_config SET enabled = ? WHERE event_type = ? AND event_sub_type = ? AND handler LIKE ?",
+                                 [enabled_status, event_base_type, event_sub_type, event_handler])
+
+        # rebuilt after the update, so that an event fired in the meantime does not rebuild it with the previous status
+        self.dispatch_table = None
+        if event_base_type == "timer":
+            self.reload_timer_events()
 
-        return self.db.exec("UPDATE event_config SET enabled = ? WHERE event_type = ? AND event_sub_type = ? AND handler LIKE ?",
-                            [enabled_status, event_base_type, event_sub_type, event_handler])
+        return row_count
 
     def get_event_types(self):
         return self.event_types
 
     def get_handlers(self, event_base_type, event_sub_type):
-        # check first in cache
-        result = self.db_cache.get(event_base_type + ":" + event_sub_type, None)
-        if result is not None:
-            return result
-        else:
-            result = self.db.query("SELECT handler FROM event_config WHERE event_type = ? AND event_sub_type = ? AND enabled = 1",
-                                   [event_base_type, event_sub_type])
+        """returns the names of the enabled handlers for the event type"""
 
-            # store result in cache
-            self.db_cache[event_base_type + ":" + event_sub_type] = result
+        dispatch_table = self.dispatch_table
+        if dispatch_table is None:
+            dispatch_table = self.build_dispatch_table()
 
-            return result
+        handlers, pool_handlers = dispatch_table.get(self.get_dispatch_key(event_base_type, event_sub_type), ((), ()))
+        return [handler_name for handler_name, _, _ in handlers + pool_handlers]
 
     def run_timer_events_at_startup(self):
         t = int(time.time())
-        data = self.db.query("SELECT e.event_type, e.event_sub_type, e.handler, t.next_run FROM timer_event t "
-                             "JOIN event_config e ON t.event_type = e.event_type AND t.handler = e.handler "
-                             "WHERE e.event_type = ? AND e.enabled = 1", ["timer"])
-        for row in data:
+        for row in list(self.get_timer_events().values()):
             handler = self.handlers[row.handler]
             attrs = getattr(handler, "event")
             if attrs.get("run_at_startup", False):
@@ -1,21 +1,36 @@
+import threading
 import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 
 from core.decorators import instance
 from core.dict_object import DictObject
+from core.logger import Logger
 
 
 @instance()
 class ExecutorService:
+    MAX_WORKERS = 100
+    # max number of ordered jobs waiting or running, after which submit_ordered_job() blocks
+    MAX_ORDERED_JOBS = 1000
+
     def __init__(self):
+        self.logger = Logger(__name__)
+        self.executor = None
         self.jobs = []
         self.job_scheduler_id = None
 
+        # key -> deque of jobs that have not started, for keys that have a job running
+        self.ordered_jobs = {}
+        self.num_ordered_jobs = 0
+        self.ordered_jobs_condition = threading.Condition()
+        self.thread_state = threading.local()
+
     def inject(self, registry):
         self.job_scheduler = registry.get_instance("job_scheduler")
 
     def start(self):
-        self.executor = ThreadPoolExecutor(max_workers=100)
+        self.executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
 
     def submit_job(self, start_timeout, job, *args, **kwargs):
         """
@@ -32,6 +47,73 @@ class ExecutorService:
         self.jobs.sort(key=lambda x: x.expires)
         self.update_next_expiration()
 
+    def submit_ordered_job(self, key, job, *args, **kwargs):
+        """
+        Runs job on the worker pool, after any other jobs with the same key have finished, so that
+        jobs with the same key run one at a time and in the order they were submitted.
+
+        When MAX_ORDERED_JOBS jobs are waiting or running, the caller blocks until one finishes, so that a slow job
+        slows down whatever is submitting jobs instead of letting the queue grow without bound. Jobs submitted
+        from an ordered job never block, since that could wait on itself.
+
+        Args:
+            key: hashable
+            job: (*args, *kwargs) -> void
+            *args
+            **kwargs
+        """
+
+        with self.ordered_jobs_condition:
+            if self.num_ordered_jobs >= self.MAX_ORDERED_JOBS and not getattr(self.thread_state, "ordered_job", False):
+                self.logger.warning("Ordered job queue is full (%d jobs), waiting for jobs to finish" % self.num_ordered_jobs)
+                while self.num_ordered_jobs >= self.MAX_ORDERED_JOBS:
+                    self.ordered_jobs_condition.wait()
+
+            self.num_ordered_jobs += 1
+            queue = self.ordered_jobs.get(key)
+            if queue is not None:
+                # a job with the same key is running, and will run this one when it has finished
+                queue.append((job, args, kwargs))
+                return
+
+            self.ordered_jobs[key] = deque()
+
+        try:
+            self.executor.submit(self.run_ordered_jobs, key, job, args, kwargs)
+        except Exception:
+            # e.g. when the executor has been shut down. jobs with the same key that were queued in the meantime
+            # would only have been run by this job, so they are discarded too
+            with self.ordered_jobs_condition:
+                queue = self.ordered_jobs.pop(key)
+                self.num_ordered_jobs -= 1 + len(queue)
+                self.ordered_jobs_condition.notify_all()
+            raise
+
+    def run_ordered_jobs(self, key, job, args, kwargs):
+        self.thread_state.ordered_job = True
+        try:
+            while True:
+                try:
+                    job(*args, **kwargs)
+                except Exception as e:
+                    self.logger.error("error running job for key '%s'" % str(key), e)
+
+                with self.ordered_jobs_condition:
+                    self.num_ordered_jobs -= 1
+                    self.ordered_jobs_condition.notify()
+
+                    queue = self.ordered_jobs[key]
+                    if not queue:
+                        del self.ordered_jobs[key]
+                        return
+
+                    job, args, kwargs = queue.popleft()
+        finally:
+            self.thread_state.ordered_job = False
+
+    def get_num_ordered_jobs(self):
+        return self.num_ordered_jobs
+
     def update_next_expiration(self):
         if self.jobs:
             job = self.jobs[0]
@@ -1,4 +1,3 @@
-import time
 from queue import Queue
 
 
@@ -21,18 +20,11 @@ class FifoQueue(Queue):
             if not block:
                 if not self._qsize():
                     return default
-            elif timeout is None:
-                while not self._qsize():
-                    self.not_empty.wait()
-            elif timeout < 0:
+            elif timeout is not None and timeout < 0:
                 raise ValueError("'timeout' must be a non-negative number")
-            else:
-                endtime = time.time() + timeout
-                while not self._qsize():
-                    remaining = endtime - time.time()
-                    if remaining <= 0.0:
-                        return default
-                    self.not_empty.wait(remaining)
+            elif not self.not_empty.wait_for(self._qsize, timeout):
+                # wait_for() measures the timeout on the monotonic clock, so it is not affected by changes to the system time
+                return default
             item = self._get()
             self.not_full.notify()
             return item
@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import deque
+
+from core.aochat import server_packets
+from core.dict_object import DictObject
+from core.logger import Logger
+
+
+class IncomingPacketLane:
+    def __init__(self, name, max_size):
+        self.name = name
+        self.max_size = max_size
+
+        # entries are [enqueue_time, conn, packet] lists, so that a queued packet can be replaced or removed in place.
+        # removed entries have a packet of None and are skipped when dequeued, and are not counted in size
+        self.entries = deque()
+        self.size = 0
+
+        self.num_received = 0
+        self.num_processed = 0
+        self.num_dropped = 0
+        self.num_coalesced = 0
+        self.total_wait_time = 0
+        self.max_wait_time = 0
+
+    def get_stats(self):
+        return DictObject({"name": self.name,
+                           "size": self.size,
+                           "max_size": self.max_size,
+                           "received": self.num_received,
+                           "processed": self.num_processed,
+                           "dropped": self.num_dropped,
+                           "coalesced": self.num_coalesced,
+                           "avg_wait_time": self.total_wait_time / self.num_processed if self.num_processed else 0,
+                           "max_wait_time": self.max_wait_time})
+
+
+class IncomingPacketQueue:
+    """
+    Queue of (conn, packet) tuples received from all conns, which are dequeued by lane, so that commands are not
+    stuck behind the thousands of buddy and name packets that are received when a conn logs in.
+
+    Packets are dequeued in FIFO order within a lane, but not across lanes, with these exceptions:
+    a CharacterName packet that is still queued is moved ahead of any packet in a higher lane with the same char_id,
+    so that the name is known when that packet is handled, and a BuddyAdded packet replaces the status in an
+    earlier BuddyAdded packet for the same char_id that has not been handled yet.
+
+    When a lane is full, only message packets are dropped. Packets that change the state of the bot or a conn,
+    such as logins, buddy changes and private and public channel joins and leaves, are always queued.
+    """
+
+    COMMANDS = 0
+    CHANNELS = 1
+    BULK = 2
+
+    LANES = [("commands", 1000),
+             ("channels", 10000),
+             ("bulk", 50000)]
+
+    # packets not listed here go in the CHANNELS lane
+    lanes_by_packet_id = {server_packets.PrivateMessage.id: COMMANDS,
+                          # replies to lookups, which commands are often waiting for
+                          server_packets.CharacterLookup.id: COMMANDS,
+                          server_packets.CharacterUnknown.id: COMMANDS,
+                          server_packets.CharacterName.id: BULK,
+                          server_packets.BuddyAdded.id: BULK,
+                          server_packets.BuddyRemoved.id: BULK}
+
+    # packets that are dropped when their lane is full
+    droppable_packet_ids = frozenset([server_packets.PrivateMessage.id,
+                                      server_packets.VicinityMessage.id,
+                                      server_packets.BroadcastMessage.id,
+                                      server_packets.SimpleSystemMessage.id,
+                                      server_packets.SystemMessage.id,
+                                      server_packets.PrivateChannelMessage.id,
+                                      server_packets.PublicChannelMessage.id])
+
+    def __init__(self):
+        self.logger = Logger(__name__)
+        self.lanes = [IncomingPacketLane(name, max_size) for name, max_size in self.LANES]
+        self.size = 0
+        self.not_empty = threading.Condition()
+
+        # (conn, char_id) -> the queued entry for the latest CharacterName packet, and for the latest buddy packet
+        self.name_entries = {}
+        self.buddy_entries = {}
+
+    def put(self, item):
+        """
+        Args:
+            item: (conn, packet)
+        """
+
+        conn, packet = item
+        lane_index = self.lanes_by_packet_id.get(packet.id, self.CHANNELS)
+        lane = self.lanes[lane_index]
+        key = (conn, getattr(packet, "char_id", None))
+
+        with self.not_empty:
+            lane.num_received += 1
+
+            if lane_index == self.BULK:
+                if self.coalesce(lane, key, packet):
+                    return
+            elif key in self.name_entries:
+                self.promote_name(lane, key)
+
+            if lane.size >= lane.max_size and packet.id in self.droppable_packet_ids:
+                if lane.num_dropped % 1000 == 0:
+                    self.logger.warning(f"Incoming packet queue lane '{lane.name}' is full ({lane.size} packets), dropping messages")
+                lane.num_dropped += 1
+                return
+
+            entry = [time.monotonic(), conn, packet]
+            self.append(lane, entry)
+            if packet.id == server_packets.CharacterName.id:
+                self.name_entries[key] = entry
+            elif lane_index == self.BULK:
+                self.buddy_entries[key] = entry
+
+            self.not_empty.notify()
+
+    def get_or_default(self, block=True, timeout=None, default=None):
+        """
+        Remove and return the next (conn, packet) from the highest priority lane that has packets, or `default`
+        if there are none within `timeout` seconds, or immediately if `block` is False.
+        """
+
+        with self.not_empty:
+            if not block:
+                if not self.size:
+                    return default
+            elif timeout is not None and timeout < 0:
+                raise ValueError("'timeout' must be a non-negative number")
+            elif not self.not_empty.wait_for(self.qsize, timeout):
+                return default
+
+            return self.pop()
+
+    def qsize(self):
+        return self.size
+
+    def get_stats(self):
+        with self.not_empty:
+            return [lane.get_stats() for lane in self.lanes]
+
+    def coalesce(self, lane, key, packet):
+        if packet.id == server_packets.CharacterName.id:
+            entry = self.name_entries.get(key)
+        elif packet.id == server_packets.BuddyAdded.id:
+            # only when the latest buddy packet for the char is a BuddyAdded, since coalescing across a BuddyRemoved
+            # would change the order of the two
+            entry = self.buddy_entries.get(key)
+            if entry and entry[2].id != server_packets.BuddyAdded.id:
+                entry = None
+        else:
+            entry = None
+
+        if entry:
+            entry[2] = packet
+            lane.num_coalesced += 1
+            return True
+        else:
+            return False
+
+    def promote_name(self, lane, key):
+        entry = self.name_entries.pop(key)
+        bulk_lane = self.lanes[self.BULK]
+        bulk_lane.size -= 1
+        self.size -= 1
+        bulk_lane.num_processed += 1
+        lane.num_received += 1
+
+        # the promoted packet keeps its enqueue time, and is not subject to the size limit of the lane it is moved to
+        self.append(lane, [entry[0], entry[1], entry[2]])
+        entry[2] = None
+
+    def append(self, lane, entry):
+        lane.entries.append(entry)
+        lane.size += 1
+        self.size += 1
+
+    def pop(self):
+        for lane in self.lanes:
+            while lane.entries:
+                entry = lane.entries.popleft()
+                enqueue_time, conn, packet = entry
+                if packet is None:
+                    continue
+
+                lane.size -= 1
+                self.size -= 1
+
+                key = (conn, getattr(packet, "char_id", None))
+                if self.name_entries.get(key) is entry:
+                    del self.name_entries[key]
+                elif self.buddy_entries.get(key) is entry:
+                    del self.buddy_entries[key]
+
+                wait_time = time.monotonic() - enqueue_time
+                lane.num_processed += 1
+                lane.total_wait_time += wait_time
+                lane.max_wait_time = max(lane.max_wait_time, wait_time)
+
+                return conn, packet
+
+    def __len__(self):
+        return self.size
@@ -1,3 +1,5 @@
+import asyncio
+import heapq
 import inspect
 
 from core.decorators import instance
@@ -9,37 +11,113 @@ import time
 class JobScheduler:
     def __init__(self):
         self.logger = Logger(__name__)
+        # heap of (time, job_id, job); job_id breaks ties so jobs with the same time run in insertion order
         self.jobs = []
+        # pending jobs by job_id; cancelled jobs are removed from here and left in the heap until they are popped
+        self.job_index = {}
+        self.num_cancelled = 0
         self.job_id_index = 0
 
+    def inject(self, registry):
+        self.async_service = registry.get_instance("async_service")
+
     def check_for_scheduled_jobs(self, timestamp):
-        while self.jobs and self.jobs[0]["time"] <= timestamp:
+        while self.jobs and self.jobs[0][0] <= timestamp:
+            _, job_id, job = heapq.heappop(self.jobs)
+            if job["cancelled"]:
+                self.num_cancelled -= 1
+                continue
+
+            del self.job_index[job_id]
             try:
-                job = self.jobs.pop(0)
                 job["callback"](job["time"], *job["args"], **job["kwargs"])
             except Exception as e:
                 self.logger.warning("Error processing scheduled job", e)
 
+    def get_next_job_time(self):
+        while self.jobs and self.jobs[0][2]["cancelled"]:
+            heapq.heappop(self.jobs)
+            self.num_cancelled -= 1
+
+        if self.jobs:
+            return self.jobs[0][0]
+        else:
+            return None
+
     def delayed_job(self, callback, delay, *args, **kwargs):
         """
         Args:
             callback: (time: Int, *args, *kwargs) -> void)
-            delay: int
+            delay: int|float
             *args
             **kwargs
         """
 
-        return self.scheduled_job(callback, int(time.time()) + delay, *args, **kwargs)
+        return self.scheduled_job(callback, time.time() + delay, *args, **kwargs)
 
     def scheduled_job(self, callback, scheduled_time, *args, **kwargs):
         """
         Args:
             callback: (time: Int, *args, *kwargs) -> void)
-            scheduled_time: int
+            scheduled_time: int|float
+            *args
+            **kwargs
+        """
+
+        new_job = self._create_job(callback, scheduled_time, args, kwargs)
+        heapq.heappush(self.jobs, (scheduled_time, new_job["id"], new_job))
+        return new_job["id"]
+
+    def delayed_job_async(self, callback, delay, *args, **kwargs):
+        """
+        Same as delayed_job(), except that the callback is run on the AsyncService event loop thread
+        instead of the main thread, so it must be thread-safe and must not block
+
+        Args:
+            callback: (time: Int, *args, *kwargs) -> void)
+            delay: int|float
             *args
             **kwargs
         """
 
+        return self.scheduled_job_async(callback, time.time() + delay, *args, **kwargs)
+
+    def scheduled_job_async(self, callback, scheduled_time, *args, **kwargs):
+        """
+        Same as scheduled_job(), except that the callback is run on the AsyncService event loop thread
+        instead of the main thread, so it must be thread-safe and must not block
+
+        Args:
+            callback: (time: Int, *args, *kwargs) -> void)
+            scheduled_time: int|float
+            *args
+            **kwargs
+        """
+
+        new_job = self._create_job(callback, scheduled_time, args, kwargs)
+        new_job["future"] = self.async_service.run_coroutine(self._run_async_job(new_job))
+        return new_job["id"]
+
+    def cancel_job(self, job_id):
+        job = self.job_index.pop(job_id, None)
+        if job is None:
+            return None
+
+        job["cancelled"] = True
+        if job["future"]:
+            job["future"].cancel()
+        else:
+            self.num_cancelled += 1
+
+            # rebuild the heap once it is mostly made up of cancelled jobs
+            if self.num_cancelled > 100 and self.num_cancelled * 2 >= len(self.jobs):
+                self.jobs = [entry for entry in self.jobs if not entry[2]["cancelled"]]
+                heapq.heapify(self.jobs)
+                self.num_cancelled = 0
+
+        return job
+
+    def _create_job(self, callback, scheduled_time, args, kwargs):
         if len(inspect.signature(callback).parameters) < 1:
             raise Exception("Incorrect number of arguments for handler '%s.%s()'" % (callback.__module__, callback.__qualname__))
 
@@ -49,24 +127,26 @@ class JobScheduler:
             "callback": callback,
             "args": args,
             "kwargs": kwargs,
-            "time": scheduled_time
+            "time": scheduled_time,
+            "cancelled": False,
+            "future": None
         }
 
-        self._insert_job(new_job)
-        return job_id
+        self.job_index[job_id] = new_job
+        return new_job
 
-    def cancel_job(self, job_id):
-        for index, job in enumerate(self.jobs):
-            if job["id"] == job_id:
-                return self.jobs.pop(index)
-        return None
-
-    def _insert_job(self, new_job):
-        for index, job in enumerate(self.jobs):
-            if job["time"] > new_job["time"]:
-                self.jobs.insert(index, new_job)
-                return
-        self.jobs.append(new_job)
+    async def _run_async_job(self, job):
+        delay = job["time"] - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.job_index.pop(job["id"], None) is None:
+            return
+
+        try:
+            job["callback"](job["time"], *job["args"], **job["kwargs"])
+        except Exception as e:
+            self.logger.warning("Error processing scheduled job", e)
 
     def _get_next_job_id(self):
         self.job_id_index += 1
@@ -1,22 +1,53 @@
-from requests import ReadTimeout
+from concurrent.futures import Future, ThreadPoolExecutor
 
+from requests import ReadTimeout, RequestException
+from requests.adapters import HTTPAdapter
+
+from core import metrics
 from core.decorators import instance
 from core.dict_object import DictObject
 from core.aochat import server_packets
 from core.logger import Logger
 import requests
+import threading
 import time
 
 
 @instance()
 class PorkService:
+    MAX_CONCURRENT_REQUESTS = 8
+    # how long, in seconds, to remember that PoRK returned no data for a character
+    NOT_FOUND_CACHE_TTL = 300
+    # how long, in seconds, to wait for more characters to be prefetched before loading them
+    PREFETCH_DELAY = 0.5
+    MAX_SQL_PARAMS = 500
+
+    lookups_metric = metrics.registry.counter("tyrbot_pork_lookups_total", "Character info lookups, by whether the result came from the database cache, "
+                                                                          "an earlier response or request, or a new request to PoRK", ["source"])
+    request_duration_metric = metrics.registry.histogram("tyrbot_pork_request_duration_seconds", "Time for PoRK to respond, by result", ["result"])
+
     def __init__(self):
         self.logger = Logger(__name__)
+        self.lock = threading.Lock()
+        # in-flight requests by (server_num, char_name), so concurrent requests for the same character share one request
+        self.pending_requests = {}
+        self.not_found_cache = {}
+        self.prefetch_char_ids = set()
+        # (char_id, callback) to call once the prefetched characters have been loaded
+        self.prefetch_callbacks = []
+        self.prefetch_job_id = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.MAX_CONCURRENT_REQUESTS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_REQUESTS, thread_name_prefix="PorkService")
 
     def inject(self, registry):
         self.bot = registry.get_instance("bot")
         self.db = registry.get_instance("db")
         self.character_service = registry.get_instance("character_service")
+        self.job_scheduler = registry.get_instance("job_scheduler")
 
     def pre_start(self):
         self.bot.register_packet_handler(server_packets.CharacterLookup.id, self.update)
@@ -33,17 +64,85 @@ class PorkService:
     # this should not be called directly unless you are requesting info for a char on a different server
     # since cache will not be used and the result will not update the cache automatically
     def request_char_info(self, char_name, server_num):
+        return self.request_char_info_async(char_name, server_num).result()
+
+    def request_char_info_async(self, char_name, server_num, callback=None):
+        """
+        Same as request_char_info(), but returns a Future for the char_info instead of blocking.
+        Requests run on a bounded pool of worker threads, and concurrent requests for the same character
+        share a single request. Characters that PoRK has no data for are remembered for NOT_FOUND_CACHE_TTL seconds.
+
+        Args:
+            char_name: str
+            server_num: int
+            callback: (char_info) -> void, called from a worker thread when the request completes
+
+        Returns: concurrent.futures.Future
+        """
+
+        key = (server_num, char_name.lower())
+        with self.lock:
+            future = self.pending_requests.get(key)
+            if future is None:
+                expires_at = self.not_found_cache.get(key)
+                if expires_at and expires_at > time.time():
+                    self.lookups_metric.labels("not_found_cache").inc()
+                    future = Future()
+                    future.set_result(None)
+                else:
+                    self.lookups_metric.labels("request").inc()
+                    future = self.executor.submit(self._request_char_info, key, char_name, server_num)
+                    self.pending_requests[key] = future
+            else:
+                self.lookups_metric.labels("coalesced").inc()
+
+        if callback:
+            future.add_done_callback(lambda f: callback(f.result()))
+
+        return future
+
+    def _request_char_info(self, key, char_name, server_num):
+        try:
+            char_info, found = self._fetch_char_info(char_name, server_num)
+        finally:
+            with self.lock:
+                del self.pending_requests[key]
+
+        if not found:
+            with self.lock:
+                t = time.time()
+                if len(self.not_found_cache) > 10000:
+                    self.not_found_cache = {k: v for k, v in self.not_found_cache.items() if v > t}
+                self.not_found_cache[key] = t + self.NOT_FOUND_CACHE_TTL
+
+        return char_info
+
+    def _fetch_char_info(self, char_name, server_num):
+        # returns the char_info, and False only if PoRK responded with a valid, empty response for the character.
+        # timeouts, request errors and invalid responses return True so they are not cached as not found
         url = self.get_pork_url(server_num, char_name)
 
+        found = True
+        status = "error"
+        start_time = time.perf_counter()
         try:
-            r = requests.get(url, timeout=5)
+            r = self.session.get(url, timeout=5)
             result = r.json()
+            found = bool(result)
+            status = "found" if found else "not_found"
         except ReadTimeout:
             self.logger.warning("Timeout while requesting '%s'" % url)
             result = None
+            status = "timeout"
         except ValueError as e:
             self.logger.debug("Error marshalling value as json for url '%s': %s" % (url, r.text), e)
             result = None
+            status = "invalid"
+        except RequestException as e:
+            self.logger.warning("Error requesting '%s': %s" % (url, e))
+            result = None
+        finally:
+            self.request_duration_metric.labels(status).observe(time.perf_counter() - start_time)
 
         char_info = None
         if result:
@@ -75,7 +174,7 @@ class PorkService:
                 "cache_age": 0
             })
 
-        return char_info
+        return char_info, found
 
     # standard method to get character pork data when character is on the same server
     def get_character_info(self, char_name_or_id, max_cache_age=86400):
@@ -90,6 +189,7 @@ class PorkService:
             db_char_info.cache_age = t - db_char_info.last_updated
 
             if db_char_info.cache_age < max_cache_age and db_char_info.source != "chat_server":
+                self.lookups_metric.labels("cache").inc()
                 return db_char_info
 
         # if we can't resolve to a char_name, we can't make a call to pork
@@ -109,6 +209,54 @@ class PorkService:
 
             return db_char_info
 
+    def get_character_info_many(self, char_ids, max_cache_age=86400):
+        """
+        Same as get_character_info(), but for many characters at once. Cached characters are read from the database
+        with a single query, characters that are missing or stale are requested from PoRK in parallel,
+        and the results are saved in a single transaction.
+
+        Args:
+            char_ids: list of int
+            max_cache_age: int
+
+        Returns: dict of char_id => char_info, where char_info is None if there is no data for the character
+        """
+
+        t = int(time.time())
+
+        result = {}
+        futures = {}
+        for char_id, db_char_info in self.get_from_database_many(char_ids).items():
+            result[char_id] = db_char_info
+            if db_char_info:
+                db_char_info.cache_age = t - db_char_info.last_updated
+
+                if db_char_info.cache_age < max_cache_age and db_char_info.source != "chat_server":
+                    self.lookups_metric.labels("cache").inc()
+                    continue
+
+            # if we can't resolve to a char_name, we can't make a call to pork
+            char_name = self.character_service.resolve_char_to_name(char_id)
+            if char_name:
+                futures[char_id] = self.request_char_info_async(char_name, self.bot.dimension)
+
+        updated = []
+        for char_id, future in futures.items():
+            try:
+                char_info = future.result()
+            except Exception as e:
+                # keep the cached info from the database, if any, so one failed request does not fail the whole batch
+                self.logger.error("Error requesting character info for char_id '%d'" % char_id, e)
+                continue
+
+            if char_info and char_info.char_id == char_id:
+                result[char_id] = char_info
+                updated.append(char_info)
+
+        self.save_character_info_many(updated)
+
+        return result
+
     # forces a skeleton object into the player table in the case that PoRK does not return any data
     # call this method if you don't need the data now but want to ensure there is a record in the database
     def load_character_info(self, char_id, char_name=None):
@@ -116,48 +264,92 @@ class PorkService:
         if not char_info and char_name:
             char_info = self.get_character_info(char_name)
         if not char_info:
-            char_info = DictObject({
-                "name": "Unknown:" + str(char_id),
-                "char_id": char_id,
-                "first_name": "",
-                "last_name": "",
-                "level": 0,
-                "breed": "",
-                "dimension": self.bot.dimension,
-                "gender": "",
-                "faction": "",
-                "profession": "",
-                "profession_title": "",
-                "ai_rank": "",
-                "ai_level": 0,
-                "pvp_rating": 0,
-                "pvp_title": "",
-                "head_id": 0,
-                "org_id": 0,
-                "org_name": "",
-                "org_rank_name": "",
-                "org_rank_id": 6,
-                "source": "stub"
-            })
-            self.save_character_info(char_info)
+            self.save_character_info(self.get_stub_character_info(char_id))
+
+    def load_character_info_many(self, char_ids):
+        char_infos = self.get_character_info_many(char_ids)
+        self.save_character_info_many([self.get_stub_character_info(char_id) for char_id, char_info in char_infos.items() if not char_info])
+        return char_infos
+
+    def prefetch_character_info(self, char_id, callback=None):
+        """
+        Same as load_character_info(), except that the character is loaded after a short delay together with any
+        other characters prefetched in the meantime, so that bursts of joins and logons are loaded as one batch
+
+        Args:
+            char_id: int
+            callback: (char_info) -> void, called once the character has been loaded, with None if there is no data for the character
+        """
+
+        self.prefetch_char_ids.add(char_id)
+        if callback:
+            self.prefetch_callbacks.append((char_id, callback))
+        if not self.prefetch_job_id:
+            self.prefetch_job_id = self.job_scheduler.scheduled_job(self.prefetch_character_info_job, time.time() + self.PREFETCH_DELAY)
+
+    def prefetch_character_info_job(self, t):
+        char_ids = self.prefetch_char_ids
+        callbacks = self.prefetch_callbacks
+        self.prefetch_char_ids = set()
+        self.prefetch_callbacks = []
+        self.prefetch_job_id = None
 
-    def save_character_info(self, char_info):
-        if char_info["dimension"] != self.bot.dimension:
-            return
+        try:
+            char_infos = self.load_character_info_many(char_ids)
+        except Exception as e:
+            # the callbacks are still called, so that announcements waiting on the batch are not lost
+            self.logger.error("Error loading prefetched characters", e)
+            char_infos = {}
+
+        for char_id, callback in callbacks:
+            try:
+                callback(char_infos.get(char_id))
+            except Exception as e:
+                self.logger.error("Error calling callback for prefetched character '%d'" % char_id, e)
+
+    def get_stub_character_info(self, char_id):
+        return DictObject({
+            "name": "Unknown:" + str(char_id),
+            "char_id": char_id,
+            "first_name": "",
+            "last_name": "",
+            "level": 0,
+            "breed": "",
+            "dimension": self.bot.dimension,
+            "gender": "",
+            "faction": "",
+            "profession": "",
+            "profession_title": "",
+            "ai_rank": "",
+            "ai_level": 0,
+            "pvp_rating": 0,
+            "pvp_title": "",
+            "head_id": 0,
+            "org_id": 0,
+            "org_name": "",
+            "org_rank_name": "",
+            "org_rank_id": 6,
+            "source": "stub"
+        })
 
-        self.db.exec("DELETE FROM player WHERE char_id = ?", [char_info["char_id"]])
+    def save_character_info(self, char_info):
+        self.save_character_info_many([char_info])
 
-        insert_sql = """
-            INSERT IGNORE INTO player ( char_id, name, first_name, last_name, level, breed, gender, faction, profession,
-                profession_title, ai_rank, ai_level, org_id, org_name, org_rank_name, org_rank_id, dimension, head_id,
-                pvp_rating, pvp_title, source, last_updated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
+    def save_character_info_many(self, char_infos):
+        char_infos = [char_info for char_info in char_infos if char_info["dimension"] == self.bot.dimension]
+        if not char_infos:
+            return
 
-        self.db.exec(insert_sql, [char_info["char_id"], char_info["name"], char_info["first_name"], char_info["last_name"], char_info["level"], char_info["breed"],
-                                  char_info["gender"], char_info["faction"], char_info["profession"], char_info["profession_title"], char_info["ai_rank"], char_info["ai_level"],
-                                  char_info["org_id"], char_info["org_name"], char_info["org_rank_name"], char_info["org_rank_id"], char_info["dimension"], char_info["head_id"],
-                                  char_info["pvp_rating"], char_info["pvp_title"], char_info["source"], int(time.time())])
+        t = int(time.time())
+        self.db.upsert_many("player", ["char_id"], [{"char_id": char_info["char_id"], "name": char_info["name"], "first_name": char_info["first_name"],
+                                                     "last_name": char_info["last_name"], "level": char_info["level"], "breed": char_info["breed"],
+                                                     "gender": char_info["gender"], "faction": char_info["faction"], "profession": char_info["profession"],
+                                                     "profession_title": char_info["profession_title"], "ai_rank": char_info["ai_rank"],
+                                                     "ai_level": char_info["ai_level"], "org_id": char_info["org_id"], "org_name": char_info["org_name"],
+                                                     "org_rank_name": char_info["org_rank_name"], "org_rank_id": char_info["org_rank_id"],
+                                                     "dimension": char_info["dimension"], "head_id": char_info["head_id"], "pvp_rating": char_info["pvp_rating"],
+                                                     "pvp_title": char_info["pvp_title"], "source": char_info["source"], "last_updated": t}
+                                                    for char_info in char_infos])
 
     def get_from_database(self, char_id=None, char_name=None):
         if char_id:
@@ -173,6 +365,24 @@ class PorkService:
         else:
             return None
 
+    def get_from_database_many(self, char_ids):
+        """returns a dict of char_id => char_info for each of the char_ids, where char_info is None if the character is not in the database"""
+
+        result = dict.fromkeys(char_ids)
+        for chunk in self.chunk_list(list(result.keys())):
+            data = self.db.query("SELECT char_id, name, first_name, last_name, level, breed, gender, faction, profession, "
+                                 "profession_title, ai_rank, ai_level, org_id, org_name, org_rank_name, org_rank_id, "
+                                 "dimension, head_id, pvp_rating, pvp_title, source, last_updated "
+                                 "FROM player WHERE char_id IN (%s)" % ", ".join(["?"] * len(chunk)), chunk)
+            for row in data:
+                result[row.char_id] = row
+
+        return result
+
+    def chunk_list(self, items):
+        # keep the number of sql params below the sqlite limit
+        return [items[i:i + self.MAX_SQL_PARAMS] for i in range(0, len(items), self.MAX_SQL_PARAMS)]
+
     def update(self, conn, packet):
         # don't update if we didn't get a valid response
         if packet.char_id == 4294967295:
@@ -67,6 +67,13 @@ class MessageHubService:
         if data:
             self.hub[destination].sources = list(map(lambda x: x.source, data))
 
+    def save_mapping(self, destination):
+        # all sources are saved, since the default sources are used when there are no saved sources for a destination
+        with self.db.transaction():
+            self.db.exec("DELETE FROM message_hub_subscriptions WHERE destination = ?", [destination])
+            self.db.exec_many("INSERT INTO message_hub_subscriptions (destination, source) VALUES (?, ?)",
+                              [[destination, source] for source in self.hub[destination].sources])
+
     def send_message(self, source, sender, channel_prefix, message):
         ctx = MessageHubContext(source, sender, channel_prefix, message, self.get_formatted_message(channel_prefix, sender, message))
 
@@ -86,12 +93,8 @@ class MessageHubService:
             raise Exception("Message hub destination '%s' does not exist" % destination)
 
         if source not in obj.sources:
-            self.db.exec("DELETE FROM message_hub_subscriptions WHERE destination = ?", [destination])
-
             obj.sources.append(source)
-            for source in obj.sources:
-                self.db.exec("INSERT INTO message_hub_subscriptions (destination, source)"
-                             "VALUES (?, ?)", [destination, source])
+            self.save_mapping(destination)
 
     def unsubscribe_from_source(self, destination, source):
         # if source not in self.sources:
@@ -102,12 +105,8 @@ class MessageHubService:
             raise Exception("Message hub destination '%s' does not exist" % destination)
 
         if source in obj.sources:
-            self.db.exec("DELETE FROM message_hub_subscriptions WHERE destination = ?", [destination])
-
             obj.sources.remove(source)
-            for source in obj.sources:
-                self.db.exec("INSERT INTO message_hub_subscriptions (destination, source)"
-                             "VALUES (?, ?)", [destination, source])
+            self.save_mapping(destination)
 
     def get_formatted_message(self, channel_prefix, sender, message):
         formatted_message = ""
@@ -0,0 +1,212 @@
+import bisect
+import math
+import threading
+
+
+class Metric:
+    """Base class for metrics that are updated as things happen, with one value (or set of values) for each combination of label values"""
+
+    type = None
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+        self.children = {}
+
+    def labels(self, *label_values):
+        """returns the child metric for the label values, which should be kept and reused where possible"""
+
+        child = self.children.get(label_values)
+        if child is None:
+            if len(label_values) != len(self.label_names):
+                raise Exception("Expected %d label values for metric '%s', got %d" % (len(self.label_names), self.name, len(label_values)))
+
+            with self.lock:
+                child = self.children.setdefault(label_values, self.create_child())
+        return child
+
+    def create_child(self):
+        raise NotImplementedError()
+
+    def collect(self):
+        """returns a list of (name suffix, labels, value) for each sample"""
+
+        result = []
+        for label_values, child in list(self.children.items()):
+            result.extend(child.collect(dict(zip(self.label_names, label_values))))
+        return result
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def create_child(self):
+        return CounterChild()
+
+
+class CounterChild:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def collect(self, labels):
+        return [("", labels, self.value)]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def create_child(self):
+        return GaugeChild()
+
+
+class GaugeChild:
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def collect(self, labels):
+        return [("", labels, self.value)]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    # in seconds, suitable for timing commands, queries and requests
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def create_child(self):
+        return HistogramChild(self.buckets)
+
+
+class HistogramChild:
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        # counts for each bucket, not cumulative, and the last one for values above the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def collect(self, labels):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+
+        result = []
+        count = 0
+        for bucket, bucket_count in zip(self.buckets + (math.inf,), counts):
+            count += bucket_count
+            result.append(("_bucket", {**labels, "le": bucket}, count))
+        result.append(("_sum", labels, total))
+        result.append(("_count", labels, count))
+        return result
+
+
+class MetricsRegistry:
+    """
+    Metrics that are updated as things happen, and collectors that return metrics for values that are already tracked
+    elsewhere, which are only read when the metrics are rendered
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+
+    def counter(self, name, description, label_names=()):
+        return self.register(Counter(name, description, label_names))
+
+    def gauge(self, name, description, label_names=()):
+        return self.register(Gauge(name, description, label_names))
+
+    def histogram(self, name, description, label_names=(), buckets=Histogram.DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, label_names, buckets))
+
+    def register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing:
+                if type(existing) != type(metric) or existing.label_names != metric.label_names:
+                    raise Exception("Metric '%s' has already been registered with a different type or labels" % metric.name)
+                return existing
+
+            self.metrics[metric.name] = metric
+            return metric
+
+    def add_collector(self, callback):
+        """
+        Args:
+            callback: () -> list of (name, type, description, samples), where samples is a list of (name suffix, labels, value)
+        """
+
+        self.collectors.append(callback)
+
+    def collect(self):
+        result = [(metric.name, metric.type, metric.description, metric.collect()) for metric in list(self.metrics.values())]
+        for callback in self.collectors:
+            result.extend(callback())
+        return result
+
+    def render(self):
+        """returns the metrics in the Prometheus text format"""
+
+        lines = []
+        for name, _type, description, samples in self.collect():
+            lines.append("# HELP %s %s" % (name, description.replace("\\", "\\\\").replace("\n", "\\n")))
+            lines.append("# TYPE %s %s" % (name, _type))
+            for suffix, labels, value in samples:
+                lines.append("%s%s%s %s" % (name, suffix, self.format_labels(labels), self.format_value(value)))
+
+        return "\n".join(lines) + "\n"
+
+    def format_labels(self, labels):
+        if not labels:
+            return ""
+
+        return "{" + ",".join('%s="%s"' % (k, self.format_label_value(v)) for k, v in labels.items()) + "}"
+
+    def format_label_value(self, value):
+        if isinstance(value, float):
+            return self.format_value(value)
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def format_value(self, value):
+        if value == math.inf:
+            return "+Inf"
+        elif value == -math.inf:
+            return "-Inf"
+        elif isinstance(value, float):
+            return repr(value)
+        else:
+            return str(value)
+
+
+# the registry that the bot's metrics are added to and exported from
+registry = MetricsRegistry()
@@ -0,0 +1,183 @@
+import asyncio
+
+from core import metrics
+from core.aochat.client_packets import ClientPacket
+from core.aochat.server_packets import ServerPacket
+from core.decorators import instance
+from core.logger import Logger
+from core.setting_types import BooleanSettingType, NumberSettingType, TextSettingType
+
+
+@instance()
+class MetricsService:
+    """
+    Exports the metrics in the metrics registry in the Prometheus text format, from an optional HTTP server
+    on the AsyncService loop, and adds the metrics that are read from the bot's state when they are exported
+    """
+
+    METRICS_PATH = "/metrics"
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    REQUEST_TIMEOUT = 5
+
+    def __init__(self):
+        self.logger = Logger(__name__)
+        self.registry = metrics.registry
+        self.server = None
+
+    def inject(self, registry):
+        self.bot = registry.get_instance("bot")
+        self.async_service = registry.get_instance("async_service")
+        self.setting_service = registry.get_instance("setting_service")
+        self.event_service = registry.get_instance("event_service")
+        self.buddy_service = registry.get_instance("buddy_service")
+
+    def pre_start(self):
+        self.registry.add_collector(self.collect_conn_metrics)
+        self.registry.add_collector(self.collect_incoming_queue_metrics)
+        self.registry.add_collector(self.collect_event_handler_metrics)
+
+    def start(self):
+        self.setting_service.register("core.system", "metrics_server_enabled", False, BooleanSettingType(),
+                                      "Enable or disable the HTTP server that exports metrics for Prometheus at " + self.METRICS_PATH)
+        self.setting_service.register("core.system", "metrics_server_host", "127.0.0.1", TextSettingType(["127.0.0.1", "0.0.0.0"]),
+                                      "The host address the metrics HTTP server listens on")
+        self.setting_service.register("core.system", "metrics_server_port", 9464, NumberSettingType(),
+                                      "The port the metrics HTTP server listens on")
+        self.setting_service.register_change_listener("metrics_server_enabled", self.metrics_server_enabled_changed)
+
+        if self.setting_service.get("metrics_server_enabled").get_value():
+            self.start_server()
+
+    def metrics_server_enabled_changed(self, setting_name, old_value, new_value):
+        if new_value:
+            self.start_server()
+        else:
+            self.stop_server()
+
+    def start_server(self):
+        self.stop_server()
+
+        host = self.setting_service.get("metrics_server_host").get_value()
+        port = int(self.setting_service.get("metrics_server_port").get_value())
+        try:
+            self.server = self.async_service.run_until_complete(asyncio.start_server(self.handle_request, host, port), timeout=5)
+            self.logger.info(f"Metrics server started on http://{host}:{port}{self.METRICS_PATH}")
+        except Exception as e:
+            self.logger.error(f"Could not start metrics server on {host}:{port}", e)
+
+    def stop_server(self):
+        if self.server:
+            server = self.server
+            self.server = None
+
+            async def close():
+                server.close()
+                await server.wait_closed()
+
+            self.async_service.run_until_complete(close(), timeout=5)
+            self.logger.info("Metrics server has been stopped")
+
+    async def handle_request(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=self.REQUEST_TIMEOUT)
+
+            # the headers are not needed, but are read so that the client is not reset when the connection is closed
+            line = await asyncio.wait_for(reader.readline(), timeout=self.REQUEST_TIMEOUT)
+            while line.strip():
+                line = await asyncio.wait_for(reader.readline(), timeout=self.REQUEST_TIMEOUT)
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?", 1)[0] == self.METRICS_PATH:
+                # rendered on a worker thread, so that reading and writing packets is not held up
+                body = await asyncio.get_running_loop().run_in_executor(None, self.render)
+                status = "200 OK"
+            else:
+                body = "Not Found\n"
+                status = "404 Not Found"
+
+            body = body.encode("utf-8")
+            writer.write(("HTTP/1.1 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % (status, self.CONTENT_TYPE, len(body))).encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            self.logger.error("Error handling metrics request", e)
+        finally:
+            writer.close()
+
+    def render(self):
+        return self.registry.render()
+
+    def collect_conn_metrics(self):
+        received = []
+        sent = []
+        filtered = []
+        filtered_bytes = []
+        outgoing_size = []
+        outgoing_sent = []
+        outgoing_dropped = []
+        outgoing_wait = []
+        buddy_list_size = []
+        for _id, conn in self.bot.get_conns():
+            labels = {"conn": _id}
+            for packet_id, count in list(conn.num_packets_received.items()):
+                received.append(("", {"conn": _id, "type": self.get_packet_type_name(ServerPacket, packet_id)}, count))
+            for packet_id, count in list(conn.num_packets_sent.items()):
+                sent.append(("", {"conn": _id, "type": self.get_packet_type_name(ClientPacket, packet_id)}, count))
+            filtered.append(("", labels, conn.num_filtered_packets))
+            filtered_bytes.append(("", labels, conn.num_filtered_bytes))
+
+            packet_queue = conn.packet_queue
+            outgoing_size.append(("", labels, len(packet_queue)))
+            outgoing_sent.append(("", labels, packet_queue.num_sent))
+            outgoing_dropped.append(("", labels, packet_queue.num_dropped))
+            outgoing_wait.append(("_sum", labels, packet_queue.total_wait_time))
+            outgoing_wait.append(("_count", labels, packet_queue.num_sent))
+
+            buddy_list_size.append(("", labels, len(conn.buddy_list)))
+
+        return [("tyrbot_packets_received_total", "counter", "Packets received, by conn and packet type", received),
+                ("tyrbot_packets_sent_total", "counter", "Packets sent, by conn and packet type", sent),
+                ("tyrbot_packets_filtered_total", "counter", "Packets received that were not decoded since nothing handles them for the conn", filtered),
+                ("tyrbot_packets_filtered_bytes_total", "counter", "Bytes received in packets that were not decoded", filtered_bytes),
+                ("tyrbot_outgoing_queue_size", "gauge", "Messages waiting in the outgoing message queue", outgoing_size),
+                ("tyrbot_outgoing_queue_sent_total", "counter", "Messages sent from the outgoing message queue", outgoing_sent),
+                ("tyrbot_outgoing_queue_dropped_total", "counter", "Messages dropped from the outgoing message queue because it was full", outgoing_dropped),
+                ("tyrbot_outgoing_queue_wait_seconds", "summary", "Time messages waited in the outgoing message queue", outgoing_wait),
+                ("tyrbot_buddy_list_size", "gauge", "Characters on the buddy list, by conn", buddy_list_size),
+                ("tyrbot_buddy_list_capacity", "gauge", "Max number of characters on the buddy lists of all conns", [("", {}, self.buddy_service.buddy_list_size)])]
+
+    def collect_incoming_queue_metrics(self):
+        size = []
+        dropped = []
+        coalesced = []
+        wait = []
+        for stats in self.bot.incoming_queue.get_stats():
+            labels = {"lane": stats.name}
+            size.append(("", labels, stats.size))
+            dropped.append(("", labels, stats.dropped))
+            coalesced.append(("", labels, stats.coalesced))
+            wait.append(("_sum", labels, stats.avg_wait_time * stats.processed))
+            wait.append(("_count", labels, stats.processed))
+
+        return [("tyrbot_incoming_queue_size", "gauge", "Packets waiting in the incoming packet queue, by lane", size),
+                ("tyrbot_incoming_queue_dropped_total", "counter", "Packets dropped from the incoming packet queue because the lane was full", dropped),
+                ("tyrbot_incoming_queue_coalesced_total", "counter", "Packets that replaced a packet for the same character in the incoming packet queue", coalesced),
+                ("tyrbot_incoming_queue_wait_seconds", "summary", "Time packets waited in the incoming packet queue, by lane", wait)]
+
+    def collect_event_handler_metrics(self):
+        durations = []
+        errors = []
+        for stats in self.event_service.get_handler_stats():
+            labels = {"handler": stats.handler}
+            durations.append(("", {**labels, "quantile": 0.99}, stats.p99_time))
+            durations.append(("_sum", labels, stats.total_time))
+            durations.append(("_count", labels, stats.count))
+            errors.append(("", labels, stats.errors))
+
+        return [("tyrbot_event_handler_duration_seconds", "summary", "Time spent running event handlers, by handler", durations),
+                ("tyrbot_event_handler_errors_total", "counter", "Event handler runs that raised an exception, by handler", errors)]
+
+    def get_packet_type_name(self, packet_class, packet_id):
+        packet_type = packet_class.packet_types.get(packet_id)
+        return packet_type.__name__ if packet_type else str(packet_id)
@@ -66,6 +66,7 @@ class PrivateChannelService:
         else:
             self.logger.log_chat(conn, "Private Channel", None, f"{char_name} joined the channel.")
             conn.private_channel[packet.char_id] = packet
+            self.access_service.clear_access_level_cache()
 
             if conn.is_main:
                 self.event_service.fire_event(self.JOINED_PRIVATE_CHANNEL_EVENT, DictObject({"char_id": packet.char_id,
@@ -81,6 +82,7 @@ class PrivateChannelService:
         else:
             self.logger.log_chat(conn, "Private Channel", None, f"{char_name} left the channel.")
             del conn.private_channel[packet.char_id]
+            self.access_service.clear_access_level_cache()
 
             if conn.is_main:
                 self.event_service.fire_event(self.LEFT_PRIVATE_CHANNEL_EVENT, DictObject({"char_id": packet.char_id,
@@ -28,10 +28,10 @@ class PublicChannelService:
         self.command_service = registry.get_instance("command_service")
 
     def pre_start(self):
-        self.bot.register_packet_handler(server_packets.LoginOK.id, self.handle_login_ok)
-        self.bot.register_packet_handler(server_packets.PublicChannelJoined.id, self.add)
-        self.bot.register_packet_handler(server_packets.PublicChannelLeft.id, self.remove)
-        self.bot.register_packet_handler(server_packets.PublicChannelMessage.id, self.public_channel_message)
+        self.bot.register_packet_handler(server_packets.LoginOK.id, self.handle_login_ok, main_only=True)
+        self.bot.register_packet_handler(server_packets.PublicChannelJoined.id, self.add, main_only=True)
+        self.bot.register_packet_handler(server_packets.PublicChannelLeft.id, self.remove, main_only=True)
+        self.bot.register_packet_handler(server_packets.PublicChannelMessage.id, self.public_channel_message, main_only=True)
 
         self.event_service.register_event_type(self.ORG_CHANNEL_COMMAND_EVENT)
         self.event_service.register_event_type(self.ORG_CHANNEL_MESSAGE_EVENT)
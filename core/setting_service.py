@@ -12,9 +12,13 @@ class SettingService:
     def __init__(self):
         self.logger = Logger(__name__)
         self.settings = {}
-        self.db_cache = {}
         self.change_listeners = {}
 
+        # raw values of all settings by name, loaded with a single query and replaced as a whole when a value changes,
+        # so that reading a setting never needs the database
+        self.values = None
+        self.num_db_queries = 0
+
     def inject(self, registry):
         self.db = registry.get_instance("db")
         self.util = registry.get_instance("util")
@@ -41,14 +45,13 @@ class SettingService:
         if " " in name:
             raise Exception("One or more spaces found in setting name '%s' for module '%s'" % (name, module))
 
-        row = self.db.query_single("SELECT name, value, description FROM setting WHERE name = ?", [name])
-
-        if row is None:
+        if name not in self.get_values():
             self.logger.debug("Adding setting '%s'" % name)
 
             self.db.exec(
                 "INSERT INTO setting (name, value, description, module, verified) VALUES (?, ?, ?, ?, ?)",
                 [name, "", description, module, 1])
+            self.update_values(name, "")
 
             # verify default value is a valid value, and is formatted appropriately
             setting.set_value(value)
@@ -80,30 +83,34 @@ class SettingService:
             raise Exception("Could not register change_listener for setting '%s' since it does not exist" % setting_name)
 
     def get_value(self, name: str) -> str | None:
-        # check cache first
-        result = self.db_cache.get(name, None)
-        if result:
-            return result.value
-        else:
-            row = self.db.query_single("SELECT value FROM setting WHERE name = ?", [name])
-
-            # store result in cache
-            self.db_cache[name] = row
-
-            return row.value if row else None
+        return self.get_values().get(name)
 
     def set_value(self, name, value):
         old_value = self.get_value(name)
 
-        # clear cache
-        self.db_cache[name] = None
-
         self.db.exec("UPDATE setting SET value = ? WHERE name = ?", [value, name])
+        self.update_values(name, value)
 
         if name in self.change_listeners:
             for change_listener in self.change_listeners[name]:
                 change_listener(name, old_value, value)
 
+    def get_values(self):
+        values = self.values
+        if values is None:
+            values = self.values = self.load_values()
+        return values
+
+    def load_values(self):
+        self.num_db_queries += 1
+        return {row.name: row.value for row in self.db.query("SELECT name, value FROM setting")}
+
+    def update_values(self, name, value):
+        # values are stored as strings, the same as they are read back from the database
+        values = self.get_values().copy()
+        values[name] = None if value is None else str(value)
+        self.values = values
+
     def get(self, name: str) -> SettingType | None:
         name = name.lower()
         setting = self.settings.get(name, None)
@@ -11,6 +11,9 @@ class SettingType:
         self.setting_service = Registry.get_instance("setting_service")
         self.name = None
 
+        # (raw_value, value) of the last parsed value
+        self.parsed_value = (None, None)
+
     def set_name(self, name):
         self.name = name
 
@@ -28,7 +31,16 @@ class SettingType:
 
     def get_value(self):
         """Get the processed/typed value"""
-        return self._get_raw_value()
+        raw_value = self._get_raw_value()
+        parsed_raw_value, value = self.parsed_value
+        if raw_value is None or raw_value != parsed_raw_value:
+            value = self.parse_value(raw_value)
+            self.parsed_value = (raw_value, value)
+        return value
+
+    def parse_value(self, raw_value):
+        """Convert the raw value to the processed/typed value"""
+        return raw_value
 
     def get_display_value(self):
         """Get the value formatted for display"""
@@ -106,9 +118,12 @@ class DictionarySettingType(SettingType):
             raise Exception("Value must be a dictionary.")
 
     def get_value(self):
-        value = self._get_raw_value()
-        if value:
-            return DictObject(json.loads(value))
+        # not cached since callers are free to modify the returned dict
+        return self.parse_value(self._get_raw_value())
+
+    def parse_value(self, raw_value):
+        if raw_value:
+            return DictObject(json.loads(raw_value))
         else:
             return DictObject()
 
@@ -202,10 +217,9 @@ class NumberSettingType(SettingType):
         self.options = options
         self.allow_empty = allow_empty
 
-    def get_value(self):
-        v = self._get_raw_value()
-        if v != "":
-            return int(self._get_raw_value())
+    def parse_value(self, raw_value):
+        if raw_value != "":
+            return int(raw_value)
         else:
             return ""
 
@@ -243,8 +257,8 @@ class TimeSettingType(SettingType):
         super().__init__()
         self.options = options
 
-    def get_value(self):
-        return int(self._get_raw_value())
+    def parse_value(self, raw_value):
+        return int(raw_value)
 
     def get_display_value(self):
         util = Registry.get_instance("util")
@@ -275,8 +289,8 @@ class BooleanSettingType(SettingType):
     def __init__(self):
         super().__init__()
 
-    def get_value(self):
-        return int(self._get_raw_value()) == 1
+    def parse_value(self, raw_value):
+        return int(raw_value) == 1
 
     def get_display_value(self):
         return "<highlight>%s</highlight>" % ("True" if self.get_value() else "False")
@@ -0,0 +1,104 @@
+import functools
+import re
+import sys
+import threading
+from collections import Counter, deque
+
+from core.dict_object import DictObject
+
+
+class SqlProfiler:
+    MAX_STATEMENTS = 500
+    MAX_SAMPLES = 200
+    NORMALIZE_CACHE_SIZE = 2048
+    OTHER_STATEMENTS = "<other>"
+
+    whitespace_regex = re.compile(r"\s+")
+    literals_regex = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+    in_list_regex = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.normalize = functools.lru_cache(self.NORMALIZE_CACHE_SIZE)(self.normalize_sql)
+
+    def record(self, sql, params, elapsed, row_count):
+        key = self.normalize(sql)
+        caller = self.get_caller()
+
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                if len(self.stats) >= self.MAX_STATEMENTS:
+                    # statements seen after the limit is reached are only counted in aggregate
+                    key = self.OTHER_STATEMENTS
+                    stats = self.stats.get(key)
+
+                if stats is None:
+                    stats = self.stats[key] = StatementStats(key, self.MAX_SAMPLES)
+
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+            stats.rows += row_count
+            stats.samples.append(elapsed)
+            stats.callers[caller] += 1
+            if elapsed >= stats.max_time:
+                stats.sample_sql = sql
+                stats.sample_params = params
+
+    def get_stats(self, sort_by="total_time"):
+        """returns a list of the stats for each statement, sorted descending by sort_by"""
+
+        with self.lock:
+            result = []
+            for stats in self.stats.values():
+                samples = sorted(stats.samples)
+                result.append(DictObject({"sql": stats.sql,
+                                          "count": stats.count,
+                                          "total_time": stats.total_time,
+                                          "mean_time": stats.total_time / stats.count,
+                                          "p95_time": samples[int(len(samples) * 0.95)] if len(samples) > 1 else samples[0],
+                                          "max_time": stats.max_time,
+                                          "rows": stats.rows,
+                                          "callers": stats.callers.most_common(3),
+                                          "sample_sql": stats.sample_sql,
+                                          "sample_params": stats.sample_params}))
+
+        return sorted(result, key=lambda x: x[sort_by], reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def normalize_sql(self, sql):
+        sql = self.whitespace_regex.sub(" ", sql).strip()
+        sql = self.literals_regex.sub("?", sql)
+        return self.in_list_regex.sub("IN (...)", sql)
+
+    def get_caller(self):
+        # the first frame outside of the db module is the code that ran the query
+        frame = sys._getframe(2)
+        while frame and frame.f_globals.get("__name__") in ("core.db", __name__):
+            frame = frame.f_back
+
+        if not frame:
+            return "unknown"
+
+        code = frame.f_code
+        return frame.f_globals.get("__name__", "") + "." + getattr(code, "co_qualname", code.co_name)
+
+
+class StatementStats:
+    def __init__(self, sql, max_samples):
+        self.sql = sql
+        self.count = 0
+        self.total_time = 0
+        self.max_time = 0
+        self.rows = 0
+        self.samples = deque(maxlen=max_samples)
+        self.callers = Counter()
+
+        # the slowest execution, for explaining the query plan
+        self.sample_sql = None
+        self.sample_params = None
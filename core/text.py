@@ -161,9 +161,20 @@ class Text:
                      '_': 9, '`': 9, 'A': 10, 'B': 10, 'C': 10, 'H': 10, 'V': 10, 'X': 10, 'Z': 10, '&': 10, 'D': 11, 'G': 11, 'M': 11,
                      'O': 11, '+': 11, '~': 11, '%': 15, 'p': 9, 'm': 13, 'o': 9, '@': 14, 'W': 15}
 
+    color_tags = ["header", "header2", "highlight", "notice", "black", "white", "yellow", "blue", "green", "red", "orange", "grey", "cyan",
+                  "violet", "neutral", "omni", "clan", "unknown"]
+
+    # settings that are resolved into the format table
+    format_table_settings = ["header_color", "header2_color", "highlight_color", "notice_color", "neutral_color", "omni_color", "clan_color",
+                             "unknown_color", "symbol"]
+
+    format_tags_regex = re.compile("(<(?:/?(?:%s)|myname|myorg|tab|end|symbol|br)>)" % "|".join(color_tags))
+
     def __init__(self):
         self.logger = Logger(__name__)
         self.items_regex = re.compile(r"<a href=\"itemref://(\d+)/(\d+)/(\d+)\">(.+?)</a>")
+        self.format_table = None
+        self.format_table_listeners_registered = False
 
     def inject(self, registry):
         self.setting_service: SettingService = registry.get_instance("setting_service")
@@ -273,44 +284,66 @@ class Text:
         return list(map(mapper, zip(pages, range(1, num_pages + 1))))
 
     def split_by_separators(self, content, max_page_length=None, max_num_pages=None):
+        # pages are tracked as (start, end) offsets into content and only sliced at the end,
+        # so that the remaining content is not copied for every line
         separators = iter(self.separators)
 
         separator = next(separators)
-        rest = content
-        current_page = ""
+        pos = 0
+        current_page = []
+        current_page_length = 0
         pages = []
 
-        while len(rest) > 0:
-            line, rest = self.get_next_line(rest, separator)
-            line_length = len(line)
+        while pos < len(content):
+            symbol = separator["symbol"]
+            index = content.find(symbol, pos)
+            if index == -1:
+                if separator["include"]:
+                    # the last line is terminated with the separator, as if it had been there
+                    index = len(content)
+                    content += symbol
+                else:
+                    index = len(content)
+
+            if separator["include"]:
+                line_end = next_pos = index + len(symbol)
+            else:
+                line_end = index
+                next_pos = min(index + len(symbol), len(content))
+
+            line_length = line_end - pos
 
             # if separator is not sufficient, try the next one
             if max_page_length and line_length > max_page_length:
                 try:
                     separator = next(separators)
-                    rest = line + rest
+                    if line_end != next_pos:
+                        # separators that are not included in the line are dropped from the content
+                        content = content[:line_end] + content[next_pos:]
                     continue
                 except StopIteration:
                     # this is thrown when there are no more separators in the iterator
                     raise Exception("Could not paginate: page is too large")
 
             if max_num_pages == len(pages) + 1:
-                if max_page_length and (len(current_page) + line_length > max_page_length):
+                if max_page_length and (current_page_length + line_length > max_page_length):
                     break
             else:
-                if max_page_length and len(current_page) + line_length > max_page_length:
-                    pages.append(current_page.strip())
-                    current_page = ""
+                if max_page_length and current_page_length + line_length > max_page_length:
+                    pages.append(current_page)
+                    current_page = []
+                    current_page_length = 0
 
-            current_page += line
+            if current_page and current_page[-1][1] == pos:
+                current_page[-1] = (current_page[-1][0], line_end)
+            else:
+                current_page.append((pos, line_end))
+            current_page_length += line_length
+            pos = next_pos
 
-        current_page = current_page.strip()
-        if max_page_length and len(current_page) > max_page_length:
-            pages.append(current_page)
-        else:
-            pages.append(current_page)
+        pages.append(current_page)
 
-        return pages
+        return ["".join([content[start:end] for start, end in page]).strip() for page in pages]
 
     def format_page(self, label, msg):
         return "<a href=\"text://%s\">%s</a>" % (msg, label)
@@ -414,35 +447,56 @@ class Text:
         return text_formatter.format_message(msg)
 
     def format_message_old(self, msg, conn: Conn):
-        for t in ["</header>", "</header2>", "</highlight>", "</notice>", "</black>", "</white>", "</yellow>", "</blue>", "</green>", "</red>", "</orange>", "</grey>", "</cyan>",
-                  "</violet>", "</neutral>", "</omni>", "</clan>", "</unknown>"]:
-            msg = msg.replace(t, "</font>")
-
-        return msg \
-            .replace("<header>", self.setting_service.get("header_color").get_font_color()) \
-            .replace("<header2>", self.setting_service.get("header2_color").get_font_color()) \
-            .replace("<highlight>", self.setting_service.get("highlight_color").get_font_color()) \
-            .replace("<notice>", self.setting_service.get("notice_color").get_font_color()) \
-            \
-            .replace("<black>", "<font color='#000000'>") \
-            .replace("<white>", "<font color='#FFFFFF'>") \
-            .replace("<yellow>", "<font color='#FFFF00'>") \
-            .replace("<blue>", "<font color='#8CB5FF'>") \
-            .replace("<green>", "<font color='#00DE42'>") \
-            .replace("<red>", "<font color='#FF0000'>") \
-            .replace("<orange>", "<font color='#FCA712'>") \
-            .replace("<grey>", "<font color='#C3C3C3'>") \
-            .replace("<cyan>", "<font color='#00FFFF'>") \
-            .replace("<violet>", "<font color='#8F00FF'>") \
-            \
-            .replace("<neutral>", self.setting_service.get("neutral_color").get_font_color()) \
-            .replace("<omni>", self.setting_service.get("omni_color").get_font_color()) \
-            .replace("<clan>", self.setting_service.get("clan_color").get_font_color()) \
-            .replace("<unknown>", self.setting_service.get("unknown_color").get_font_color()) \
-            \
-            .replace("<myname>", conn.get_char_name()) \
-            .replace("<myorg>", conn.get_org_name() or "Unknown Org") \
-            .replace("<tab>", "    ") \
-            .replace("<end>", "</font>") \
-            .replace("<symbol>", self.setting_service.get("symbol").get_value()) \
-            .replace("<br>", "\n")
+        if "<" not in msg:
+            return msg
+
+        format_table = self.get_format_table().copy()
+        format_table["<myname>"] = conn.get_char_name()
+        format_table["<myorg>"] = conn.get_org_name() or "Unknown Org"
+
+        # splitting on a capture group puts the tags at the odd indexes, so every tag is replaced in a single pass
+        parts = self.format_tags_regex.split(msg)
+        parts[1::2] = map(format_table.__getitem__, parts[1::2])
+        return "".join(parts)
+
+    def get_format_table(self):
+        if self.format_table is None:
+            if not self.format_table_listeners_registered:
+                for setting_name in self.format_table_settings:
+                    self.setting_service.register_change_listener(setting_name, self.format_table_setting_changed)
+                self.format_table_listeners_registered = True
+
+            format_table = dict.fromkeys(["</" + tag + ">" for tag in self.color_tags], "</font>")
+            format_table.update({
+                "<header>": self.setting_service.get("header_color").get_font_color(),
+                "<header2>": self.setting_service.get("header2_color").get_font_color(),
+                "<highlight>": self.setting_service.get("highlight_color").get_font_color(),
+                "<notice>": self.setting_service.get("notice_color").get_font_color(),
+
+                "<black>": "<font color='#000000'>",
+                "<white>": "<font color='#FFFFFF'>",
+                "<yellow>": "<font color='#FFFF00'>",
+                "<blue>": "<font color='#8CB5FF'>",
+                "<green>": "<font color='#00DE42'>",
+                "<red>": "<font color='#FF0000'>",
+                "<orange>": "<font color='#FCA712'>",
+                "<grey>": "<font color='#C3C3C3'>",
+                "<cyan>": "<font color='#00FFFF'>",
+                "<violet>": "<font color='#8F00FF'>",
+
+                "<neutral>": self.setting_service.get("neutral_color").get_font_color(),
+                "<omni>": self.setting_service.get("omni_color").get_font_color(),
+                "<clan>": self.setting_service.get("clan_color").get_font_color(),
+                "<unknown>": self.setting_service.get("unknown_color").get_font_color(),
+
+                "<tab>": "    ",
+                "<end>": "</font>",
+                "<symbol>": self.setting_service.get("symbol").get_value(),
+                "<br>": "\n"
+            })
+            self.format_table = format_table
+
+        return self.format_table
+
+    def format_table_setting_changed(self, name, old_value, new_value):
+        self.format_table = None
@@ -8,6 +8,7 @@ import re
 from core.conn import Conn
 from core.feature_flags import FeatureFlags
 from core.fifo_queue import FifoQueue
+from core.incoming_packet_queue import IncomingPacketQueue
 from core.dict_object import DictObject
 from core.logger import Logger
 from core.lookup.character_service import CharacterService
@@ -34,13 +35,15 @@ class Tyrbot:
         self.logger = Logger(__name__)
         self.ready = False
         self.packet_handlers = {}
+        # (packet_id, handler) for handlers that only handle packets from main conns
+        self.main_only_packet_handlers = set()
         self.superadmin = None
         self.status: BotStatus = BotStatus.SHUTDOWN
         self.dimension = None
         self.last_timer_event = 0
         self.start_time = int(time.time())
         self.version = "unknown"
-        self.incoming_queue = FifoQueue()
+        self.incoming_queue = IncomingPacketQueue()
         self.mass_message_queue = None
         self.conns = DictObject()
         self.primary_conn_id = None
@@ -244,6 +247,7 @@ class Tyrbot:
         def get_bot_status():
             return self.status
 
+        conn.packet_filter = self.get_packet_filter(conn)
         conn.start_packet_loop(self.incoming_queue, mass_message_queue, get_bot_status)
 
     def create_conn(self, _id):
@@ -290,26 +294,42 @@ class Tyrbot:
 
         while self.status == BotStatus.RUN:
             try:
-                timestamp = int(time.time())
+                timestamp = time.time()
                 self.check_for_timer_events(timestamp)
 
-                self.iterate()
+                self.iterate(self.get_iterate_timeout(timestamp))
             except Exception as e:
                 self.logger.error("", e)
 
         # run any pending jobs/events
-        self.check_for_timer_events(timestamp + 1)
+        self.check_for_timer_events(int(timestamp) + 1)
+
+        try:
+            self.event_service.save_timer_events()
+        except Exception as e:
+            self.logger.error("Error saving timer events", e)
 
         return self.status
 
     def check_for_timer_events(self, timestamp):
+        # scheduled jobs have sub-second resolution
+        self.job_scheduler.check_for_scheduled_jobs(timestamp)
+
         # timer events will execute no more often than once per second
+        timestamp = int(timestamp)
         if self.last_timer_event < timestamp:
             self.last_timer_event = timestamp
-            self.job_scheduler.check_for_scheduled_jobs(timestamp)
             self.event_service.check_for_timer_events(timestamp)
 
-    def register_packet_handler(self, packet_id: int, handler, priority=50):
+    def get_iterate_timeout(self, timestamp, max_timeout=0.1):
+        # wake up in time for the next scheduled job
+        next_job_time = self.job_scheduler.get_next_job_time()
+        if next_job_time is None:
+            return max_timeout
+        else:
+            return max(0, min(max_timeout, next_job_time - timestamp))
+
+    def register_packet_handler(self, packet_id: int, handler, priority=50, main_only=False):
         """
         Call during pre_start
 
@@ -317,6 +337,8 @@ class Tyrbot:
             packet_id: int
             handler: (conn, packet) -> void
             priority: int
+            main_only: bool - whether the handler ignores packets from conns that are not main, so that those conns can skip
+                decoding the packet when no other handler needs it
         """
 
         if len(inspect.signature(handler).parameters) != 2:
@@ -326,12 +348,34 @@ class Tyrbot:
         handlers.append(DictObject({"priority": priority, "handler": handler}))
         self.packet_handlers[packet_id] = sorted(handlers, key=lambda x: x.priority)
 
+        if main_only:
+            self.main_only_packet_handlers.add((packet_id, handler))
+        self.update_packet_filters()
+
     def remove_packet_handler(self, packet_id, handler):
         handlers = self.packet_handlers.get(packet_id, [])
         for h in handlers:
             if h.handler == handler:
                 handlers.remove(h)
 
+        self.main_only_packet_handlers.discard((packet_id, handler))
+        self.update_packet_filters()
+
+    def get_packet_filter(self, conn):
+        """returns the ids of the packets that conn should decode and queue, which are those that have a handler for conn"""
+
+        # SystemMessage is logged by iterate() even without a handler
+        packet_ids = {server_packets.SystemMessage.id}
+        for packet_id, handlers in self.packet_handlers.items():
+            if any(conn.is_main or (packet_id, h.handler) not in self.main_only_packet_handlers for h in handlers):
+                packet_ids.add(packet_id)
+
+        return frozenset(packet_ids)
+
+    def update_packet_filters(self):
+        for _id, conn in self.get_conns():
+            conn.packet_filter = self.get_packet_filter(conn)
+
     def iterate(self, timeout=0.1):
         conn, packet = self.incoming_queue.get_or_default(block=True, timeout=timeout, default=(None, None))
         if packet:
@@ -388,7 +432,7 @@ class Tyrbot:
             def map_page(page):
                 return client_packets.PublicChannelMessage(conn.org_channel_id, color + page, "")
 
-            conn.add_packets_to_queue(map(map_page, pages))
+            conn.add_packets_to_queue(map(map_page, pages), Conn.PRIORITY_ORG_MESSAGE)
 
     def send_private_message(self, char_id, msg, add_color=True, conn=None):
         if not conn:
@@ -404,7 +448,7 @@ class Tyrbot:
                 self.logger.log_tell(conn, "To", self.character_service.get_char_name(char_id), page)
                 return client_packets.PrivateMessage(char_id, color + page, "\0")
 
-            conn.add_packets_to_queue(map(map_page, pages))
+            conn.add_packets_to_queue(map(map_page, pages), Conn.PRIORITY_PRIVATE_MESSAGE)
 
     def send_private_channel_message(self, msg, private_channel_id=None, add_color=True, conn=None):
         if not conn:
@@ -433,7 +477,11 @@ class Tyrbot:
                 if self.mass_message_queue:
                     self.mass_message_queue.put(packet)
                 else:
-                    conn.add_packets_to_queue([packet])
+                    conn.add_packets_to_queue([packet], Conn.PRIORITY_MASS_MESSAGE)
+
+            if self.mass_message_queue:
+                for _id, mass_message_conn in self.get_conns(lambda x: x.mass_message_queue):
+                    mass_message_conn.notify_packet_writer()
 
     def send_message_to_other_org_channels(self, msg, from_conn: Conn):
         for _id, conn in self.get_conns(lambda x: x.is_main and x.org_id and x != from_conn):
@@ -37,6 +37,7 @@ class ConfigCommandController:
             params.append(cmd_channel)
 
         count = self.db.exec(sql, params)
+        self.command_service.clear_command_config_cache()
         if count == 0:
             return f"Could not find command <highlight>{cmd_name}</highlight> for channel <highlight>{cmd_channel}</highlight>."
         else:
@@ -69,6 +70,7 @@ class ConfigCommandController:
             params.append(cmd_channel)
 
         count = self.db.exec(sql, params)
+        self.command_service.clear_command_config_cache()
         if count == 0:
             return f"Could not find command <highlight>{cmd_name}</highlight> for channel <highlight>{cmd_channel}</highlight>."
         else:
@@ -68,9 +68,7 @@ class HelpController:
             help_topic = alias
 
         # check if help topic matches a command
-        data = self.db.query("SELECT command, sub_command, access_level FROM command_config "
-                             "WHERE command = ? AND channel = ? AND enabled = 1",
-                             [help_topic, request.channel])
+        data = self.command_service.get_enabled_command_configs(help_topic, request.channel)
 
         help_text = self.command_service.format_help_text(data, request.sender.char_id, named_params.show_regex)
         if help_text:
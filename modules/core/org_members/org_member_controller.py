@@ -112,7 +112,7 @@ class OrgMemberController:
     @command(command="orgmember", params=[], access_level="moderator",
              description="Show the list of org members")
     def orgmember_list_cmd(self, request):
-        data = self.db.query("SELECT p.*, o.char_id, o.mode FROM org_member o LEFT JOIN player p ON o.char_id = p.char_id ORDER BY name")
+        data = self.db.query("SELECT p.*, o.char_id, o.mode FROM org_member o LEFT JOIN player p ON o.char_id = p.char_id ORDER BY name", compact_rows=True)
         blob = ""
         for row in data:
             blob += self.text.format_char_info(row) + " " + row.mode + "\n"
@@ -197,6 +197,7 @@ class OrgMemberController:
         for org_id in extra_org_ids:
             # TODO remove from buddy list
             self.db.exec("DELETE FROM org_member WHERE org_id = ?", [org_id])
+            self.access_service.clear_access_level_cache()
 
     @event(PublicChannelService.ORG_MSG_EVENT, "Update org roster when characters join or leave", is_system=True)
     def org_msg_event(self, event_type, event_data):
@@ -259,15 +260,21 @@ class OrgMemberController:
 
     def add_org_member(self, char_id, mode, org_id):
         self.update_buddylist(char_id, self.MODE_ADD_MANUAL)
-        return self.db.exec("INSERT INTO org_member (char_id, mode, org_id) VALUES (?, ?, ?)", [char_id, mode, org_id])
+        num_rows = self.db.exec("INSERT INTO org_member (char_id, mode, org_id) VALUES (?, ?, ?)", [char_id, mode, org_id])
+        self.access_service.clear_access_level_cache()
+        return num_rows
 
     def remove_org_member(self, char_id):
         self.update_buddylist(char_id, self.MODE_REM_MANUAL)
-        return self.db.exec("DELETE FROM org_member WHERE char_id = ?", [char_id])
+        num_rows = self.db.exec("DELETE FROM org_member WHERE char_id = ?", [char_id])
+        self.access_service.clear_access_level_cache()
+        return num_rows
 
     def update_org_member(self, char_id, mode, org_id):
         self.update_buddylist(char_id, mode)
-        return self.db.exec("UPDATE org_member SET mode = ?, org_id = ? WHERE char_id = ?", [mode, org_id, char_id])
+        num_rows = self.db.exec("UPDATE org_member SET mode = ?, org_id = ? WHERE char_id = ?", [mode, org_id, char_id])
+        self.access_service.clear_access_level_cache()
+        return num_rows
 
     def check_org_member(self, char_id):
         return self.get_org_member(char_id) is not None
@@ -132,10 +132,13 @@ class PrivateChannelController:
     @event(event_type=PrivateChannelService.JOINED_PRIVATE_CHANNEL_EVENT, description="Notify when a character joins the private channel")
     def handle_private_channel_joined_event(self, event_type, event_data):
         if self.online_controller:
-            char_info = self.online_controller.get_char_info_display(event_data.char_id, event_data.conn)
+            # the char info is loaded in a batch with any other characters that join at about the same time
+            self.online_controller.get_char_info_display_async(event_data.char_id, event_data.conn,
+                                                               lambda char_info: self.send_private_channel_joined_message(char_info, event_data))
         else:
-            char_info = self.character_service.resolve_char_to_name(event_data.char_id)
+            self.send_private_channel_joined_message(self.character_service.resolve_char_to_name(event_data.char_id), event_data)
 
+    def send_private_channel_joined_message(self, char_info, event_data):
         msg = f"{char_info} has joined the private channel."
         if self.log_controller:
             msg += " " + self.log_controller.get_logon(event_data.char_id)
@@ -0,0 +1,50 @@
+from core.chat_blob import ChatBlob
+from core.command_param_types import Const, NamedParameters
+from core.decorators import instance, command
+
+
+@instance()
+class EventStatsController:
+    MAX_HANDLERS = 20
+
+    sort_options = {"total": "total_time", "p99": "p99_time", "count": "count", "mean": "mean_time", "max": "max_time", "errors": "errors"}
+
+    def inject(self, registry):
+        self.event_service = registry.get_instance("event_service")
+        self.text = registry.get_instance("text")
+
+    @command(command="eventstats", params=[NamedParameters(["sort"])], access_level="admin",
+             description="Show the event handlers that have taken the most time")
+    def eventstats_cmd(self, request, named_params):
+        sort = named_params.sort or "total"
+        if sort not in self.sort_options:
+            return "Sort must be one of: <highlight>%s</highlight>." % ", ".join(self.sort_options.keys())
+
+        stats = self.event_service.get_handler_stats(self.sort_options[sort])
+
+        blob = "Sort by: " + " ".join(map(lambda x: self.text.make_tellcmd(x, "eventstats --sort=" + x), self.sort_options.keys())) + "\n"
+        blob += self.text.make_tellcmd("Reset", "eventstats reset") + "\n\n"
+
+        queue_depths = self.event_service.get_pool_queue_depths()
+        if queue_depths:
+            blob += "<header2>Worker Pool Queue</header2>\n"
+            for row in queue_depths:
+                blob += "%s: <highlight>%d</highlight> waiting, %d max\n" % (row.event_type, row.depth, row.max_depth)
+            blob += "\n"
+
+        for row in stats[:self.MAX_HANDLERS]:
+            blob += "<pagebreak><highlight>%s</highlight>\n" % row.handler
+            blob += "Count: %d, Errors: %d\n" % (row.count, row.errors)
+            blob += "Total: %s, Mean: %s, P99: %s, Max: %s\n\n" % (self.format_time(row.total_time), self.format_time(row.mean_time),
+                                                                   self.format_time(row.p99_time), self.format_time(row.max_time))
+
+        return ChatBlob("Event Handler Stats (%d)" % len(stats), blob)
+
+    @command(command="eventstats", params=[Const("reset")], access_level="admin",
+             description="Clear the event handler statistics")
+    def eventstats_reset_cmd(self, request, _):
+        self.event_service.reset_handler_stats()
+        return "Event handler statistics have been cleared."
+
+    def format_time(self, t):
+        return "%.1fms" % (t * 1000)
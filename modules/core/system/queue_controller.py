@@ -1,4 +1,5 @@
 from core.command_param_types import Const, Any
+from core.chat_blob import ChatBlob
 from core.decorators import instance, command
 
 
@@ -12,11 +13,33 @@ class QueueController:
     def start(self):
         self.command_alias_service.add_alias("clearqueue", "queue clear")
 
+    @command(command="queue", params=[], access_level="moderator",
+             description="Show the incoming packet queue and the outgoing message queue for each bot")
+    def queue_cmd(self, request):
+        blob = "<header2>Incoming Packets</header2>\n"
+        for stats in self.bot.incoming_queue.get_stats():
+            blob += f"<highlight>{stats.name.capitalize()}</highlight>: {stats.size} queued (max {stats.max_size}), "
+            blob += f"{stats.processed} processed, {stats.dropped} dropped, {stats.coalesced} coalesced, "
+            blob += f"Avg Wait Time: {stats.avg_wait_time:.2f}s, Max Wait Time: {stats.max_wait_time:.2f}s\n"
+        blob += "\n"
+
+        for _id, conn in self.bot.get_conns():
+            stats = conn.packet_queue.get_stats()
+            blob += f"<pagebreak><header2>{_id}</header2>\n"
+            blob += f"Queued: <highlight>{stats.size}</highlight>\n"
+            blob += f"Sent: <highlight>{stats.sent}</highlight>\n"
+            blob += f"Dropped: <highlight>{stats.dropped}</highlight>\n"
+            blob += f"Avg Wait Time: <highlight>{stats.avg_wait_time:.2f}s</highlight>\n"
+            blob += f"Max Wait Time: <highlight>{stats.max_wait_time:.2f}s</highlight>\n\n"
+
+        return ChatBlob("Message Queues", blob)
+
     @command(command="queue", params=[Const("clear")], access_level="moderator",
              description="Clear the outgoing message queue")
     def queue_clear_cmd(self, request, _):
-        num_messages = len(request.conn.packet_queue)
-        request.conn.packet_queue.clear()
+        with request.conn.packet_queue_lock:
+            num_messages = len(request.conn.packet_queue)
+            request.conn.packet_queue.clear()
         return f"Cleared <highlight>{num_messages}</highlight> messages from the outgoing message queue."
 
     @command(command="massmsg", params=[Any("command")], access_level="moderator",
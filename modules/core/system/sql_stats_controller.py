@@ -0,0 +1,88 @@
+from core.chat_blob import ChatBlob
+from core.command_param_types import Const, NamedParameters, Options
+from core.db import DB
+from core.decorators import instance, command
+
+
+@instance()
+class SqlStatsController:
+    MAX_STATEMENTS = 20
+    MAX_EXPLAIN_STATEMENTS = 5
+
+    sort_options = {"total": "total_time", "count": "count", "mean": "mean_time", "p95": "p95_time", "max": "max_time", "rows": "rows"}
+
+    def inject(self, registry):
+        self.db = registry.get_instance("db")
+        self.text = registry.get_instance("text")
+
+    @command(command="sqlstats", params=[NamedParameters(["sort"])], access_level="superadmin",
+             description="Show statistics for the SQL statements executed while profiling is enabled")
+    def sqlstats_cmd(self, request, named_params):
+        if not self.db.profiler:
+            return "SQL profiling is not enabled. Use <highlight><symbol>sqlstats enable</highlight> to enable it."
+
+        sort = named_params.sort or "total"
+        if sort not in self.sort_options:
+            return "Sort must be one of: <highlight>%s</highlight>." % ", ".join(self.sort_options.keys())
+
+        stats = self.db.profiler.get_stats(self.sort_options[sort])
+
+        blob = "Sort by: " + " ".join(map(lambda x: self.text.make_tellcmd(x, "sqlstats --sort=" + x), self.sort_options.keys())) + "\n"
+        blob += self.text.make_tellcmd("Reset", "sqlstats reset") + " " + self.text.make_tellcmd("Disable", "sqlstats disable") + " "
+        blob += self.text.make_tellcmd("Explain top statements", "sqlstats explain") + "\n\n"
+
+        for row in stats[:self.MAX_STATEMENTS]:
+            blob += "<pagebreak><highlight>%s</highlight>\n" % self.escape_sql(row.sql)
+            blob += "Count: %d, Rows: %d\n" % (row.count, row.rows)
+            blob += "Total: %s, Mean: %s, P95: %s, Max: %s\n" % (self.format_time(row.total_time), self.format_time(row.mean_time),
+                                                                 self.format_time(row.p95_time), self.format_time(row.max_time))
+            blob += "Callers: %s\n\n" % ", ".join(map(lambda x: "%s (%d)" % x, row.callers))
+
+        return ChatBlob("SQL Stats (%d)" % len(stats), blob)
+
+    @command(command="sqlstats", params=[Options(["enable", "disable"])], access_level="superadmin",
+             description="Enable or disable SQL profiling")
+    def sqlstats_enable_cmd(self, request, action):
+        if action == "enable":
+            self.db.enable_profiling()
+            return "SQL profiling has been enabled."
+        else:
+            self.db.disable_profiling()
+            return "SQL profiling has been disabled and the statistics have been cleared."
+
+    @command(command="sqlstats", params=[Const("reset")], access_level="superadmin",
+             description="Clear the SQL profiling statistics")
+    def sqlstats_reset_cmd(self, request, _):
+        if not self.db.profiler:
+            return "SQL profiling is not enabled."
+
+        self.db.profiler.reset()
+        return "SQL profiling statistics have been cleared."
+
+    @command(command="sqlstats", params=[Const("explain")], access_level="superadmin",
+             description="Show the query plan for the SELECT statements with the highest total time")
+    def sqlstats_explain_cmd(self, request, _):
+        if not self.db.profiler:
+            return "SQL profiling is not enabled."
+
+        stats = [row for row in self.db.profiler.get_stats("total_time") if row.sample_sql and row.sample_sql.lstrip().upper().startswith("SELECT")]
+
+        blob = ""
+        for row in stats[:self.MAX_EXPLAIN_STATEMENTS]:
+            blob += "<pagebreak><highlight>%s</highlight>\n" % self.escape_sql(row.sql)
+            blob += "Total: %s, Count: %d\n" % (self.format_time(row.total_time), row.count)
+            try:
+                explain_sql = ("EXPLAIN QUERY PLAN " if self.db.type == DB.SQLITE else "EXPLAIN ") + row.sample_sql
+                for plan_row in self.db.query(explain_sql, row.sample_params):
+                    blob += "<tab>%s\n" % ", ".join(map(lambda x: "%s: %s" % x, plan_row.items()))
+            except Exception as e:
+                blob += "<tab>Could not explain statement: %s\n" % str(e)
+            blob += "\n"
+
+        return ChatBlob("SQL Query Plans (%d)" % min(len(stats), self.MAX_EXPLAIN_STATEMENTS), blob)
+
+    def format_time(self, t):
+        return "%.1fms" % (t * 1000)
+
+    def escape_sql(self, sql):
+        return sql.replace("<", "&lt;").replace(">", "&gt;")
@@ -146,6 +146,7 @@ class UtilController:
             blob += "\n"
 
             if flag_params.show_all:
+                blob += f"Filtered Packets: {conn.num_filtered_packets} ({conn.num_filtered_bytes} bytes)\n"
                 for channel_id, packet in conn.channels.items():
                     blob += f"{packet.args}\n"
                 blob += "\n"
@@ -164,6 +165,10 @@ class UtilController:
             for access_level in self.access_service.get_access_levels():
                 blob += "%s (%d)\n" % (access_level["label"], access_level["level"])
 
+            cache_stats = self.access_service.get_access_level_cache_stats()
+            blob += f"\nCache: <highlight>{cache_stats.hits}</highlight> hits, <highlight>{cache_stats.misses}</highlight> misses, " \
+                    f"<highlight>{cache_stats.size}</highlight> entries\n"
+
         return ChatBlob("System Info", blob)
 
     @command(command="htmldecode", params=[Any("command")], access_level="all",
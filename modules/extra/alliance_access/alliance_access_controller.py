@@ -51,6 +51,7 @@ class AllianceAccessController:
 
         self.db.exec("INSERT INTO alliance_org (org_id, name, faction, created_at, created_by) VALUES (?, ?, ?, ?, ?)",
                      [org_id, org_info.org_info.name, org_info.org_info.faction, int(time.time()), request.sender.char_id])
+        self.access_service.clear_access_level_cache()
 
         return f"Org <highlight>{org_info.org_info.name}</highlight> ({org_id}) has been added to the alliance successfully."
 
@@ -62,6 +63,7 @@ class AllianceAccessController:
             return f"Org <highlight>{alliance_org.name}</highlight> ({org_id}) does not belong to the alliance."
 
         self.db.exec("DELETE FROM alliance_org WHERE org_id = ?", [org_id])
+        self.access_service.clear_access_level_cache()
 
         return f"Org <highlight>{alliance_org.name}</highlight> ({org_id}) has been removed from the alliance successfully."
 
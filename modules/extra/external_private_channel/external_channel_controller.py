@@ -19,9 +19,9 @@ class ExternalChannelController:
         self.ban_service = registry.get_instance("ban_service")
 
     def start(self):
-        self.bot.register_packet_handler(server_packets.PrivateChannelInvited.id, self.handle_private_channel_invite)
-        self.bot.register_packet_handler(server_packets.PrivateChannelKicked.id, self.handle_private_channel_kick)
-        self.bot.register_packet_handler(server_packets.PrivateChannelMessage.id, self.handle_private_channel_message)
+        self.bot.register_packet_handler(server_packets.PrivateChannelInvited.id, self.handle_private_channel_invite, main_only=True)
+        self.bot.register_packet_handler(server_packets.PrivateChannelKicked.id, self.handle_private_channel_kick, main_only=True)
+        self.bot.register_packet_handler(server_packets.PrivateChannelMessage.id, self.handle_private_channel_message, main_only=True)
 
     def handle_private_channel_invite(self, conn: Conn, packet: server_packets.PrivateChannelInvited):
         if not conn.is_main:
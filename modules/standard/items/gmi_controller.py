@@ -75,7 +75,7 @@ class GMIController:
     def gmi_search_cmd(self, request, _, search):
         search = html.unescape(search)
 
-        items = self.items_controller.sort_items(search, self.items_controller.find_items(search))[0:100]
+        items = self.items_controller.find_items(search)[0:100]
 
         blob = ""
         for item in items:
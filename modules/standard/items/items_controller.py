@@ -1,15 +1,34 @@
 import html
+import re
+import threading
+from collections import OrderedDict
 
 from core.chat_blob import ChatBlob
 from core.command_param_types import Int, Any, NamedParameters
 from core.db import DB
 from core.decorators import instance, command
+from core.logger import Logger
 from core.text import Text
 
 
 @instance()
 class ItemsController:
     PAGE_SIZE = 30
+    SEARCH_CACHE_SIZE = 100
+    # max number of rows in all cached search results, and in a single cached search result. results with more rows
+    # are not cached, so that broad searches such as "e", which match tens of thousands of items, are not kept in memory
+    SEARCH_CACHE_MAX_ROWS = 20000
+    SEARCH_CACHE_MAX_RESULT_ROWS = 2000
+
+    def __init__(self):
+        self.logger = Logger(__name__)
+        self.use_search_index = False
+
+        # aodb only changes on startup, so search results are cached so that paging does not repeat the search.
+        # (search, ql) -> rows, in least recently used order
+        self.search_cache = OrderedDict()
+        self.search_cache_num_rows = 0
+        self.search_cache_lock = threading.Lock()
 
     def inject(self, registry):
         self.db: DB = registry.get_instance("db")
@@ -17,7 +36,8 @@ class ItemsController:
         self.command_alias_service = registry.get_instance("command_alias_service")
 
     def pre_start(self):
-        self.db.load_sql_file(self.module_dir + "/sql/" + "aodb.sql")
+        loaded = self.db.load_sql_file(self.module_dir + "/sql/" + "aodb.sql")
+        self.build_search_index(force_update=loaded)
 
     def start(self):
         self.command_alias_service.add_alias("item", "items")
@@ -46,7 +66,7 @@ class ItemsController:
         return self.format_items_response(ql, search, all_items, offset, page)
 
     def format_items_response(self, ql, search, all_items, offset, page_number):
-        items = self.sort_items(search, all_items)[offset:offset + self.PAGE_SIZE]
+        items = all_items[offset:offset + self.PAGE_SIZE]
         cnt = len(items)
 
         if cnt == 0:
@@ -103,46 +123,99 @@ class ItemsController:
         return msg
 
     def find_items(self, name, ql=None):
-        params = [name]
-        sql = "SELECT * FROM aodb WHERE name LIKE ? "
-        if ql:
-            sql += " AND lowql <= ? AND highql >= ?"
-            params.append(ql)
-            params.append(ql)
+        """
+        returns the items matching every word of the search, ordered by relevance and then by name and QL
+
+        the result may be cached and shared between searches, so it must not be modified
+        """
+
+        key = (name, ql)
+        with self.search_cache_lock:
+            items = self.search_cache.get(key)
+            if items is not None:
+                self.search_cache.move_to_end(key)
+                return items
+
+        items = self.search_items(name, ql)
+
+        if len(items) <= self.SEARCH_CACHE_MAX_RESULT_ROWS:
+            with self.search_cache_lock:
+                if key not in self.search_cache:
+                    self.search_cache[key] = items
+                    self.search_cache_num_rows += len(items)
+                    while len(self.search_cache) > self.SEARCH_CACHE_SIZE or self.search_cache_num_rows > self.SEARCH_CACHE_MAX_ROWS:
+                        _, evicted_items = self.search_cache.popitem(last=False)
+                        self.search_cache_num_rows -= len(evicted_items)
+
+        return items
+
+    def clear_search_cache(self):
+        with self.search_cache_lock:
+            self.search_cache.clear()
+            self.search_cache_num_rows = 0
+
+    def search_items(self, search, ql):
+        # priority 0 is an exact match (case-insensitive), otherwise 1 plus the number of words from the search
+        # that are not a whole word in the item name
+        search_parts = search.lower().split(" ")
+        params = [search.lower()] + [" %s " % part for part in search_parts]
+        priority_sql = "CASE WHEN LOWER(a.name) = ? THEN 0 ELSE 1%s END" % ("".join([" + (INSTR(' ' || LOWER(a.name) || ' ', ?) = 0)"] * len(search_parts)))
 
-        sql += " UNION SELECT * FROM aodb WHERE name <EXTENDED_LIKE=%d> ?" % len(params)
-        params.append(name)
+        sql = "SELECT DISTINCT a.*, %s AS priority FROM aodb a WHERE (a.name LIKE ? OR a.name <EXTENDED_LIKE=%d> ?)" % (priority_sql, len(params) + 1)
+        params.extend([search, search])
+
+        search_index_query = self.get_search_index_query(search)
+        if search_index_query:
+            # the index narrows down the candidates, which are then filtered the same as without the index
+            sql += " AND a.rowid IN (SELECT rowid FROM aodb_search WHERE aodb_search MATCH ?)"
+            params.append(search_index_query)
 
         if ql:
-            sql += " AND lowql <= ? AND highql >= ?"
-            params.append(ql)
-            params.append(ql)
+            sql += " AND a.lowql <= ? AND a.highql >= ?"
+            params.extend([ql, ql])
 
-        sql += " ORDER BY name ASC, highql DESC"
+        sql += " ORDER BY priority ASC, a.name ASC, a.highql DESC"
 
-        return self.db.query(sql, params, extended_like=True)
+        return self.db.query(sql, params, extended_like=True, compact_rows=True)
 
-    def sort_items(self, search, items):
-        search = search.lower()
-        search_parts = search.split(" ")
+    def get_search_index_query(self, search):
+        """returns a full-text query that matches at least every item that search_items() would find, or None if the index cannot be used"""
 
-        # if item name matches search exactly (case-insensitive) then priority = 0
-        # if item name contains every whole word from search (case-insensitive) then priority = 1
-        # +1 priority for each whole word from search that item name does not contain
+        if not self.use_search_index:
+            return None
 
-        for row in items:
-            row.priority = 0
-            row_name = row.name.lower()
-            if row_name != search:
-                row.priority += 1
-                row_parts = row_name.split(" ")
-                for search_part in search_parts:
-                    if search_part not in row_parts:
-                        row.priority += 1
+        # trigrams can only match the parts of a word that are 3 or more characters long and do not contain LIKE wildcards
+        phrases = []
+        for word in search.split(" "):
+            if not word.startswith("-") or word == "-":
+                phrases.extend(["\"%s\"" % part.replace("\"", "\"\"") for part in re.split("[%_]", word) if len(part) >= 3])
 
-        items.sort(key=lambda x: x.priority, reverse=False)
+        return " AND ".join(phrases) or None
 
-        return items
+    def build_search_index(self, force_update=False):
+        """builds a trigram full-text index over item names, which can serve the substring searches of find_items()"""
+
+        self.clear_search_cache()
+
+        if self.db.type != DB.SQLITE:
+            # word-based FULLTEXT indexes in MySQL cannot match parts of words, so MySQL searches without an index
+            self.use_search_index = False
+            return
+
+        if not force_update and self.db.query_single("SELECT 1 FROM sqlite_master WHERE name = 'aodb_search'"):
+            self.use_search_index = True
+            return
+
+        try:
+            with self.db.transaction():
+                self.db.exec("DROP TABLE IF EXISTS aodb_search")
+                self.db.exec("CREATE VIRTUAL TABLE aodb_search USING fts5(name, tokenize = 'trigram')")
+                self.db.exec("INSERT INTO aodb_search (rowid, name) SELECT rowid, name FROM aodb")
+            self.use_search_index = True
+        except Exception as e:
+            # requires sqlite 3.34 or later, compiled with fts5
+            self.logger.warning("Could not build item search index, item searches will not be indexed: %s" % str(e))
+            self.use_search_index = False
 
     def get_by_item_id(self, item_id, ql=None):
         if ql:
@@ -150,6 +223,30 @@ class ItemsController:
         else:
             return self.db.query_single("SELECT * FROM aodb WHERE highid = ? OR lowid = ? ORDER BY highid = ? DESC LIMIT 1", [item_id, item_id, item_id])
 
+    def get_by_item_ids(self, item_ids):
+        """returns a dict of item id to item, with the same item for each id as get_by_item_id()"""
+
+        item_ids = list(set(item_ids))
+        if not item_ids:
+            return {}
+
+        id_params = ", ".join(["?"] * len(item_ids))
+        data = self.db.query("SELECT * FROM aodb WHERE highid IN (%s) OR lowid IN (%s)" % (id_params, id_params), item_ids + item_ids, compact_rows=True)
+
+        by_highid = {}
+        by_lowid = {}
+        for row in data:
+            by_highid.setdefault(row.highid, row)
+            by_lowid.setdefault(row.lowid, row)
+
+        # rows matching the high id are preferred over rows matching the low id
+        items = {}
+        for item_id in item_ids:
+            item = by_highid.get(item_id) or by_lowid.get(item_id)
+            if item:
+                items[item_id] = item
+        return items
+
     def find_by_name(self, name, ql=None):
         if ql:
             return self.db.query_single("SELECT * FROM aodb WHERE name = ? AND lowql <= ? AND highql >= ? ORDER BY highid DESC LIMIT 1", [name, ql, ql])
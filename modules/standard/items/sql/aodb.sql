@@ -33443,3 +33443,4 @@ INSERT INTO aodb VALUES (259759, 259759, 1, 1, 'some device', 203515);
 INSERT INTO aodb VALUES (287894, 287894, 1, 1, 'test spawn nano win', 271896);
 INSERT INTO aodb VALUES (229109, 229109, 1, 1, 'test_environment', 156511);
 CREATE INDEX idx_highid ON aodb(highid);
+CREATE INDEX idx_lowid ON aodb(lowid);
@@ -150,7 +150,7 @@ class OnlineController:
 
     @event(PrivateChannelService.JOINED_PRIVATE_CHANNEL_EVENT, "Record in database when someone joins private channel", is_system=True)
     def private_channel_joined_event(self, event_type, event_data):
-        self.pork_service.load_character_info(event_data.char_id)
+        self.pork_service.prefetch_character_info(event_data.char_id)
         self.db.exec("INSERT INTO online (char_id, afk_dt, afk_reason, channel, dt) VALUES (?, ?, ?, ?, ?)",
                      [event_data.char_id, 0, "", self.PRIVATE_CHANNEL, int(time.time())])
 
@@ -161,7 +161,7 @@ class OnlineController:
 
     @event(OrgMemberController.ORG_MEMBER_LOGON_EVENT, "Record in database when org member logs on", is_system=True)
     def org_member_logon_record_event(self, event_type, event_data):
-        self.pork_service.load_character_info(event_data.char_id)
+        self.pork_service.prefetch_character_info(event_data.char_id)
         self.db.exec("INSERT INTO online (char_id, afk_dt, afk_reason, channel, dt) VALUES (?, ?, ?, ?, ?)",
                      [event_data.char_id, 0, "", self.ORG_CHANNEL, int(time.time())])
 
@@ -242,7 +242,22 @@ class OnlineController:
         return ChatBlob("Online (%d)" % count, blob)
 
     def get_char_info_display(self, char_id, conn: Conn):
-        char_info = self.pork_service.get_character_info(char_id)
+        return self.format_char_info_display(char_id, self.pork_service.get_character_info(char_id), conn)
+
+    def get_char_info_display_async(self, char_id, conn: Conn, callback):
+        """
+        Same as get_char_info_display(), except that the character info is loaded together with any other characters
+        that join or log on at about the same time, and the display is passed to callback once it has been loaded
+
+        Args:
+            char_id: int
+            conn: Conn
+            callback: (str) -> void
+        """
+
+        self.pork_service.prefetch_character_info(char_id, lambda char_info: callback(self.format_char_info_display(char_id, char_info, conn)))
+
+    def format_char_info_display(self, char_id, char_info, conn: Conn):
         if char_info:
             name = self.text.format_char_info(char_info)
         else:
@@ -117,20 +117,23 @@ class OrgChannelController:
     def org_member_logon_event(self, event_type, event_data):
         if self.bot.is_ready():
             if self.online_controller:
-                char_info = self.online_controller.get_char_info_display(event_data.char_id, event_data.conn)
+                # the char info is loaded in a batch with any other org members that log on at about the same time
+                self.online_controller.get_char_info_display_async(event_data.char_id, event_data.conn,
+                                                                   lambda char_info: self.send_org_member_logon_message(char_info, event_data))
             else:
-                char_info = self.character_service.resolve_char_to_name(event_data.char_id, f"Unknown({event_data.char_id})")
+                self.send_org_member_logon_message(self.character_service.resolve_char_to_name(event_data.char_id, f"Unknown({event_data.char_id})"), event_data)
 
-            msg = f"{char_info} has logged on."
-            if self.log_controller:
-                msg += " " + self.log_controller.get_logon(event_data.char_id)
+    def send_org_member_logon_message(self, char_info, event_data):
+        msg = f"{char_info} has logged on."
+        if self.log_controller:
+            msg += " " + self.log_controller.get_logon(event_data.char_id)
 
-            for _id, conn in self.bot.get_conns(lambda x: x.is_main and x.org_id):
-                if event_data.conn == conn:
-                    self.bot.send_org_message(msg, conn=conn)
-                else:
-                    self.bot.send_org_message(self.get_org_abbreviation(event_data.conn) + " " + msg, conn=conn)
-            self.message_hub_service.send_message(self.MESSAGE_SOURCE_UPDATE, None, self.get_org_abbreviation(event_data.conn), msg)
+        for _id, conn in self.bot.get_conns(lambda x: x.is_main and x.org_id):
+            if event_data.conn == conn:
+                self.bot.send_org_message(msg, conn=conn)
+            else:
+                self.bot.send_org_message(self.get_org_abbreviation(event_data.conn) + " " + msg, conn=conn)
+        self.message_hub_service.send_message(self.MESSAGE_SOURCE_UPDATE, None, self.get_org_abbreviation(event_data.conn), msg)
 
     @event(event_type=OrgMemberController.ORG_MEMBER_LOGOFF_EVENT, description="Notify when org member logs off")
     def org_member_logoff_event(self, event_type, event_data):
@@ -377,9 +377,9 @@ class RaidController:
         sql = "UPDATE raid_log SET raid_end = ? WHERE raid_id = ?"
         self.db.exec(sql, [int(time.time()), self.raid.raid_id])
 
-        for raider in self.raid.raiders:
-            sql = "INSERT INTO raid_log_participants (raid_id, raider_id, accumulated_points, left_raid, was_kicked, was_kicked_reason) VALUES (?,?,?,?,?,?)"
-            self.db.exec(sql, [self.raid.raid_id, raider.active_id, raider.accumulated_points, raider.left_raid, raider.was_kicked, raider.was_kicked_reason])
+        sql = "INSERT INTO raid_log_participants (raid_id, raider_id, accumulated_points, left_raid, was_kicked, was_kicked_reason) VALUES (?,?,?,?,?,?)"
+        self.db.exec_many(sql, [[self.raid.raid_id, raider.active_id, raider.accumulated_points, raider.left_raid, raider.was_kicked, raider.was_kicked_reason]
+                                for raider in self.raid.raiders])
 
         self.raid = None
         self.topic_controller.clear_topic()
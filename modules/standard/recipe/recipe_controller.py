@@ -1,6 +1,8 @@
 from core.chat_blob import ChatBlob
+from core.db import DB
 from core.decorators import instance, command
 from core.command_param_types import Any, Int, NamedParameters, Item
+import hashlib
 import os
 import re
 import json
@@ -10,8 +12,13 @@ from core.logger import Logger
 
 @instance()
 class RecipeController:
+    PAGE_SIZE = 30
+    MANIFEST_FILE = "_manifest.json"
+
     def __init__(self):
         self.logger = Logger(__name__)
+        self.recipe_dir = os.path.dirname(os.path.realpath(__file__)) + "/recipes/"
+        self.use_search_index = False
 
         self.recipe_name_regex = re.compile(r"(\d+)\.json")
         self.recipe_item_regex = re.compile(r"#L \"([^\"]+)\" \"([\d+]+)\"")
@@ -27,30 +34,77 @@ class RecipeController:
         self.command_alias_service.add_alias("r", "recipe")
         self.command_alias_service.add_alias("tradeskill", "recipe")
 
-        self.db.exec("CREATE TABLE IF NOT EXISTS recipe (id INT NOT NULL PRIMARY KEY, name VARCHAR(50) NOT NULL, author VARCHAR(50) NOT NULL, recipe TEXT NOT NULL, dt INT NOT NULL DEFAULT 0)")
+        self.db.exec("CREATE TABLE IF NOT EXISTS recipe (id INT NOT NULL PRIMARY KEY, name VARCHAR(50) NOT NULL, author VARCHAR(50) NOT NULL, recipe TEXT NOT NULL, hash VARCHAR(40) NOT NULL)")
+        self.build_search_index()
+        self.update_recipes()
+
+    def update_recipes(self):
+        # recipes are only read when their hash in the manifest has changed
+        manifest = self.read_manifest()
+        hashes = {row.id: row.hash for row in self.db.query("SELECT id, hash FROM recipe")}
+
+        with self.db.transaction():
+            for recipe_id, file_hash in manifest.items():
+                if hashes.get(recipe_id) != file_hash:
+                    self.update_recipe(recipe_id, file_hash)
+
+            for recipe_id in hashes.keys() - manifest.keys():
+                self.db.exec("DELETE FROM recipe WHERE id = ?", [recipe_id])
 
-        recipe_dir = os.path.dirname(os.path.realpath(__file__)) + "/recipes/"
-        recipes = self.db.query("SELECT id, dt FROM recipe")
+            if self.use_search_index:
+                self.db.exec("DELETE FROM recipe_search WHERE rowid NOT IN (SELECT id FROM recipe)")
 
-        for file in os.listdir(recipe_dir):
+    def read_manifest(self):
+        """returns a dict of recipe id to the hash of the recipe file, from the manifest if it exists, or else from the recipe files"""
+
+        try:
+            with open(self.recipe_dir + self.MANIFEST_FILE, mode="r", encoding="UTF-8") as f:
+                return {int(recipe_id): file_hash for recipe_id, file_hash in json.load(f).items()}
+        except FileNotFoundError:
+            self.logger.warning("Recipe manifest '%s' not found, reading all recipe files" % self.MANIFEST_FILE)
+            return self.build_manifest()
+
+    def build_manifest(self):
+        manifest = {}
+        for file in os.listdir(self.recipe_dir):
             if file.startswith("_"):
                 continue
 
             m = self.recipe_name_regex.match(file)
             if m:
-                recipe_id = m.group(1)
-                dt = int(os.path.getmtime(recipe_dir+file))
-
-                recipe = self.find_recipe(recipe_id, recipes)
-                if recipe:
-                    recipes.remove(recipe)
-                    if recipe.dt == dt:
-                        continue
-
-                self.update_recipe(recipe_dir, recipe_id, dt)
+                with open(self.recipe_dir + file, mode="rb") as f:
+                    manifest[int(m.group(1))] = hashlib.sha1(f.read()).hexdigest()
             else:
                 raise Exception("Unknown recipe format for '%s'" % file)
 
+        return manifest
+
+    def write_manifest(self):
+        """must be run after adding or changing recipe files, otherwise the changes will not be loaded"""
+
+        with open(self.recipe_dir + self.MANIFEST_FILE, mode="w", encoding="UTF-8", newline="\n") as f:
+            json.dump({str(recipe_id): file_hash for recipe_id, file_hash in sorted(self.build_manifest().items())}, f, indent=1)
+            f.write("\n")
+
+    def build_search_index(self):
+        """creates a trigram full-text index over recipe names and contents, if it does not exist"""
+
+        if self.db.type != DB.SQLITE:
+            # the recipe table is small enough that MySQL searches without an index
+            self.use_search_index = False
+            return
+
+        try:
+            if not self.db.query_single("SELECT 1 FROM sqlite_master WHERE name = 'recipe_search'"):
+                with self.db.transaction():
+                    self.db.exec("CREATE VIRTUAL TABLE recipe_search USING fts5(name, recipe, tokenize = 'trigram')")
+                    self.db.exec("INSERT INTO recipe_search (rowid, name, recipe) SELECT id, name, recipe FROM recipe")
+            self.use_search_index = True
+        except Exception as e:
+            # requires sqlite 3.34 or later, compiled with fts5
+            self.logger.warning("Could not build recipe search index, recipe searches will not be indexed: %s" % str(e))
+            self.use_search_index = False
+
     @command(command="recipe", params=[Int("recipe_id")], access_level="all", description="Show a recipe")
     def recipe_show_cmd(self, request, recipe_id):
         recipe = self.get_recipe(recipe_id)
@@ -72,29 +126,68 @@ class RecipeController:
         return self.get_search_results(search, page_number)
 
     def get_search_results(self, search, page_number):
-        page_size = 30
-        offset = (page_number - 1) * page_size
+        offset = max(page_number - 1, 0) * self.PAGE_SIZE
 
-        data = self.db.query("SELECT * FROM recipe WHERE recipe <EXTENDED_LIKE=0> ? ORDER BY name ASC", [search], extended_like=True)
-        count = len(data)
-        paged_data = data[offset:offset + page_size]
+        count, data = self.search_recipes(search, offset, self.PAGE_SIZE)
 
         blob = ""
 
-        if len(data) == 0:
+        if count == 0:
             return "No recipe matching <highlight>%s</highlight>." % search
 
-        elif len(data) == 1:
-            return self.format_recipe(data[0])
+        elif count == 1:
+            return self.format_recipe(self.get_recipe(data[0].id))
 
         else:
-            blob += self.text.get_paging_links(f"recipe {search}", page_number, offset + page_size < len(data))
+            blob += self.text.get_paging_links(f"recipe {search}", page_number, offset + self.PAGE_SIZE < count)
             blob += "\n\n"
 
-            for row in paged_data:
+            for row in data:
                 blob += self.text.make_tellcmd(row.name, "recipe %d" % row.id) + "\n"
 
-            return ChatBlob("Recipes Matching '%s' (%d - %d of %d)" % (search, offset + 1, min(offset + page_size, count), count), blob)
+            return ChatBlob("Recipes Matching '%s' (%d - %d of %d)" % (search, offset + 1, min(offset + self.PAGE_SIZE, count), count), blob)
+
+    def search_recipes(self, search, offset, limit):
+        """returns the total number of recipes matching search, and the id and name of the recipes on the requested page"""
+
+        search_index_query = self.get_search_index_query(search)
+        if search_index_query:
+            # ranked by relevance, with matches in the name counting more than matches in the recipe
+            row = self.db.query_single("SELECT COUNT(1) AS count FROM recipe_search WHERE recipe_search MATCH ?", [search_index_query])
+            data = self.db.query("SELECT r.id, r.name FROM recipe_search s JOIN recipe r ON s.rowid = r.id "
+                                 "WHERE recipe_search MATCH ? ORDER BY bm25(recipe_search, 10.0, 1.0), r.name ASC LIMIT ? OFFSET ?",
+                                 [search_index_query, limit, offset])
+        else:
+            row = self.db.query_single("SELECT COUNT(1) AS count FROM recipe WHERE recipe <EXTENDED_LIKE=0> ?", [search], extended_like=True)
+            data = self.db.query("SELECT id, name FROM recipe WHERE recipe <EXTENDED_LIKE=0> ? ORDER BY name ASC LIMIT ? OFFSET ?",
+                                 [search, limit, offset], extended_like=True)
+
+        return row.count, data
+
+    def get_search_index_query(self, search):
+        """returns the full-text query for search, or None if the index cannot be used for search"""
+
+        if not self.use_search_index:
+            return None
+
+        # trigrams can only match words that are 3 or more characters long, and the query must have at least one word to match
+        phrases = []
+        excluded_phrases = []
+        for word in search.split(" "):
+            if word.startswith("-") and word != "-":
+                word = word[1:]
+                phrase_list = excluded_phrases
+            else:
+                phrase_list = phrases
+
+            if len(word) < 3 or "%" in word or "_" in word:
+                return None
+            phrase_list.append("\"%s\"" % word.replace("\"", "\"\""))
+
+        if not phrases:
+            return None
+
+        return " AND ".join(phrases) + "".join([" NOT " + phrase for phrase in excluded_phrases])
 
     def get_recipe(self, recipe_id):
         return self.db.query_single("SELECT * FROM recipe WHERE id = ?", [recipe_id])
@@ -108,28 +201,27 @@ class RecipeController:
 
     def format_recipe_text(self, recipe_text):
         recipe_text = recipe_text.replace("\\n", "\n")
-        recipe_text = self.recipe_item_regex.sub(self.lookup_item, recipe_text)
+
+        # all items are looked up at once, instead of once for each item reference
+        item_ids = [int(item_id) for _, item_id in self.recipe_item_regex.findall(recipe_text) if item_id.isdigit()]
+        items = self.items_controller.get_by_item_ids(item_ids) if item_ids else {}
+
+        recipe_text = self.recipe_item_regex.sub(lambda m: self.format_item_link(m, items), recipe_text)
         recipe_text = self.recipe_link_regex.sub("<a href='chatcmd://\\2'>\\1</a>", recipe_text)
         return recipe_text
 
-    def lookup_item(self, m):
+    def format_item_link(self, m, items):
         name = m.group(1)
         item_id = m.group(2)
 
-        item = self.items_controller.get_by_item_id(item_id)
+        item = items.get(int(item_id)) if item_id.isdigit() else None
         if item:
             return self.text.make_item(item.lowid, item.highid, item.highql, item.name)
         else:
             return name
 
-    def find_recipe(self,recipe_id,recipes):
-        for row in recipes:
-            if str(row.id) == recipe_id:
-                return row
-        return None
-
-    def update_recipe(self, recipe_dir, recipe_id, dt):
-        with open(recipe_dir + recipe_id + ".json", mode="r", encoding="UTF-8") as f:
+    def update_recipe(self, recipe_id, file_hash):
+        with open(self.recipe_dir + str(recipe_id) + ".json", mode="r", encoding="UTF-8") as f:
             recipe = json.load(f)
 
         name = recipe["name"]
@@ -140,7 +232,11 @@ class RecipeController:
         else:
             content = self.format_json_recipe(recipe_id, recipe)
 
-        self.db.exec("REPLACE INTO recipe (id, name, author, recipe, dt) VALUES (?, ?, ?, ?, ?)", [recipe_id, name, author, content, dt])
+        self.db.exec("REPLACE INTO recipe (id, name, author, recipe, hash) VALUES (?, ?, ?, ?, ?)", [recipe_id, name, author, content, file_hash])
+
+        if self.use_search_index:
+            self.db.exec("DELETE FROM recipe_search WHERE rowid = ?", [recipe_id])
+            self.db.exec("INSERT INTO recipe_search (rowid, name, recipe) VALUES (?, ?, ?)", [recipe_id, name, content])
 
     def format_json_recipe(self, recipe_id, recipe):
         items = {}
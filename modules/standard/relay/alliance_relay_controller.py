@@ -60,8 +60,8 @@ class AllianceRelayController:
                                                               ["org_channel", "org_channel_update", "private_channel", "private_channel_update", "discord"],
                                                               [self.MESSAGE_SOURCE])
 
-        self.bot.register_packet_handler(server_packets.PrivateChannelInvited.id, self.handle_private_channel_invite, 100)
-        self.bot.register_packet_handler(server_packets.PrivateChannelMessage.id, self.handle_private_channel_message)
+        self.bot.register_packet_handler(server_packets.PrivateChannelInvited.id, self.handle_private_channel_invite, 100, main_only=True)
+        self.bot.register_packet_handler(server_packets.PrivateChannelMessage.id, self.handle_private_channel_message, main_only=True)
 
     def handle_private_channel_invite(self, conn: Conn, packet: server_packets.PrivateChannelInvited):
         if not conn.is_main:
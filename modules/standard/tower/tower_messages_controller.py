@@ -48,7 +48,7 @@ class TowerMessagesController:
 
         self.event_service.register_event_type(self.TOWER_ATTACK_EVENT)
         self.event_service.register_event_type(self.TOWER_VICTORY_EVENT)
-        self.bot.register_packet_handler(server_packets.PublicChannelMessage.id, self.handle_public_channel_message)
+        self.bot.register_packet_handler(server_packets.PublicChannelMessage.id, self.handle_public_channel_message, main_only=True)
 
     def start(self):
         self.db.exec("CREATE TABLE IF NOT EXISTS tower_attacker (id INT PRIMARY KEY AUTO_INCREMENT, att_org_name VARCHAR(50) NOT NULL, att_faction VARCHAR(10) NOT NULL, "
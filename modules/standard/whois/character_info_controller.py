@@ -124,13 +124,11 @@ class CharacterInfoController:
         if not self.name_history:
             return
 
-        with self.db.transaction():
-            t = int(time.time())
-            for entry in self.name_history:
-                sql = "INSERT IGNORE INTO name_history (char_id, name, created_at) VALUES (?, ?, ?)"
-                self.db.exec(sql, [entry.char_id, entry.name, t])
+        t = int(time.time())
+        self.db.exec_many("INSERT IGNORE INTO name_history (char_id, name, created_at) VALUES (?, ?, ?)",
+                          [[entry.char_id, entry.name, t] for entry in self.name_history])
 
-            self.name_history = []
+        self.name_history = []
 
     def get_full_name(self, char_info):
         name = ""
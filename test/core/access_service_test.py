@@ -0,0 +1,44 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+
+from core.access_service import AccessService
+from core.dict_object import DictObject
+
+
+class AccessServiceTest(unittest.TestCase):
+
+    def test_get_access_level_uses_main(self):
+        access_service = self.create_access_service()
+
+        self.assertEqual("admin", access_service.get_access_level(2)["label"])
+        self.assertEqual(1, access_service.get_main_char_id(2))
+        self.assertEqual(3, access_service.get_main_char_id(3))
+
+    def test_access_level_cache(self):
+        access_service = self.create_access_service()
+
+        access_service.get_access_level(2)
+        access_service.get_access_level(2)
+        access_service.check_access(2, "admin")
+        self.assertEqual(1, access_service.alts_service.get_alts.call_count)
+        self.assertEqual(2, access_service.get_access_level_cache_stats().hits)
+        self.assertEqual(1, access_service.get_access_level_cache_stats().misses)
+
+        access_service.clear_access_level_cache()
+        access_service.get_access_level(2)
+        self.assertEqual(2, access_service.alts_service.get_alts.call_count)
+        self.assertEqual(1, access_service.get_access_level_cache_stats().size)
+
+    def create_access_service(self):
+        access_service = AccessService()
+        access_service.register_access_level("admin", 20, lambda char_id: char_id == 1)
+
+        def get_alts(char_id):
+            if char_id in [1, 2]:
+                return [DictObject({"char_id": 1}), DictObject({"char_id": 2})]
+            else:
+                return []
+
+        access_service.alts_service = Mock()
+        access_service.alts_service.get_alts = MagicMock(side_effect=get_alts)
+        return access_service
@@ -1,3 +1,4 @@
+import time
 import unittest
 
 from core.aochat.delay_queue import DelayQueue
@@ -39,3 +40,46 @@ class DelayQueueTest(unittest.TestCase):
         self.assertEqual("C", delay_queue.dequeue())
         self.assertEqual("A", delay_queue.dequeue())
         self.assertEqual("B", delay_queue.dequeue())
+
+    def test_burst_and_recovery(self):
+        # burst of 2 allows 3 items to be dequeued immediately, and then 1 item per recovery period
+        delay_queue = DelayQueue(0.1, 2)
+        for item in "ABCDE":
+            delay_queue.enqueue(item)
+
+        self.assertEqual(["A", "B", "C", None], [delay_queue.dequeue() for _ in range(4)])
+        self.assertAlmostEqual(0.1, delay_queue.get_delay(), delta=0.02)
+
+        time.sleep(0.11)
+        self.assertEqual(["D", None], [delay_queue.dequeue() for _ in range(2)])
+
+        time.sleep(0.11)
+        self.assertEqual("E", delay_queue.dequeue())
+        self.assertIsNone(delay_queue.get_delay())
+
+    def test_overflow_drops_lowest_priority(self):
+        delay_queue = DelayQueue(1, 100, max_size=3)
+
+        self.assertTrue(delay_queue.enqueue("A", 5))
+        self.assertTrue(delay_queue.enqueue("B", 50))
+        self.assertTrue(delay_queue.enqueue("C", 50))
+
+        # the newest of the lowest priority items is dropped for a higher priority item
+        self.assertTrue(delay_queue.enqueue("D", 1))
+        # items with the same or lower priority than the lowest priority item are dropped
+        self.assertFalse(delay_queue.enqueue("E", 50))
+
+        self.assertEqual(["D", "A", "B", None], [delay_queue.dequeue() for _ in range(4)])
+
+        stats = delay_queue.get_stats()
+        self.assertEqual(0, stats.size)
+        self.assertEqual(3, stats.sent)
+        self.assertEqual(2, stats.dropped)
+
+    def test_many_items(self):
+        delay_queue = DelayQueue(0, 0)
+        for i in range(100000):
+            delay_queue.enqueue(i, i % 3)
+
+        items = [delay_queue.dequeue() for _ in range(100000)]
+        self.assertEqual(list(range(0, 100000, 3)) + list(range(1, 100000, 3)) + list(range(2, 100000, 3)), items)
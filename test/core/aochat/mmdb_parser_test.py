@@ -36,6 +36,19 @@ class MMDBParserTest(unittest.TestCase):
         params = mmdb_parser.parse_params(b'R!!!8S!!!!#s\x09TestOrg1s\x09TestCharR!!!8S!!!!"s\x09TestOrg2s\x05Testi!!!Dui!!!Eu')
         self.assertEqual(['omni', 'TestOrg1', 'TestChar', 'clan', 'TestOrg2', 'Test', 3059, 3144], params)
 
+    def test_get_message_string(self):
+        mmdb_parser = MMDBParser("./text.mdb")
+
+        self.assertEqual("omni", mmdb_parser.get_message_string(2005, 2))
+        self.assertEqual("the message is too big to fit in the inbox", mmdb_parser.get_message_string(20000, 265276023))
+        self.assertIsNone(mmdb_parser.get_message_string(20000, 1))
+        self.assertIsNone(mmdb_parser.get_message_string(1, 1))
+
+        # message strings are indexed once, and decoded message strings are cached
+        self.assertEqual(6706, len(mmdb_parser.index))
+        mmdb_parser.get_message_string(2005, 2)
+        self.assertEqual(1, mmdb_parser.get_cached_message_string.cache_info().hits)
+
     def test_write_param(self):
         mmdb_parser = MMDBParser("./text.mdb")
 
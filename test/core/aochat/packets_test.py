@@ -0,0 +1,67 @@
+import random
+import struct
+import unittest
+
+from core.aochat import client_packets, server_packets
+from core.aochat.packets import decode_args, encode_args, PacketMissingArgument
+
+
+class PacketsTest(unittest.TestCase):
+    def test_decode_args(self):
+        data = b"\x00\x00\x00\x01" + b"\x00\x04Test" + b"\x00\x02\x00\x00\x00\x02\x00\x00\x00\x03" + b"\x00\x01\x00\x03abc" + b"\x01\x00\x00\x00\x04"
+        self.assertEqual([1, "Test", (2, 3), ["abc"], 4294967300], decode_args("ISisG", data))
+
+    def test_encode_args(self):
+        args = [1, "Test"]
+        self.assertEqual(b"\x00\x00\x00\x01\x00\x04Test", encode_args("IS", args))
+
+        # args are not consumed
+        self.assertEqual([1, "Test"], args)
+
+        with self.assertRaises(PacketMissingArgument):
+            encode_args("ISI", args)
+
+    def test_round_trip_fuzz(self):
+        rand = random.Random(1)
+        for packet_types, get_instance in [(server_packets.ServerPacket.packet_types, server_packets.ServerPacket.get_instance),
+                                           (client_packets.ClientPacket.packet_types, client_packets.ClientPacket.get_instance)]:
+            for packet_id, packet_type in packet_types.items():
+                for _ in range(50):
+                    args = [self.random_arg(rand, argtype) for argtype in packet_type.types]
+                    data = packet_type(*args).to_bytes()
+
+                    packet = get_instance(packet_id, data)
+                    self.assertIsInstance(packet, packet_type)
+                    self.assertEqual(args, packet.args)
+                    self.assertEqual(data, packet.to_bytes())
+
+    def test_decode_random_data(self):
+        rand = random.Random(2)
+        for packet_id in server_packets.ServerPacket.packet_types.keys():
+            for _ in range(50):
+                data = bytes(rand.randrange(256) for _ in range(rand.randrange(20)))
+                try:
+                    server_packets.ServerPacket.get_instance(packet_id, data)
+                except (struct.error, UnicodeDecodeError):
+                    pass
+
+        self.assertIsNone(server_packets.ServerPacket.get_instance(1000, b""))
+
+    def random_arg(self, rand, argtype):
+        if argtype == "I":
+            return rand.randrange(2 ** 32)
+        elif argtype == "S":
+            return self.random_string(rand)
+        elif argtype == "B":
+            return bytes(rand.randrange(256) for _ in range(rand.randrange(100)))
+        elif argtype == "G":
+            return rand.randrange(2 ** 40)
+        elif argtype == "i":
+            return tuple(rand.randrange(2 ** 32) for _ in range(rand.randrange(20)))
+        elif argtype == "s":
+            return [self.random_string(rand) for _ in range(rand.randrange(20))]
+        else:
+            raise Exception("Unknown arg type '%s'" % argtype)
+
+    def random_string(self, rand):
+        return "".join(chr(rand.choice([rand.randrange(32, 127), rand.randrange(0xa0, 0xd800)])) for _ in range(rand.randrange(200)))
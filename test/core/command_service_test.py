@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import Mock, MagicMock
+
+from core.command_param_types import Const, Any, Options, Int
+from core.command_service import CommandService
+from core.dict_object import DictObject
+
+
+class CommandServiceTest(unittest.TestCase):
+
+    def test_get_literal_prefix(self):
+        command_service = CommandService()
+
+        self.assertEqual("add", command_service.get_literal_prefix([Const("add"), Any("name")]))
+        self.assertEqual(("enable", "disable"), command_service.get_literal_prefix([Options(["Enable", "disable"])]))
+        self.assertIsNone(command_service.get_literal_prefix([]))
+        self.assertIsNone(command_service.get_literal_prefix([Const("add", is_optional=True)]))
+        self.assertIsNone(command_service.get_literal_prefix([Int("num")]))
+
+    def test_get_matches(self):
+        command_service = self.create_command_service()
+
+        def handler_add(request, _, name):
+            pass
+
+        def handler_rem(request, _, name):
+            pass
+
+        def handler_any(request, name):
+            pass
+
+        command_service.register(handler_add, "test", [Const("add"), Any("name")], "all", "Add", "core")
+        command_service.register(handler_rem, "test", [Options(["rem", "remove"]), Any("name")], "all", "Remove", "core")
+        command_service.register(handler_any, "test", [Any("name")], "all", "Any", "core")
+
+        cmd_configs = [DictObject({"command": "test", "sub_command": ""})]
+
+        _, matches, handler = command_service.get_matches(cmd_configs, " ADD Tyrbot")
+        self.assertEqual(handler_add, handler["callback"])
+
+        _, matches, handler = command_service.get_matches(cmd_configs, " remove Tyrbot")
+        self.assertEqual(handler_rem, handler["callback"])
+
+        _, matches, handler = command_service.get_matches(cmd_configs, " addition")
+        self.assertEqual(handler_any, handler["callback"])
+        self.assertEqual(" addition", matches.group(1))
+
+    def test_get_enabled_command_configs(self):
+        command_service = self.create_command_service()
+        command_service.db.query = MagicMock(return_value=[
+            DictObject({"command": "test", "sub_command": "", "access_level": "all", "channel": "msg", "enabled": 1}),
+            DictObject({"command": "test", "sub_command": "sub", "access_level": "all", "channel": "msg", "enabled": 1}),
+            DictObject({"command": "test", "sub_command": "", "access_level": "all", "channel": "priv", "enabled": 1})])
+
+        self.assertEqual(2, len(command_service.get_enabled_command_configs("test", "msg")))
+        self.assertEqual(1, len(command_service.get_enabled_command_configs("test", "priv")))
+        self.assertEqual([], command_service.get_enabled_command_configs("test", "org"))
+        self.assertEqual(1, command_service.db.query.call_count)
+
+        command_service.clear_command_config_cache()
+        command_service.get_enabled_command_configs("test", "msg")
+        self.assertEqual(2, command_service.db.query.call_count)
+
+    def create_command_service(self):
+        command_service = CommandService()
+        command_service.db = Mock()
+        command_service.db.query_single = MagicMock(return_value=None)
+        command_service.access_service = Mock()
+        command_service.access_service.get_access_level_by_label = MagicMock(return_value={"label": "all", "level": 100})
+        return command_service
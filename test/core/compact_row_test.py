@@ -0,0 +1,54 @@
+import copy
+import pickle
+import unittest
+
+from core.compact_row import get_row_class
+from core.dict_object import DictObject
+
+
+class CompactRowTest(unittest.TestCase):
+
+    def test_access(self):
+        row = get_row_class(["name", "count", "level"])(("tyrbot", 3, None))
+
+        self.assertEqual("tyrbot", row.name)
+        self.assertEqual(3, row.count)
+        self.assertIsNone(row.level)
+        self.assertEqual("tyrbot", row["name"])
+        self.assertEqual(3, row[1])
+        self.assertEqual(3, row.get("count"))
+        self.assertEqual("default", row.get("missing", "default"))
+
+        with self.assertRaises(AttributeError):
+            _ = row.missing
+
+        with self.assertRaises(KeyError):
+            _ = row["missing"]
+
+        with self.assertRaises(AttributeError):
+            row.name = "budabot"
+
+    def test_dict_compatibility(self):
+        d = {"name": "tyrbot", "count": 3}
+        row = get_row_class(d.keys())(d.values())
+
+        self.assertEqual(d, row)
+        self.assertEqual(DictObject(d), row)
+        self.assertEqual(d, row.to_dict())
+        self.assertEqual(list(d.keys()), list(row))
+        self.assertEqual(list(d.keys()), list(row.keys()))
+        self.assertEqual(list(d.values()), row.values())
+        self.assertEqual(list(d.items()), row.items())
+        self.assertIn("name", row)
+        self.assertNotIn("tyrbot", row)
+        self.assertEqual(2, len(row))
+        self.assertEqual(repr(d), repr(row))
+
+    def test_shared_class(self):
+        cls = get_row_class(["a", "b"])
+        self.assertIs(cls, get_row_class(("a", "b")))
+        self.assertIsNot(cls, get_row_class(["b", "a"]))
+
+        row = cls((1, 2))
+        self.assertEqual(row, copy.copy(row))
+        self.assertEqual(row, pickle.loads(pickle.dumps(row)))
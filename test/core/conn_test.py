@@ -0,0 +1,116 @@
+import asyncio
+import struct
+import time
+import unittest
+from queue import Queue
+
+from core.aochat import client_packets, server_packets
+from core.aochat.delay_queue import DelayQueue
+from core.async_service import AsyncService
+from core.bot_status import BotStatus
+from core.conn import Conn
+
+
+class ConnTest(unittest.TestCase):
+
+    def setUp(self):
+        self.async_service = AsyncService()
+        self.async_service.start_loop()
+        self.bot_status = BotStatus.RUN
+        self.received = Queue()
+        self.server_writers = []
+
+        async def handle_client(reader, writer):
+            self.server_writers.append(writer)
+            try:
+                while True:
+                    packet_type, packet_length = struct.unpack(">2H", await reader.readexactly(4))
+                    data = await reader.readexactly(packet_length)
+                    self.received.put((time.time(), client_packets.ClientPacket.get_instance(packet_type, data)))
+            except asyncio.IncompleteReadError:
+                pass
+
+        async def start_server():
+            return await asyncio.start_server(handle_client, "127.0.0.1", 0)
+
+        self.server = self.async_service.run_until_complete(start_server(), timeout=5)
+        port = self.server.sockets[0].getsockname()[1]
+
+        self.incoming_queue = Queue()
+        self.conn = Conn("test_conn", None, self.async_service)
+        self.conn.connect("127.0.0.1", port)
+        self.conn.start_packet_loop(self.incoming_queue, None, lambda: self.bot_status)
+
+    def tearDown(self):
+        self.bot_status = BotStatus.SHUTDOWN
+        self.conn.disconnect()
+
+        async def stop_server():
+            for writer in self.server_writers:
+                writer.close()
+            self.server.close()
+            await self.server.wait_closed()
+
+        self.async_service.run_until_complete(stop_server(), timeout=5)
+        self.async_service.stop_loop()
+
+    def test_send_packets(self):
+        packets = [client_packets.PrivateMessage(i, "message %d" % i, "\0") for i in range(3)]
+
+        t = time.time()
+        self.conn.add_packets_to_queue(packets)
+
+        for i in range(3):
+            received_time, packet = self.received.get(timeout=5)
+            self.assertEqual(i, packet.char_id)
+            self.assertLess(received_time - t, 0.5)
+
+    def test_send_packets_rate_limited(self):
+        self.conn.packet_queue = DelayQueue(0.2, 0)
+
+        t = time.time()
+        self.conn.add_packets_to_queue([client_packets.PrivateMessage(i, "message %d" % i, "\0") for i in range(3)])
+
+        received_times = [self.received.get(timeout=5)[0] - t for _ in range(3)]
+
+        # the writer sleeps until the next packet can be sent, instead of polling
+        self.assertLess(received_times[0], 0.1)
+        self.assertAlmostEqual(0.2, received_times[1], delta=0.1)
+        self.assertAlmostEqual(0.4, received_times[2], delta=0.1)
+
+    def test_send_packets_queue_full(self):
+        self.conn.packet_queue = DelayQueue(10, 0, max_size=2)
+        # nothing is sent during the test
+        self.conn.packet_queue.tokens = 0
+
+        mass_messages = [client_packets.PrivateMessage(i, "mass message %d" % i, "\0") for i in range(3)]
+        self.assertEqual(2, self.conn.add_packets_to_queue(mass_messages[:2], Conn.PRIORITY_MASS_MESSAGE))
+        self.assertEqual(0, self.conn.add_packets_to_queue(mass_messages[2:], Conn.PRIORITY_MASS_MESSAGE))
+
+        # replies to commands replace the queued mass messages
+        replies = [client_packets.PrivateMessage(i, "reply %d" % i, "\0") for i in range(2)]
+        self.assertEqual(2, self.conn.add_packets_to_queue(replies, Conn.PRIORITY_PRIVATE_MESSAGE))
+        self.assertEqual([Conn.PRIORITY_PRIVATE_MESSAGE], self.conn.packet_queue.priorities)
+        self.assertEqual(3, self.conn.packet_queue.num_dropped)
+
+    def test_read_packets(self):
+        packet = server_packets.PrivateMessage(1, "test message", "\0")
+        data = packet.to_bytes()
+        self.server_writers[0].write(struct.pack(">2H", packet.id, len(data)) + data)
+
+        conn, received_packet = self.incoming_queue.get(timeout=5)
+        self.assertEqual(self.conn, conn)
+        self.assertEqual("test message", received_packet.message)
+
+    def test_read_packets_filtered(self):
+        self.conn.packet_filter = frozenset([server_packets.PrivateMessage.id])
+
+        for packet in [server_packets.PublicChannelMessage(1, 2, "filtered message", "\0"), server_packets.PrivateMessage(1, "test message", "\0")]:
+            data = packet.to_bytes()
+            self.server_writers[0].write(struct.pack(">2H", packet.id, len(data)) + data)
+
+        conn, received_packet = self.incoming_queue.get(timeout=5)
+        self.assertEqual("test message", received_packet.message)
+        self.assertTrue(self.incoming_queue.empty())
+        self.assertEqual(1, self.conn.num_filtered_packets)
+        self.assertEqual(4 + len(server_packets.PublicChannelMessage(1, 2, "filtered message", "\0").to_bytes()), self.conn.num_filtered_bytes)
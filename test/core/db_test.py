@@ -1,4 +1,5 @@
-from core.db import DB
+from core.db import DB, SqlException
+from concurrent.futures import ThreadPoolExecutor
 import unittest
 import os
 
@@ -44,12 +45,12 @@ class DbTest(unittest.TestCase):
         db.connect_sqlite(self.DB_FILE)
         db.exec("CREATE TABLE test1 (name VARCHAR, value VARCHAR)")
         db.exec("INSERT INTO test1 (name, value) VALUES (?, ?)", ["tyrbot", "1"])
-        db.get_connection().close()
+        db.close()
 
         db.connect_sqlite(self.DB_FILE)
         self.assertEqual([{'name': 'tyrbot', 'value': '1'}], db.query("SELECT * FROM test1"))
 
-        db.get_connection().close()
+        db.close()
         self.delete_db_file()
 
     def test_sqlite_transaction_commit(self):
@@ -63,12 +64,12 @@ class DbTest(unittest.TestCase):
         db.begin_transaction()
         db.exec("INSERT INTO test1 (name, value) VALUES (?, ?)", ["tyrbot", "1"])
         db.commit_transaction()
-        db.get_connection().close()
+        db.close()
 
         db.connect_sqlite(self.DB_FILE)
         self.assertEqual([{'name': 'tyrbot', 'value': '1'}], db.query("SELECT * FROM test1"))
 
-        db.get_connection().close()
+        db.close()
         self.delete_db_file()
 
     def test_sqlite_transaction_commit_using_with(self):
@@ -82,12 +83,12 @@ class DbTest(unittest.TestCase):
         with db.transaction():
             db.exec("INSERT INTO test1 (name, value) VALUES (?, ?)", ["tyrbot", "1"])
 
-        db.get_connection().close()
+        db.close()
 
         db.connect_sqlite(self.DB_FILE)
         self.assertEqual([{'name': 'tyrbot', 'value': '1'}], db.query("SELECT * FROM test1"))
 
-        db.get_connection().close()
+        db.close()
         self.delete_db_file()
 
     def test_sqlite_transaction_rollback(self):
@@ -101,12 +102,12 @@ class DbTest(unittest.TestCase):
         db.begin_transaction()
         db.exec("INSERT INTO test1 (name, value) VALUES (?, ?)", ["tyrbot", "1"])
         db.rollback_transaction()
-        db.get_connection().close()
+        db.close()
 
         db.connect_sqlite(self.DB_FILE)
         self.assertEqual([], db.query("SELECT * FROM test1"))
 
-        db.get_connection().close()
+        db.close()
         self.delete_db_file()
 
     def test_sqlite_transaction_rollback_using_with(self):
@@ -124,12 +125,174 @@ class DbTest(unittest.TestCase):
         except Exception:
             pass
 
-        db.get_connection().close()
+        db.close()
 
         db.connect_sqlite(self.DB_FILE)
         self.assertEqual([], db.query("SELECT * FROM test1"))
 
-        db.get_connection().close()
+        db.close()
+        self.delete_db_file()
+
+    def test_sqlite_transaction_commit_failed(self):
+        self.delete_db_file()
+
+        db = DB()
+        db.connect_sqlite(self.DB_FILE, pool_size=1)
+
+        db.exec("CREATE TABLE parent (id INT PRIMARY KEY)")
+        db.exec("CREATE TABLE child (parent_id INT REFERENCES parent(id) DEFERRABLE INITIALLY DEFERRED)")
+        db.exec("PRAGMA foreign_keys = ON")
+
+        # the deferred foreign key is only checked when committing, so COMMIT fails and leaves the transaction open
+        with self.assertRaises(SqlException):
+            with db.transaction():
+                db.exec("INSERT INTO child (parent_id) VALUES (?)", [1])
+
+        self.assertEqual(0, db.thread_state.transaction_level)
+        self.assertIsNone(db.thread_state.conn)
+
+        # the connection was rolled back before it was returned to the pool, and later transactions still work
+        with db.transaction():
+            db.exec("INSERT INTO parent (id) VALUES (?)", [1])
+            db.exec("INSERT INTO child (parent_id) VALUES (?)", [1])
+
+        db.close()
+
+        db.connect_sqlite(self.DB_FILE)
+        self.assertEqual([{"parent_id": 1}], db.query("SELECT * FROM child"))
+
+        db.close()
+        self.delete_db_file()
+
+    def test_exec_many(self):
+        db = DB()
+        db.connect_sqlite(":memory:")
+        db.MAX_BATCH_SIZE = 3
+        db.exec("CREATE TABLE test1 (name VARCHAR, value INT)")
+
+        self.assertEqual(0, db.exec_many("INSERT INTO test1 (name, value) VALUES (?, ?)", []))
+        self.assertEqual(10, db.exec_many("INSERT INTO test1 (name, value) VALUES (?, ?)", [["tyrbot", i] for i in range(10)]))
+        self.assertEqual(list(range(10)), [row.value for row in db.query("SELECT value FROM test1 ORDER BY value")])
+
+        db.close()
+
+    def test_upsert_many(self):
+        db = DB()
+        db.connect_sqlite(":memory:")
+        db.exec("CREATE TABLE test1 (id INT PRIMARY KEY, name VARCHAR, value INT)")
+        db.exec("INSERT INTO test1 (id, name, value) VALUES (?, ?, ?)", [1, "tyrbot", 1])
+
+        db.upsert_many("test1", ["id"], [{"id": 1, "name": "budabot", "value": 2}, {"id": 2, "name": "tyrbot", "value": 3}])
+        self.assertEqual([{"id": 1, "name": "budabot", "value": 2}, {"id": 2, "name": "tyrbot", "value": 3}], db.query("SELECT * FROM test1 ORDER BY id"))
+
+        # no columns to update
+        db.exec("CREATE TABLE test2 (id INT PRIMARY KEY)")
+        db.upsert_many("test2", ["id"], [{"id": 1}, {"id": 1}])
+        self.assertEqual([{"id": 1}], db.query("SELECT * FROM test2"))
+
+        db.close()
+
+    def test_query_compact_rows(self):
+        db = DB()
+        db.connect_sqlite(":memory:")
+        db.exec("CREATE TABLE test1 (id INT PRIMARY KEY, name VARCHAR, value INT)")
+        db.exec_many("INSERT INTO test1 (id, name, value) VALUES (?, ?, ?)", [[1, "tyrbot", 10], [2, "budabot", 20]])
+
+        rows = db.query("SELECT * FROM test1 ORDER BY id", compact_rows=True)
+        self.assertEqual(db.query("SELECT * FROM test1 ORDER BY id"), rows)
+        self.assertEqual("budabot", rows[1].name)
+        self.assertEqual(20, rows[1]["value"])
+        self.assertIs(type(rows[0]), type(rows[1]))
+
+        row = db.query_single("SELECT name FROM test1 WHERE id = ?", [1], compact_rows=True)
+        self.assertEqual({"name": "tyrbot"}, row)
+        self.assertIsNone(db.query_single("SELECT name FROM test1 WHERE id = ?", [3], compact_rows=True))
+
+        db.close()
+
+    def test_load_sql_file(self):
+        sql_file = "./test.sql"
+        with open(sql_file, "w") as f:
+            f.write("DROP TABLE IF EXISTS test1;\n"
+                    "CREATE TABLE test1 (id INT NOT NULL PRIMARY KEY, name VARCHAR(50));\n"
+                    "-- comment\n"
+                    "\n"
+                    "INSERT INTO test1 VALUES (1, 'one');\n"
+                    "INSERT INTO test1 VALUES (2, 'it''s (two)');\n"
+                    "INSERT INTO test1 (id, name) VALUES (3, 'three');\n"
+                    "INSERT INTO test1 VALUES (4, NULL)\n"
+                    "DROP TABLE IF EXISTS test2;\n"
+                    "CREATE TABLE test2 (id INT NOT NULL);\n"
+                    + "".join("INSERT INTO test2 VALUES (%d);\n" % i for i in range(10)) +
+                    "INSERT INTO test1 VALUES (5, 'five');\n")
+
+        db = DB()
+        db.connect_sqlite(":memory:")
+        db.MAX_SQL_FILE_BATCH_SIZE = 3
+        try:
+            db.load_sql_file(sql_file)
+            self.assertEqual([{"id": 1, "name": "one"}, {"id": 2, "name": "it's (two)"}, {"id": 3, "name": "three"}, {"id": 4, "name": None}, {"id": 5, "name": "five"}],
+                             db.query("SELECT * FROM test1 ORDER BY id"))
+            self.assertEqual(list(range(10)), [row.id for row in db.query("SELECT id FROM test2 ORDER BY id")])
+
+            # unchanged files are not reloaded, even if the mtime changes
+            db.exec("INSERT INTO test2 VALUES (10)")
+            os.utime(sql_file, (0, 0))
+            db.load_sql_file(sql_file)
+            self.assertEqual(11, db.query_single("SELECT COUNT(1) AS count FROM test2").count)
+
+            with open(sql_file, "a") as f:
+                f.write("INSERT INTO test1 VALUES (6, 'six');\n")
+            db.load_sql_file(sql_file)
+            self.assertEqual(10, db.query_single("SELECT COUNT(1) AS count FROM test2").count)
+            self.assertEqual(6, db.query_single("SELECT COUNT(1) AS count FROM test1").count)
+        finally:
+            db.close()
+            os.remove(sql_file)
+
+    def test_sqlite_concurrent_transactions(self):
+        self.delete_db_file()
+
+        db = DB()
+        db.connect_sqlite(self.DB_FILE, pool_size=4)
+        db.exec("CREATE TABLE test1 (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR, value INT)")
+        db.exec("CREATE TABLE counter (value INT)")
+        db.exec("INSERT INTO counter (value) VALUES (0)")
+
+        def run(thread_num):
+            for i in range(20):
+                try:
+                    with db.transaction():
+                        db.exec("INSERT INTO test1 (name, value) VALUES (?, ?)", ["thread%d" % thread_num, i])
+                        row_id = db.last_insert_id()
+
+                        # nested transactions and last insert ids are per thread
+                        with db.transaction():
+                            value = db.query_single("SELECT value FROM counter").value
+                            db.exec("UPDATE counter SET value = ?", [value + 1])
+
+                        self.assertEqual(["thread%d" % thread_num, i], list(db.query_single("SELECT name, value FROM test1 WHERE id = ?", [row_id]).values()))
+
+                        if i % 5 == 0:
+                            raise Exception("Testing")
+                except Exception as e:
+                    if str(e) != "Testing":
+                        raise
+
+                # queries outside of transactions use any connection from the pool
+                db.query("SELECT * FROM test1 WHERE name = ?", ["thread%d" % thread_num])
+
+        with ThreadPoolExecutor(16) as executor:
+            for future in [executor.submit(run, thread_num) for thread_num in range(16)]:
+                future.result()
+
+        # transactions that raised were rolled back, and none of the increments were lost
+        self.assertEqual(16 * 16, db.query_single("SELECT COUNT(1) AS count FROM test1").count)
+        self.assertEqual(16 * 16, db.query_single("SELECT value FROM counter").value)
+        self.assertFalse(db.query("SELECT * FROM test1 WHERE value % 5 = 0"))
+        self.assertLessEqual(db.pool.num_connections, 4)
+
+        db.close()
         self.delete_db_file()
 
     def delete_db_file(self):
@@ -0,0 +1,150 @@
+import threading
+import time
+import unittest
+from unittest.mock import Mock, MagicMock
+
+from core.dict_object import DictObject
+from core.event_service import EventService
+from core.executor_service import ExecutorService
+
+
+class EventServiceTest(unittest.TestCase):
+
+    def test_check_for_timer_events(self):
+        event_service = EventService()
+        event_service.db = MagicMock()
+        event_service.db.query = MagicMock(return_value=[
+            DictObject({"event_type": "timer", "event_sub_type": "60", "handler": "test.handler1", "next_run": 1000}),
+            DictObject({"event_type": "timer", "event_sub_type": "10", "handler": "test.handler2", "next_run": 1005})])
+
+        calls = []
+        event_service.handlers["test.handler1"] = lambda event_type, event_data: calls.append((event_type, 1))
+        event_service.handlers["test.handler2"] = lambda event_type, event_data: calls.append((event_type, 2))
+
+        event_service.check_for_timer_events(1000)
+        self.assertEqual([("timer:60", 1)], calls)
+
+        # next_run is based on the previous next_run, or on the current time if the timer event is behind
+        event_service.check_for_timer_events(1015)
+        self.assertEqual([("timer:60", 1), ("timer:10", 2)], calls)
+        self.assertEqual(1060, event_service.timer_events["test.handler1"].next_run)
+        self.assertEqual(1015, event_service.timer_events["test.handler2"].next_run)
+
+        event_service.check_for_timer_events(1025)
+        self.assertEqual(3, len(calls))
+
+        # timer events are only loaded once, and next_run is saved periodically instead of after every run
+        self.assertEqual(1, event_service.db.query.call_count)
+        self.assertEqual(1, event_service.db.exec.call_count)
+
+        event_service.save_timer_events()
+        self.assertEqual(2, event_service.db.exec.call_count)
+        event_service.db.exec.assert_any_call("UPDATE timer_event SET next_run = ? WHERE event_type = ? AND handler = ?",
+                                              [1025, "timer", "test.handler2"])
+
+    def test_fire_event(self):
+        event_service = EventService()
+        event_service.event_types = ["private_channel_message", "buddy_logon"]
+        event_service.db = MagicMock()
+        event_service.db.query = MagicMock(return_value=[
+            DictObject({"event_type": "private_channel_message", "event_sub_type": "", "handler": "test.handler1"}),
+            DictObject({"event_type": "private_channel_message", "event_sub_type": "", "handler": "test.handler2"})])
+        event_service.db.exec = MagicMock(return_value=1)
+
+        calls = []
+
+        def handler2(event_type, event_data):
+            raise Exception("error")
+
+        event_service.handlers["test.handler1"] = lambda event_type, event_data: calls.append((event_type, event_data))
+        event_service.handlers["test.handler2"] = handler2
+        event_service.reset_handler_stats()
+
+        # the dispatch table is only loaded once, and a failing handler does not stop other handlers
+        event_service.fire_event("private_channel_message", 1)
+        event_service.fire_event("PRIVATE_CHANNEL_MESSAGE", 2)
+        event_service.fire_event("buddy_logon", 3)
+        event_service.fire_event("unknown_event", 4)
+        self.assertEqual([("private_channel_message", 1), ("PRIVATE_CHANNEL_MESSAGE", 2)], calls)
+        self.assertEqual(1, event_service.db.query.call_count)
+        self.assertEqual(["test.handler1", "test.handler2"], event_service.get_handlers("private_channel_message", ""))
+
+        stats = {row.handler: row for row in event_service.get_handler_stats("count")}
+        self.assertEqual(2, stats["test.handler1"].count)
+        self.assertEqual(0, stats["test.handler1"].errors)
+        self.assertEqual(2, stats["test.handler2"].errors)
+
+        # the dispatch table is rebuilt when an event is enabled or disabled
+        event_service.db.query = MagicMock(return_value=[
+            DictObject({"event_type": "private_channel_message", "event_sub_type": "", "handler": "test.handler1"})])
+        event_service.update_event_status("private_channel_message", "", "test.handler2", 0)
+        event_service.fire_event("private_channel_message", 5)
+        self.assertEqual(["test.handler1"], event_service.get_handlers("private_channel_message", ""))
+
+        stats = {row.handler: row for row in event_service.get_handler_stats("count")}
+        self.assertEqual(3, stats["test.handler1"].count)
+        self.assertEqual(2, stats["test.handler2"].count)
+
+    def test_fire_event_pool(self):
+        event_service = EventService()
+        event_service.event_types = ["buddy_logon"]
+        event_service.db = MagicMock()
+        event_service.db.query = MagicMock(return_value=[
+            DictObject({"event_type": "buddy_logon", "event_sub_type": "", "handler": "test.handler1"}),
+            DictObject({"event_type": "buddy_logon", "event_sub_type": "", "handler": "test.handler2"})])
+        event_service.executor_service = ExecutorService()
+        event_service.executor_service.start()
+
+        main_thread = threading.current_thread()
+        calls = []
+
+        def handler2(event_type, event_data):
+            time.sleep(0.001)
+            calls.append((event_data.char_id, event_data.i, threading.current_thread() is main_thread))
+
+        event_service.handlers["test.handler1"] = lambda event_type, event_data: None
+        event_service.handlers["test.handler2"] = handler2
+        event_service.handler_executors["test.handler2"] = EventService.EXECUTOR_POOL
+        event_service.reset_handler_stats()
+
+        for i in range(20):
+            for char_id in range(3):
+                event_service.fire_event("buddy_logon", DictObject({"char_id": char_id, "i": i}))
+
+        event_service.executor_service.executor.shutdown(wait=True)
+
+        # pool handlers do not run on the thread that fired the event, but run in order for each char_id
+        self.assertEqual(60, len(calls))
+        self.assertFalse(any(map(lambda x: x[2], calls)))
+        for char_id in range(3):
+            self.assertEqual(list(range(20)), [i for c, i, _ in calls if c == char_id])
+
+        queue_depths = event_service.get_pool_queue_depths()
+        self.assertEqual("buddy_logon", queue_depths[0].event_type)
+        self.assertEqual(0, queue_depths[0].depth)
+        self.assertGreater(queue_depths[0].max_depth, 0)
+
+    def test_fire_event_pool_submit_error(self):
+        event_service = EventService()
+        event_service.event_types = ["buddy_logon"]
+        event_service.db = MagicMock()
+        event_service.db.query = MagicMock(return_value=[
+            DictObject({"event_type": "buddy_logon", "event_sub_type": "", "handler": "test.handler1"}),
+            DictObject({"event_type": "buddy_logon", "event_sub_type": "", "handler": "test.handler2"})])
+        event_service.executor_service = ExecutorService()
+        event_service.executor_service.start()
+        event_service.executor_service.executor.shutdown(wait=True)
+
+        calls = []
+        event_service.handlers["test.handler1"] = lambda event_type, event_data: calls.append(1)
+        event_service.handlers["test.handler2"] = lambda event_type, event_data: calls.append(2)
+        event_service.handler_executors["test.handler2"] = EventService.EXECUTOR_POOL
+        event_service.reset_handler_stats()
+
+        # the pool handler is dropped, but the error does not escape and the other handlers still run
+        event_service.fire_event("buddy_logon", DictObject({"char_id": 1}))
+        self.assertEqual([1], calls)
+
+        queue_depths = event_service.get_pool_queue_depths()
+        self.assertEqual(0, queue_depths[0].depth)
+        self.assertEqual(0, event_service.executor_service.get_num_ordered_jobs())
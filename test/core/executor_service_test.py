@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+
+from core.executor_service import ExecutorService
+
+
+class ExecutorServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor_service = ExecutorService()
+        self.executor_service.start()
+
+    def tearDown(self):
+        self.executor_service.executor.shutdown(wait=True)
+
+    def test_submit_ordered_job(self):
+        results = {}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def job(key, i):
+            time.sleep(0.001 * (i % 3))
+            with lock:
+                results.setdefault(key, []).append(i)
+                if sum(map(len, results.values())) == 200:
+                    done.set()
+
+        for i in range(50):
+            for key in range(4):
+                self.executor_service.submit_ordered_job(key, job, key, i)
+
+        self.assertTrue(done.wait(timeout=10))
+
+        # jobs with the same key run in the order they were submitted
+        for key in range(4):
+            self.assertEqual(list(range(50)), results[key])
+
+    def test_submit_ordered_job_backpressure(self):
+        self.executor_service.MAX_ORDERED_JOBS = 2
+        release = threading.Event()
+        results = []
+
+        def job(i):
+            release.wait(timeout=5)
+            results.append(i)
+
+        self.executor_service.submit_ordered_job("a", job, 1)
+        self.executor_service.submit_ordered_job("a", job, 2)
+
+        # blocks until one of the first jobs has finished
+        threading.Timer(0.2, release.set).start()
+        t = time.time()
+        self.executor_service.submit_ordered_job("a", job, 3)
+        self.assertGreaterEqual(time.time() - t, 0.15)
+
+        self.executor_service.executor.shutdown(wait=True)
+        self.assertEqual([1, 2, 3], results)
+        self.assertEqual(0, self.executor_service.get_num_ordered_jobs())
+
+    def test_submit_ordered_job_error(self):
+        done = threading.Event()
+
+        def failing_job():
+            raise Exception("error")
+
+        self.executor_service.submit_ordered_job("a", failing_job)
+        self.executor_service.submit_ordered_job("a", done.set)
+
+        # a failing job does not stop the jobs after it
+        self.assertTrue(done.wait(timeout=5))
+
+    def test_submit_ordered_job_submit_error(self):
+        self.executor_service.executor.shutdown(wait=True)
+
+        with self.assertRaises(RuntimeError):
+            self.executor_service.submit_ordered_job("a", lambda: None)
+
+        self.assertEqual(0, self.executor_service.get_num_ordered_jobs())
+        self.assertEqual({}, self.executor_service.ordered_jobs)
@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+
+from core.aochat import server_packets
+from core.fifo_queue import FifoQueue
+from core.incoming_packet_queue import IncomingPacketQueue
+
+
+class IncomingPacketQueueTest(unittest.TestCase):
+    def drain(self, queue):
+        result = []
+        item = queue.get_or_default(block=False)
+        while item:
+            result.append(item)
+            item = queue.get_or_default(block=False)
+        return result
+
+    def test_lanes(self):
+        queue = IncomingPacketQueue()
+        conn = object()
+        queue.put((conn, server_packets.BuddyAdded(1, 1, "\x01")))
+        queue.put((conn, server_packets.PrivateChannelMessage(2, 3, "hello", "")))
+        queue.put((conn, server_packets.BuddyRemoved(4)))
+        queue.put((conn, server_packets.PrivateMessage(5, "!help", "")))
+        queue.put((conn, server_packets.PublicChannelMessage(6, 7, "hi", "")))
+
+        self.assertEqual(5, len(queue))
+        packets = [packet for _, packet in self.drain(queue)]
+        self.assertEqual([server_packets.PrivateMessage.id, server_packets.PrivateChannelMessage.id, server_packets.PublicChannelMessage.id,
+                          server_packets.BuddyAdded.id, server_packets.BuddyRemoved.id], [packet.id for packet in packets])
+        self.assertEqual(0, len(queue))
+
+    def test_coalesce_buddy_added(self):
+        queue = IncomingPacketQueue()
+        conn1 = object()
+        conn2 = object()
+        queue.put((conn1, server_packets.BuddyAdded(1, 0, "\x01")))
+        queue.put((conn1, server_packets.BuddyAdded(2, 0, "\x01")))
+        queue.put((conn2, server_packets.BuddyAdded(1, 0, "\x01")))
+        queue.put((conn1, server_packets.BuddyAdded(1, 1, "\x01")))
+
+        # not coalesced across a BuddyRemoved, so the order of the two is kept
+        queue.put((conn1, server_packets.BuddyRemoved(2)))
+        queue.put((conn1, server_packets.BuddyAdded(2, 1, "\x01")))
+
+        result = [(conn, packet.id, packet.char_id, getattr(packet, "online", None)) for conn, packet in self.drain(queue)]
+        self.assertEqual([(conn1, 40, 1, 1),
+                          (conn1, 40, 2, 0),
+                          (conn2, 40, 1, 0),
+                          (conn1, 41, 2, None),
+                          (conn1, 40, 2, 1)], result)
+
+        stats = queue.get_stats()[IncomingPacketQueue.BULK]
+        self.assertEqual(6, stats.received)
+        self.assertEqual(5, stats.processed)
+        self.assertEqual(1, stats.coalesced)
+
+    def test_name_moved_ahead_of_message(self):
+        queue = IncomingPacketQueue()
+        conn = object()
+        queue.put((conn, server_packets.CharacterName(1, "Test1")))
+        queue.put((conn, server_packets.CharacterName(2, "Test2")))
+        queue.put((conn, server_packets.PrivateMessage(2, "!help", "")))
+
+        result = [(packet.id, packet.char_id) for _, packet in self.drain(queue)]
+        self.assertEqual([(20, 2), (30, 2), (20, 1)], result)
+        self.assertEqual(0, len(queue))
+        self.assertEqual({}, queue.name_entries)
+
+    def test_max_size(self):
+        queue = IncomingPacketQueue()
+        queue.lanes[IncomingPacketQueue.COMMANDS].max_size = 2
+        conn = object()
+        for i in range(3):
+            queue.put((conn, server_packets.PrivateMessage(i, "!help", "")))
+
+        self.assertEqual([0, 1], [packet.char_id for _, packet in self.drain(queue)])
+
+        stats = queue.get_stats()[IncomingPacketQueue.COMMANDS]
+        self.assertEqual(3, stats.received)
+        self.assertEqual(2, stats.processed)
+        self.assertEqual(1, stats.dropped)
+
+    def test_max_size_state_packets_not_dropped(self):
+        queue = IncomingPacketQueue()
+        queue.lanes[IncomingPacketQueue.CHANNELS].max_size = 1
+        queue.lanes[IncomingPacketQueue.BULK].max_size = 1
+        conn = object()
+        queue.put((conn, server_packets.PrivateChannelMessage(1, 2, "hello", "")))
+        queue.put((conn, server_packets.PrivateChannelClientJoined(1, 3)))
+        queue.put((conn, server_packets.PublicChannelMessage(4, 5, "hi", "")))
+        queue.put((conn, server_packets.PrivateChannelClientLeft(1, 3)))
+        queue.put((conn, server_packets.BuddyAdded(6, 1, "\x01")))
+        queue.put((conn, server_packets.BuddyRemoved(7)))
+
+        result = [packet.id for _, packet in self.drain(queue)]
+        self.assertEqual([server_packets.PrivateChannelMessage.id, server_packets.PrivateChannelClientJoined.id, server_packets.PrivateChannelClientLeft.id,
+                          server_packets.BuddyAdded.id, server_packets.BuddyRemoved.id], result)
+        self.assertEqual(1, queue.get_stats()[IncomingPacketQueue.CHANNELS].dropped)
+        self.assertEqual(0, queue.get_stats()[IncomingPacketQueue.BULK].dropped)
+
+    def test_get_or_default_timeout(self):
+        for queue in [IncomingPacketQueue(), FifoQueue()]:
+            t = time.monotonic()
+            self.assertEqual((None, None), queue.get_or_default(block=True, timeout=0.05, default=(None, None)))
+            self.assertGreaterEqual(time.monotonic() - t, 0.05)
+
+            item = (object(), server_packets.PrivateMessage(1, "!help", ""))
+            timer = threading.Timer(0.05, queue.put, [item])
+            timer.start()
+            self.assertIs(item[1], queue.get_or_default(block=True, timeout=5)[1])
+            timer.join()
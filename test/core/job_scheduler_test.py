@@ -0,0 +1,74 @@
+import time
+import unittest
+
+from core.job_scheduler import JobScheduler
+
+
+class JobSchedulerTest(unittest.TestCase):
+
+    def test_job_order(self):
+        job_scheduler = JobScheduler()
+        results = []
+
+        def callback(t, name):
+            results.append(name)
+
+        job_scheduler.scheduled_job(callback, 20, "C")
+        job_scheduler.scheduled_job(callback, 10, "A")
+        job_scheduler.scheduled_job(callback, 10.5, "B")
+        job_scheduler.scheduled_job(callback, 20, "D")
+        job_scheduler.scheduled_job(callback, 30, "E")
+
+        job_scheduler.check_for_scheduled_jobs(10.25)
+        self.assertEqual(["A"], results)
+
+        job_scheduler.check_for_scheduled_jobs(20)
+        self.assertEqual(["A", "B", "C", "D"], results)
+        self.assertEqual(30, job_scheduler.get_next_job_time())
+
+    def test_cancel_job(self):
+        job_scheduler = JobScheduler()
+        results = []
+
+        def callback(t):
+            results.append(t)
+
+        job_id1 = job_scheduler.scheduled_job(callback, 10)
+        job_scheduler.scheduled_job(callback, 20)
+
+        self.assertEqual(10, job_scheduler.cancel_job(job_id1)["time"])
+        self.assertIsNone(job_scheduler.cancel_job(job_id1))
+        self.assertEqual(20, job_scheduler.get_next_job_time())
+
+        job_scheduler.check_for_scheduled_jobs(30)
+        self.assertEqual([20], results)
+        self.assertIsNone(job_scheduler.get_next_job_time())
+
+    def test_delayed_job(self):
+        job_scheduler = JobScheduler()
+
+        t = time.time()
+        job_scheduler.delayed_job(lambda t: None, 0.5)
+
+        # the delay is not rounded down to the second
+        self.assertAlmostEqual(t + 0.5, job_scheduler.get_next_job_time(), delta=0.1)
+
+    def test_many_jobs(self):
+        job_scheduler = JobScheduler()
+        results = []
+
+        def callback(t):
+            results.append(t)
+
+        num_jobs = 100000
+        job_ids = [job_scheduler.scheduled_job(callback, (i * 7919) % num_jobs) for i in range(num_jobs)]
+        for job_id in job_ids[::2]:
+            job_scheduler.cancel_job(job_id)
+
+        # cancelled jobs are removed from the heap once they are the majority
+        self.assertLessEqual(len(job_scheduler.jobs), num_jobs // 2 + 100)
+
+        job_scheduler.check_for_scheduled_jobs(num_jobs)
+        self.assertEqual(num_jobs // 2, len(results))
+        self.assertEqual(sorted(results), results)
+        self.assertEqual(0, len(job_scheduler.jobs))
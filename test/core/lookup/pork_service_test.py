@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.db import DB
+from core.job_scheduler import JobScheduler
+from core.dict_object import DictObject
+from core.lookup.pork_service import PorkService
+
+
+class StubPorkHandler(BaseHTTPRequestHandler):
+    requests_received = []
+
+    def do_GET(self):
+        char_name = self.path.strip("/")
+        self.requests_received.append(char_name)
+
+        # simulate PoRK latency
+        time.sleep(0.05)
+
+        if char_name == "Unknown":
+            body = b"null"
+        elif char_name == "Invalid":
+            body = b"<html>Service Unavailable</html>"
+        elif char_name == "Disconnect":
+            # the connection is closed without a response
+            self.close_connection = True
+            return
+        elif char_name == "Incomplete":
+            body = b"[{}, null]"
+        else:
+            body = json.dumps([{"NAME": char_name, "CHAR_INSTANCE": int(char_name[4:]) if char_name.startswith("Char") else 1, "FIRSTNAME": "", "LASTNAME": "", "LEVELX": 220, "BREED": "Solitus",
+                                "CHAR_DIMENSION": 5, "SEX": "Female", "SIDE": "Clan", "PROF": "Doctor", "PROFNAME": "", "RANK_name": "",
+                                "ALIENLEVEL": 30, "PVPRATING": 0, "PVPTITLE": None, "HEADID": 0}, None]).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubPorkServer(ThreadingHTTPServer):
+    request_queue_size = 64
+
+
+class PorkServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        StubPorkHandler.requests_received = []
+        self.server = StubPorkServer(("127.0.0.1", 0), StubPorkHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.pork_service = PorkService()
+        self.pork_service.get_pork_url = lambda dimension, char_name: "http://127.0.0.1:%d/%s" % (self.server.server_port, char_name)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_request_char_info(self):
+        char_info = self.pork_service.request_char_info("Tyrbot", 5)
+        self.assertEqual("Tyrbot", char_info.name)
+        self.assertEqual(220, char_info.level)
+
+    def test_concurrent_requests_are_coalesced(self):
+        futures = [self.pork_service.request_char_info_async("Tyrbot", 5) for _ in range(10)]
+        results = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual(["Tyrbot"] * 10, [char_info.name for char_info in results])
+        self.assertEqual(["Tyrbot"], StubPorkHandler.requests_received)
+
+    def test_requests_run_in_parallel(self):
+        num_chars = PorkService.MAX_CONCURRENT_REQUESTS * 4
+        callback_results = []
+
+        start = time.time()
+        futures = [self.pork_service.request_char_info_async("Char%d" % i, 5, callback_results.append) for i in range(num_chars)]
+        for future in futures:
+            future.result(timeout=5)
+        elapsed = time.time() - start
+
+        self.assertEqual(num_chars, len(StubPorkHandler.requests_received))
+        self.assertEqual(num_chars, len(callback_results))
+        # each request takes 0.05s, so serial requests would take at least 1.6s
+        self.assertLess(elapsed, num_chars * 0.05 / 2)
+
+    def test_not_found_is_cached(self):
+        self.assertIsNone(self.pork_service.request_char_info("Unknown", 5))
+        self.assertIsNone(self.pork_service.request_char_info("unknown", 5))
+        self.assertEqual(["Unknown"], StubPorkHandler.requests_received)
+
+    def test_invalid_response_is_not_cached(self):
+        self.assertIsNone(self.pork_service.request_char_info("Invalid", 5))
+        self.assertIsNone(self.pork_service.request_char_info("Invalid", 5))
+        self.assertEqual(["Invalid", "Invalid"], StubPorkHandler.requests_received)
+        self.assertEqual(2, self.pork_service.request_duration_metric.labels("invalid").collect({})[-1][2])
+
+    def test_get_character_info_many(self):
+        self.pork_service.bot = Mock(dimension=5)
+        self.pork_service.character_service = Mock()
+        self.pork_service.character_service.resolve_char_to_name = lambda char_id: "Char%d" % char_id if char_id < 100 else None
+        self.pork_service.db = DB()
+        self.pork_service.db.connect_sqlite(":memory:")
+        self.pork_service.start()
+
+        t = int(time.time())
+        self.pork_service.save_character_info(DictObject({**self.pork_service.get_stub_character_info(1), "name": "Char1", "source": "test"}))
+        self.pork_service.save_character_info(DictObject({**self.pork_service.get_stub_character_info(2), "name": "Char2", "source": "chat_server"}))
+
+        char_infos = self.pork_service.get_character_info_many([1, 2, 3, 100])
+
+        # char 1 is cached, char 2 and 3 are requested from PoRK, and char 100 can't be requested since the name is unknown
+        self.assertEqual(["Char2", "Char3"], sorted(StubPorkHandler.requests_received))
+        self.assertEqual("test", char_infos[1].source)
+        self.assertEqual(220, char_infos[2].level)
+        self.assertEqual(220, char_infos[3].level)
+        self.assertIsNone(char_infos[100])
+
+        rows = self.pork_service.db.query("SELECT char_id, level, last_updated FROM player ORDER BY char_id")
+        self.assertEqual([1, 2, 3], [row.char_id for row in rows])
+        self.assertEqual([0, 220, 220], [row.level for row in rows])
+        self.assertLessEqual(t, rows[2].last_updated)
+
+        self.pork_service.load_character_info_many([1, 100])
+        self.assertEqual("stub", self.pork_service.get_from_database(char_id=100).source)
+
+    def test_prefetch_character_info(self):
+        self.pork_service.job_scheduler = JobScheduler()
+        self.pork_service.load_character_info_many = Mock()
+
+        for char_id in [1, 2, 1, 3]:
+            self.pork_service.prefetch_character_info(char_id)
+
+        self.pork_service.job_scheduler.check_for_scheduled_jobs(time.time() + PorkService.PREFETCH_DELAY)
+        self.pork_service.load_character_info_many.assert_called_once_with({1, 2, 3})
+
+        self.pork_service.prefetch_character_info(4)
+        self.pork_service.job_scheduler.check_for_scheduled_jobs(time.time() + PorkService.PREFETCH_DELAY)
+        self.pork_service.load_character_info_many.assert_called_with({4})
+
+    def test_prefetch_character_info_callback(self):
+        self.pork_service.job_scheduler = JobScheduler()
+        self.pork_service.load_character_info_many = Mock(return_value={1: DictObject({"char_id": 1, "name": "Char1"}), 2: None})
+
+        results = []
+        self.pork_service.prefetch_character_info(1, lambda char_info: results.append((1, char_info)))
+        self.pork_service.prefetch_character_info(2, lambda char_info: results.append((2, char_info)))
+
+        self.assertEqual([], results)
+
+        self.pork_service.job_scheduler.check_for_scheduled_jobs(time.time() + PorkService.PREFETCH_DELAY)
+        self.pork_service.load_character_info_many.assert_called_once_with({1, 2})
+        self.assertEqual([(1, DictObject({"char_id": 1, "name": "Char1"})), (2, None)], results)
+
+    def test_prefetch_character_info_request_error(self):
+        names = {1: "Char1", 2: "Disconnect", 3: "Incomplete"}
+        self.pork_service.bot = Mock(dimension=5)
+        self.pork_service.character_service = Mock()
+        self.pork_service.character_service.resolve_char_to_name = names.get
+        self.pork_service.job_scheduler = JobScheduler()
+        self.pork_service.db = DB()
+        self.pork_service.db.connect_sqlite(":memory:")
+        self.pork_service.start()
+
+        results = {}
+        for char_id in names.keys():
+            self.pork_service.prefetch_character_info(char_id, lambda char_info, char_id=char_id: results.__setitem__(char_id, char_info))
+
+        self.pork_service.job_scheduler.check_for_scheduled_jobs(time.time() + PorkService.PREFETCH_DELAY)
+
+        # the failed requests do not stop the other characters from being loaded, or the callbacks from being called
+        self.assertEqual([1, 2, 3], sorted(results.keys()))
+        self.assertEqual(220, results[1].level)
+        self.assertIsNone(results[2])
+        self.assertIsNone(results[3])
+
+        # a request that failed is not cached as not found
+        self.assertEqual({}, self.pork_service.not_found_cache)
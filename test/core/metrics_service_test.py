@@ -0,0 +1,79 @@
+import socket
+import unittest
+from unittest.mock import Mock
+
+from core.aochat import server_packets
+from core.async_service import AsyncService
+from core.conn import Conn
+from core.dict_object import DictObject
+from core.incoming_packet_queue import IncomingPacketQueue
+from core.metrics import MetricsRegistry
+from core.metrics_service import MetricsService
+
+
+class MetricsServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.async_service = AsyncService()
+        self.async_service.start_loop()
+
+        settings = {"metrics_server_host": "127.0.0.1", "metrics_server_port": 0}
+        setting_service = Mock()
+        setting_service.get = lambda name: Mock(get_value=lambda: settings[name])
+
+        self.metrics_service = MetricsService()
+        self.metrics_service.registry = MetricsRegistry()
+        self.metrics_service.async_service = self.async_service
+        self.metrics_service.setting_service = setting_service
+        self.metrics_service.start_server()
+        self.port = self.metrics_service.server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        self.metrics_service.stop_server()
+        self.async_service.stop_loop()
+
+    def request(self, path):
+        with socket.create_connection(("127.0.0.1", self.port), timeout=5) as s:
+            s.sendall(("GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n" % path).encode("latin-1"))
+            response = b""
+            data = s.recv(4096)
+            while data:
+                response += data
+                data = s.recv(4096)
+
+        headers, body = response.decode("utf-8").split("\r\n\r\n", 1)
+        return headers.split("\r\n")[0], body
+
+    def test_metrics(self):
+        self.metrics_service.registry.counter("test_total", "Test counter").inc()
+
+        status, body = self.request("/metrics")
+        self.assertEqual("HTTP/1.1 200 OK", status)
+        self.assertEqual("# HELP test_total Test counter\n# TYPE test_total counter\ntest_total 1\n", body)
+
+        status, body = self.request("/")
+        self.assertEqual("HTTP/1.1 404 Not Found", status)
+
+    def test_collectors(self):
+        conn = Conn("bot1", None, self.async_service)
+        conn.num_packets_received[server_packets.PrivateMessage.id] += 2
+        conn.num_packets_received[999] += 1
+        conn.buddy_list[1] = {"online": True, "types": [], "conn_id": "bot1"}
+
+        incoming_queue = IncomingPacketQueue()
+        incoming_queue.put((conn, server_packets.BuddyAdded(1, 1, "\x01")))
+
+        self.metrics_service.bot = Mock(get_conns=lambda: [("bot1", conn)], incoming_queue=incoming_queue)
+        self.metrics_service.buddy_service = Mock(buddy_list_size=1000)
+        self.metrics_service.event_service = Mock(get_handler_stats=lambda: [DictObject({"handler": "test.handler", "count": 2, "errors": 1, "total_time": 0.5,
+                                                                                         "mean_time": 0.25, "p99_time": 0.4, "max_time": 0.4})])
+        self.metrics_service.pre_start()
+
+        body = self.metrics_service.render()
+        self.assertIn('tyrbot_packets_received_total{conn="bot1",type="PrivateMessage"} 2\n', body)
+        self.assertIn('tyrbot_packets_received_total{conn="bot1",type="999"} 1\n', body)
+        self.assertIn('tyrbot_buddy_list_size{conn="bot1"} 1\n', body)
+        self.assertIn("tyrbot_buddy_list_capacity 1000\n", body)
+        self.assertIn('tyrbot_incoming_queue_size{lane="bulk"} 1\n', body)
+        self.assertIn('tyrbot_event_handler_duration_seconds{handler="test.handler",quantile="0.99"} 0.4\n', body)
+        self.assertIn('tyrbot_event_handler_errors_total{handler="test.handler"} 1\n', body)
@@ -0,0 +1,48 @@
+import unittest
+
+from core.metrics import MetricsRegistry
+
+
+class MetricsTest(unittest.TestCase):
+    def test_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("test_total", "Test counter", ["conn", "type"])
+        counter.labels("bot1", "PrivateMessage").inc()
+        counter.labels("bot1", "PrivateMessage").inc(2)
+        counter.labels("bot2", 'Say "hi"').inc()
+
+        self.assertIs(counter, registry.counter("test_total", "Test counter", ["conn", "type"]))
+        self.assertRaises(Exception, registry.gauge, "test_total", "Test counter", ["conn", "type"])
+        self.assertRaises(Exception, counter.labels, "bot1")
+
+        self.assertEqual("# HELP test_total Test counter\n"
+                         "# TYPE test_total counter\n"
+                         "test_total{conn=\"bot1\",type=\"PrivateMessage\"} 3\n"
+                         "test_total{conn=\"bot2\",type=\"Say \\\"hi\\\"\"} 1\n", registry.render())
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("test_seconds", "Test histogram", buckets=[0.1, 1])
+        for value in [0.05, 0.1, 0.5, 2]:
+            histogram.observe(value)
+
+        self.assertEqual("# HELP test_seconds Test histogram\n"
+                         "# TYPE test_seconds histogram\n"
+                         "test_seconds_bucket{le=\"0.1\"} 2\n"
+                         "test_seconds_bucket{le=\"1\"} 3\n"
+                         "test_seconds_bucket{le=\"+Inf\"} 4\n"
+                         "test_seconds_sum 2.65\n"
+                         "test_seconds_count 4\n", registry.render())
+
+    def test_collector(self):
+        registry = MetricsRegistry()
+        registry.gauge("test_gauge", "Test gauge").set(5)
+        registry.add_collector(lambda: [("test_size", "gauge", "Test collector", [("", {"lane": "commands"}, 2), ("", {"lane": "bulk"}, 0)])])
+
+        self.assertEqual("# HELP test_gauge Test gauge\n"
+                         "# TYPE test_gauge gauge\n"
+                         "test_gauge 5\n"
+                         "# HELP test_size Test collector\n"
+                         "# TYPE test_size gauge\n"
+                         "test_size{lane=\"commands\"} 2\n"
+                         "test_size{lane=\"bulk\"} 0\n", registry.render())
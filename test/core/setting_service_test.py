@@ -0,0 +1,61 @@
+import unittest
+
+from core.db import DB
+from core.registry import Registry
+from core.setting_service import SettingService
+from core.setting_types import BooleanSettingType, ColorSettingType, NumberSettingType
+
+
+class SettingServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.db = DB()
+        self.db.connect_sqlite(":memory:")
+        self.db.exec("CREATE TABLE setting (name VARCHAR(50) NOT NULL, value VARCHAR(255) NOT NULL, description VARCHAR(255) NOT NULL, module VARCHAR(50) NOT NULL, verified SMALLINT NOT NULL)")
+        self.db.exec("INSERT INTO setting (name, value, description, module, verified) VALUES (?, ?, ?, ?, ?)", ["max_page_length", "1000", "", "test", 0])
+
+        self.setting_service = SettingService()
+        self.setting_service.db = self.db
+
+        Registry.clear()
+        Registry.add_instance("setting_service", self.setting_service)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_register(self):
+        self.setting_service.register("test", "max_page_length", 2000, NumberSettingType(), "Max page length")
+        self.setting_service.register("test", "highlight_color", "#00bfff", ColorSettingType(), "Color for highlight")
+
+        # existing values are kept, and new settings are saved with their default value
+        self.assertEqual(1000, self.setting_service.get("max_page_length").get_value())
+        self.assertEqual("#00BFFF", self.setting_service.get("highlight_color").get_value())
+        self.assertEqual("#00BFFF", self.db.query_single("SELECT value FROM setting WHERE name = ?", ["highlight_color"]).value)
+
+    def test_get_value_does_not_query_database(self):
+        self.setting_service.register("test", "max_page_length", 2000, NumberSettingType(), "Max page length")
+        self.setting_service.register("test", "accept_commands", False, BooleanSettingType(), "Accept commands")
+        num_db_queries = self.setting_service.num_db_queries
+
+        for _ in range(100):
+            self.assertEqual(1000, self.setting_service.get("max_page_length").get_value())
+            self.assertFalse(self.setting_service.get("accept_commands").get_value())
+            self.assertIsNone(self.setting_service.get_value("does_not_exist"))
+
+        self.assertEqual(1, num_db_queries)
+        self.assertEqual(num_db_queries, self.setting_service.num_db_queries)
+
+    def test_set_value(self):
+        changes = []
+        self.setting_service.register("test", "max_page_length", 2000, NumberSettingType(), "Max page length")
+        self.setting_service.register_change_listener("max_page_length", lambda name, old_value, new_value: changes.append((name, old_value, new_value)))
+        setting = self.setting_service.get("max_page_length")
+        values = self.setting_service.values
+
+        setting.set_value(3000)
+
+        self.assertEqual(3000, setting.get_value())
+        self.assertEqual("3000", self.db.query_single("SELECT value FROM setting WHERE name = ?", ["max_page_length"]).value)
+        self.assertEqual([("max_page_length", "1000", 3000)], changes)
+
+        # the previous snapshot is not modified
+        self.assertEqual("1000", values["max_page_length"])
@@ -0,0 +1,69 @@
+import unittest
+
+from core.db import DB
+from core.sql_profiler import SqlProfiler
+
+
+class SqlProfilerTest(unittest.TestCase):
+    def test_normalize_sql(self):
+        profiler = SqlProfiler()
+        self.assertEqual("SELECT * FROM player WHERE char_id IN (...) AND name = ? AND level > ?",
+                         profiler.normalize_sql("SELECT *\n  FROM player WHERE char_id IN (?, ?,?) AND name = 'it''s' AND level > 10"))
+        self.assertEqual("SELECT * FROM test1 WHERE value = ?", profiler.normalize_sql("SELECT * FROM test1 WHERE value = ?"))
+
+    def test_get_stats(self):
+        profiler = SqlProfiler()
+        for i in range(1, 101):
+            profiler.record("SELECT * FROM test1 WHERE id = %d" % i, [], i / 1000, 1)
+        profiler.record("DELETE FROM test1", [], 0.5, 100)
+
+        stats = profiler.get_stats("total_time")
+        self.assertEqual(["SELECT * FROM test1 WHERE id = ?", "DELETE FROM test1"], [row.sql for row in stats])
+
+        row = stats[0]
+        self.assertEqual(100, row.count)
+        self.assertEqual(100, row.rows)
+        self.assertAlmostEqual(5.05, row.total_time)
+        self.assertAlmostEqual(0.0505, row.mean_time)
+        self.assertAlmostEqual(0.096, row.p95_time)
+        self.assertAlmostEqual(0.1, row.max_time)
+        self.assertEqual("SELECT * FROM test1 WHERE id = 100", row.sample_sql)
+        self.assertEqual([(__name__ + ".SqlProfilerTest.test_get_stats", 100)], row.callers)
+
+        self.assertEqual(["DELETE FROM test1", "SELECT * FROM test1 WHERE id = ?"], [row.sql for row in profiler.get_stats("max_time")])
+
+        profiler.reset()
+        self.assertEqual([], profiler.get_stats())
+
+    def test_max_statements(self):
+        profiler = SqlProfiler()
+        profiler.MAX_STATEMENTS = 2
+        for table in ["test1", "test2", "test3", "test4"]:
+            profiler.record("SELECT * FROM " + table, [], 0.1, 0)
+
+        self.assertEqual({"SELECT * FROM test1": 1, "SELECT * FROM test2": 1, SqlProfiler.OTHER_STATEMENTS: 2},
+                         {row.sql: row.count for row in profiler.get_stats()})
+
+    def test_db_profiling(self):
+        db = DB()
+        db.connect_sqlite(":memory:")
+        db.exec("CREATE TABLE test1 (id INT, name VARCHAR)")
+        db.enable_profiling()
+
+        db.exec_many("INSERT INTO test1 (id, name) VALUES (?, ?)", [[1, "one"], [2, "two"]])
+        db.query("SELECT * FROM test1")
+        db.query_single("SELECT * FROM test1 WHERE id = ?", [1])
+        db.exec("UPDATE test1 SET name = ?", ["three"])
+
+        stats = {row.sql: row for row in db.profiler.get_stats()}
+        self.assertEqual(2, stats["SELECT * FROM test1"].rows)
+        self.assertEqual(1, stats["SELECT * FROM test1 WHERE id = ?"].rows)
+        self.assertEqual(2, stats["UPDATE test1 SET name = ?"].rows)
+        self.assertEqual(2, stats["INSERT INTO test1 (id, name) VALUES (?, ?)"].rows)
+        self.assertEqual([(__name__ + ".SqlProfilerTest.test_db_profiling", 1)], stats["SELECT * FROM test1"].callers)
+
+        db.disable_profiling()
+        db.query("SELECT * FROM test1")
+        self.assertIsNone(db.profiler)
+
+        db.close()
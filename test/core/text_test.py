@@ -1,5 +1,6 @@
 from core.chat_blob import ChatBlob
 from core.text import Text, TextFormatter
+import random
 import unittest
 from unittest.mock import Mock, MagicMock
 
@@ -54,6 +55,58 @@ class TextTest(unittest.TestCase):
         pages2 = text.paginate(chatblob, conn)
         self.assertEqual(1, len(pages2))
 
+    def test_split_by_separators(self):
+        text = Text()
+        rand = random.Random(1)
+        tokens = ["a", "word", "longerword", "averyveryverylongword", " ", " ", "\n", "\n", "<pagebreak>", "<header>"]
+        for _ in range(3000):
+            content = "".join(rand.choice(tokens) for _ in range(rand.randrange(60)))
+            max_page_length = rand.choice([None, 0, rand.randrange(1, 15), rand.randrange(15, 100)])
+            max_num_pages = rand.choice([None, rand.randrange(1, 5)])
+
+            try:
+                expected = self.split_by_separators_reference(text, content, max_page_length, max_num_pages)
+            except Exception as e:
+                with self.assertRaisesRegex(Exception, str(e)):
+                    text.split_by_separators(content, max_page_length, max_num_pages)
+            else:
+                self.assertEqual(expected, text.split_by_separators(content, max_page_length, max_num_pages), (content, max_page_length, max_num_pages))
+
+    def split_by_separators_reference(self, text, content, max_page_length, max_num_pages):
+        # the original split_by_separators() implementation, which copies the rest of the content for every line
+        separators = iter(text.separators)
+
+        separator = next(separators)
+        rest = content
+        current_page = ""
+        pages = []
+
+        while len(rest) > 0:
+            line, rest = text.get_next_line(rest, separator)
+            line_length = len(line)
+
+            if max_page_length and line_length > max_page_length:
+                try:
+                    separator = next(separators)
+                    rest = line + rest
+                    continue
+                except StopIteration:
+                    raise Exception("Could not paginate: page is too large")
+
+            if max_num_pages == len(pages) + 1:
+                if max_page_length and (len(current_page) + line_length > max_page_length):
+                    break
+            else:
+                if max_page_length and len(current_page) + line_length > max_page_length:
+                    pages.append(current_page.strip())
+                    current_page = ""
+
+            current_page += line
+
+        pages.append(current_page.strip())
+
+        return pages
+
     def test_get_formatted_faction(self):
         text = Text()
         self.assertEqual("<omni>Omni</omni>", text.get_formatted_faction("omni"))
@@ -101,3 +154,38 @@ class TextTest(unittest.TestCase):
         #print("'" + output1 + "'")
         #print("'" + output2 + "'")
         #self.assertEqual(output1, output2)
+
+    def test_format_message(self):
+        settings = {"header_color": "#FFFF00", "header2_color": "#FCA712", "highlight_color": "#00BFFF", "notice_color": "#FF8C00",
+                    "neutral_color": "#E6E1A6", "omni_color": "#FA8484", "clan_color": "#F79410", "unknown_color": "#FF0000", "symbol": "!"}
+
+        def get_setting(name):
+            setting = Mock()
+            setting.get_value = lambda: settings[name]
+            setting.get_font_color = lambda: "<font color='%s'>" % settings[name]
+            return setting
+
+        change_listeners = {}
+        setting_service = Mock()
+        setting_service.get = get_setting
+        setting_service.register_change_listener = lambda name, handler: change_listeners.setdefault(name, []).append(handler)
+
+        conn = Mock()
+        conn.get_char_name = MagicMock(return_value="Tyrbot")
+        conn.get_org_name = MagicMock(return_value=None)
+
+        text = Text()
+        text.setting_service = setting_service
+
+        self.assertEqual("no tags", text.format_message_old("no tags", conn))
+        self.assertEqual("<font color='#00BFFF'>Tyrbot</font> has joined <font color='#FF0000'>Unknown Org</font>.\n    "
+                         "<a href='chatcmd:///tell Tyrbot !help'>Help</a><font color='#FFFF00'>Header</font> <b>&lt;tab&gt;</b> <unknowntag>",
+                         text.format_message_old("<highlight><myname></highlight> has joined <red><myorg><end>.<br><tab>"
+                                                 "<a href='chatcmd:///tell <myname> <symbol>help'>Help</a><header>Header</header> <b>&lt;tab&gt;</b> <unknowntag>", conn))
+
+        # format table is rebuilt when a setting changes
+        settings["highlight_color"] = "#FFFFFF"
+        for handler in change_listeners["highlight_color"]:
+            handler("highlight_color", "#00BFFF", "#FFFFFF")
+        self.assertEqual("<font color='#FFFFFF'>Tyrbot</font>", text.format_message_old("<highlight><myname></highlight>", conn))
+        self.assertEqual(set(Text.format_table_settings), set(change_listeners.keys()))
@@ -1,7 +1,8 @@
 import unittest
 
 from core.aochat.mmdb_parser import MMDBParser
-from core.aochat.server_packets import SystemMessage, PublicChannelMessage
+from core.aochat.server_packets import SystemMessage, PublicChannelMessage, PrivateMessage
+from core.dict_object import DictObject
 from core.tyrbot import Tyrbot
 
 
@@ -66,3 +67,27 @@ class TyrbotTest(unittest.TestCase):
         self.assertEqual(
             [{'priority': 10, 'handler': callback}, {'priority': 50, 'handler': callback}, {'priority': 50, 'handler': callback}],
             bot.packet_handlers.get(packet_id))
+
+    def test_get_packet_filter(self):
+        bot = Tyrbot()
+        main_conn = DictObject({"is_main": True, "packet_filter": None})
+        other_conn = DictObject({"is_main": False, "packet_filter": None})
+        bot.conns["main"] = main_conn
+        bot.conns["other"] = other_conn
+
+        def callback(conn, packet):
+            pass
+
+        def callback2(conn, packet):
+            pass
+
+        bot.register_packet_handler(PrivateMessage.id, callback)
+        bot.register_packet_handler(PublicChannelMessage.id, callback, main_only=True)
+        self.assertEqual({SystemMessage.id, PrivateMessage.id, PublicChannelMessage.id}, main_conn.packet_filter)
+        self.assertEqual({SystemMessage.id, PrivateMessage.id}, other_conn.packet_filter)
+
+        bot.register_packet_handler(PublicChannelMessage.id, callback2)
+        self.assertEqual({SystemMessage.id, PrivateMessage.id, PublicChannelMessage.id}, other_conn.packet_filter)
+
+        bot.remove_packet_handler(PublicChannelMessage.id, callback2)
+        self.assertEqual({SystemMessage.id, PrivateMessage.id}, other_conn.packet_filter)
@@ -0,0 +1,67 @@
+import unittest
+
+from core.db import DB
+from modules.standard.items.items_controller import ItemsController
+
+
+class ItemsControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = DB()
+        self.db.connect_sqlite(":memory:")
+        self.db.exec("CREATE TABLE aodb (lowid INT, highid INT, lowql INT, highql INT, name VARCHAR(150), icon INT)")
+        self.db.exec_many("INSERT INTO aodb VALUES (?, ?, ?, ?, ?, ?)", [
+            [1, 2, 1, 200, "Ring of Power", 100],
+            [3, 4, 201, 300, "Ring of Power", 100],
+            [5, 5, 1, 1, "Earring", 101],
+            [6, 6, 1, 1, "Spring Water", 102],
+            [7, 7, 50, 50, "Ring", 103],
+            [8, 9, 1, 300, "Ofab Shark Mk 1", 104],
+            [10, 10, 1, 1, "Power Ring of the Ancients", 105]])
+
+        self.items_controller = ItemsController()
+        self.items_controller.db = self.db
+        self.items_controller.build_search_index()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_find_items(self):
+        self.assertTrue(self.items_controller.use_search_index)
+
+        # exact match, then whole words, then partial words
+        self.assertEqual([7, 10, 3, 1, 5, 6], [row.lowid for row in self.items_controller.find_items("ring")])
+        self.assertEqual([0, 1, 1, 1, 2, 2], [row.priority for row in self.items_controller.find_items("ring")])
+
+        self.assertEqual([10, 3, 1], [row.lowid for row in self.items_controller.find_items("ring power")])
+        self.assertEqual([7, 3, 1, 5], [row.lowid for row in self.items_controller.find_items("ring -spring -ancients")])
+        self.assertEqual([8], [row.lowid for row in self.items_controller.find_items("of sha mk")])
+        self.assertEqual([3], [row.lowid for row in self.items_controller.find_items("ring power", ql=250)])
+        self.assertEqual([], [row.lowid for row in self.items_controller.find_items("ring power", ql=400)])
+
+    def test_find_items_without_search_index(self):
+        searches = ["ring", "RING OF", "ring -spring", "of", "-of", "o%r", "ring_", "ri ng", "shark mk 1"]
+        expected = [self.items_controller.find_items(search) for search in searches]
+
+        self.items_controller.use_search_index = False
+        self.items_controller.clear_search_cache()
+
+        self.assertEqual(expected, [self.items_controller.find_items(search) for search in searches])
+
+    def test_find_items_cache(self):
+        self.items_controller.SEARCH_CACHE_MAX_ROWS = 4
+        self.items_controller.SEARCH_CACHE_MAX_RESULT_ROWS = 3
+
+        # too many rows to be cached
+        self.assertEqual(6, len(self.items_controller.find_items("ring")))
+        self.assertEqual({}, self.items_controller.search_cache)
+
+        items = self.items_controller.find_items("ring power")
+        self.assertIs(items, self.items_controller.find_items("ring power"))
+        self.assertEqual(1, len(self.items_controller.find_items("of sha mk")))
+        self.assertEqual(4, self.items_controller.search_cache_num_rows)
+
+        # the least recently used result is evicted once the cache has too many rows
+        self.assertEqual(1, len(self.items_controller.find_items("earring")))
+        self.assertEqual([("of sha mk", None), ("earring", None)], list(self.items_controller.search_cache.keys()))
+        self.assertEqual(2, self.items_controller.search_cache_num_rows)
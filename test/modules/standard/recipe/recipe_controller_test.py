@@ -1,4 +1,8 @@
 import unittest
+
+from core.db import DB
+from core.text import Text
+from modules.standard.items.items_controller import ItemsController
 from modules.standard.recipe.recipe_controller import RecipeController
 
 
@@ -9,3 +13,60 @@ class RecipeControllerTest(unittest.TestCase):
 
         self.assertEqual("this is a test\n<a href='chatcmd:///tell <myname> recipe 10'>Recipe 10</a>\nand this is the end",
                          recipe_controller.format_recipe_text("""this is a test\\n#L "Recipe 10" "/tell <myname> recipe 10"\\nand this is the end"""))
+
+    def test_format_recipe_text_items(self):
+        db = DB()
+        db.connect_sqlite(":memory:")
+        db.exec("CREATE TABLE aodb (lowid INT, highid INT, lowql INT, highql INT, name VARCHAR(150), icon INT)")
+        db.exec_many("INSERT INTO aodb VALUES (?, ?, ?, ?, ?, ?)", [[1, 2, 1, 100, "Item 1", 0], [3, 3, 1, 1, "Item 3", 0], [2, 4, 1, 200, "Item 4", 0]])
+
+        recipe_controller = RecipeController()
+        recipe_controller.text = Text()
+        recipe_controller.items_controller = ItemsController()
+        recipe_controller.items_controller.db = db
+
+        # items are preferred by high id, the same as ItemsController.get_by_item_id
+        self.assertEqual("<a href='itemref://2/4/200'>Item 4</a> <a href='itemref://1/2/100'>Item 1</a> Unknown",
+                         recipe_controller.format_recipe_text("""#L "Name 4" "4" #L "Name 2" "2" #L "Unknown" "5\""""))
+
+        db.close()
+
+    def test_search_recipes(self):
+        db = DB()
+        db.connect_sqlite(":memory:")
+
+        recipe_controller = RecipeController()
+        recipe_controller.db = db
+        db.exec("CREATE TABLE recipe (id INT NOT NULL PRIMARY KEY, name VARCHAR(50) NOT NULL, author VARCHAR(50) NOT NULL, recipe TEXT NOT NULL, hash VARCHAR(40) NOT NULL)")
+        db.exec_many("INSERT INTO recipe (id, name, author, recipe, hash) VALUES (?, ?, ?, ?, '')", [
+            [1, "Implant Disassembly Clinic", "", "Combine the implant with the clinic"],
+            [2, "Carbonum Armor", "", "Uses an implant and a blank carbonum plate"],
+            [3, "Nano Crystal", "", "Combine the nano crystal with a crystal filled with the source"],
+            [4, "Clumps", "", "Combine the implant with the clumps"]])
+        recipe_controller.build_search_index()
+        self.assertTrue(recipe_controller.use_search_index)
+
+        # matches in the name rank higher than matches in the recipe
+        count, data = recipe_controller.search_recipes("implant", 0, 30)
+        self.assertEqual(3, count)
+        self.assertEqual(1, data[0].id)
+
+        count, data = recipe_controller.search_recipes("implant -clumps", 0, 30)
+        self.assertEqual([1, 2], sorted([row.id for row in data]))
+
+        count, data = recipe_controller.search_recipes("implant", 1, 1)
+        self.assertEqual(3, count)
+        self.assertEqual(1, len(data))
+
+        # too short to search with the index
+        self.assertIsNone(recipe_controller.get_search_index_query("an implant"))
+        count, data = recipe_controller.search_recipes("an implant", 0, 30)
+        self.assertEqual([2, 4, 1], [row.id for row in data])
+
+        db.close()
+
+    def test_manifest(self):
+        recipe_controller = RecipeController()
+
+        self.assertEqual(recipe_controller.build_manifest(), recipe_controller.read_manifest(),
+                         "Recipe manifest is out of date, update it with RecipeController().write_manifest()")
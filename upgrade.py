@@ -378,3 +378,9 @@ def run_upgrades():
         if table_exists("setting"):
             db.exec("UPDATE setting SET value = 'https://history.aobots.org/?server={dimension}&name={name}' WHERE name = 'pork_history_url'")
         version = update_version(version)
+
+    if version == 37:
+        # recipes are now versioned by hash instead of by file modification time, and are reloaded from the recipe files
+        if table_exists("recipe"):
+            db.exec("DROP TABLE recipe")
+        version = update_version(version)